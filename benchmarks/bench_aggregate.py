@@ -0,0 +1,52 @@
+"""
+Benchmark aggregating player statistics of replays
+
+Usage: python benchmarks/bench_aggregate.py [REPLAYS]
+"""
+
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import List, Sequence
+
+from blitzmodels.wotinspector import Replay, ReplayAggregator, ReplayJSON
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+REPLAYS: int = 20_000
+
+
+def read_replays(n: int) -> List[Replay]:
+    """Read n V2 replays converted from the test replays"""
+    replays: List[Replay] = list()
+    for path in sorted(REPLAY_DIR.glob("*.wotbreplay.json")):
+        replay_json = ReplayJSON.model_validate(json.loads(path.read_text()))
+        if (replay := Replay.from_ReplayJSON(replay_json)) is not None:
+            replays.append(replay)
+    return [
+        replays[i % len(replays)].model_copy(update={"id": f"{i}".zfill(32)})
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else REPLAYS
+    replays: List[Replay] = read_replays(n)
+
+    by: Sequence[str]
+    for by in [["dbid"], ["dbid", "tank_id"], ["tank_id", "map_id", "platoon"]]:
+        aggregator = ReplayAggregator(by=by)
+        start: float = perf_counter()
+        aggregator.add_many(replays)
+        elapsed: float = perf_counter() - start
+        start = perf_counter()
+        rows: int = aggregator.to_arrow().num_rows
+        arrow: float = perf_counter() - start
+        print(
+            f"by {', '.join(by):<24}: {n / elapsed:>9,.0f} replays/s, "
+            f"{rows} groups, to_arrow() {arrow * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark decoding replays offline from battle_results.dat
+
+Usage: python benchmarks/bench_battle_results.py [COPIES] [WORKERS]
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import List
+from zipfile import ZipFile
+
+from blitzmodels import ReplayFile
+from blitzmodels.wotinspector import BattleResults
+from blitzmodels.wotinspector.wi_apiv2 import Replay
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+COPIES: int = 50
+WORKERS: int = 4
+
+
+def replay_files(copies: int) -> List[Path]:
+    replays: List[Path] = sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+    return replays * copies
+
+
+async def decode_results(replays: List[Path]) -> int:
+    """Decode battle_results.dat read into memory beforehand"""
+    datas: List[bytes] = list()
+    for path in replays:
+        with ZipFile(path) as zreplay:
+            datas.append(zreplay.read("battle_results.dat"))
+    start: float = perf_counter()
+    for data in datas:
+        BattleResults(data)
+    elapsed: float = perf_counter() - start
+    print(f"{'decode only':<26}: {len(datas) / elapsed:,.0f} replays/s")
+    return len(datas)
+
+
+async def from_replay_file(replays: List[Path]) -> int:
+    decoded: int = 0
+    for path in replays:
+        replay_file = ReplayFile(path, keep_data=False)
+        await replay_file.open(meta_only=True)
+        if Replay.from_ReplayFile(replay_file) is not None:
+            decoded += 1
+    return decoded
+
+
+async def open_many(replays: List[Path], workers: int, processes: bool) -> int:
+    decoded: int = 0
+    async for _ in Replay.open_many(replays, workers=workers, processes=processes):
+        decoded += 1
+    return decoded
+
+
+async def main() -> None:
+    copies: int = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    workers: int = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    replays: List[Path] = replay_files(copies)
+
+    for name, run in [
+        ("BattleResults()", lambda: decode_results(replays)),
+        ("Replay.from_ReplayFile()", lambda: from_replay_file(replays)),
+        (f"open_many() {workers} threads", lambda: open_many(replays, workers, False)),
+        (f"open_many() {workers} procs", lambda: open_many(replays, workers, True)),
+    ]:
+        start: float = perf_counter()
+        decoded: int = await run()
+        elapsed: float = perf_counter() - start
+        assert decoded == len(replays), f"{name}: not all replays decoded"
+        print(
+            f"{name:<26}: {decoded} files in {elapsed:.2f}s ({decoded / elapsed:,.0f} files/s)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
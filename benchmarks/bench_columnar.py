@@ -0,0 +1,66 @@
+"""
+Benchmark flattening players_data of replays into Arrow tables
+
+Usage: python benchmarks/bench_columnar.py [REPLAYS]
+"""
+
+import json
+import sys
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import pyarrow  # type: ignore
+
+from blitzmodels.wotinspector import Replay, players_table
+from blitzmodels.wotinspector.columnar import players_schema
+
+REPLAYS: int = 20_000
+
+
+def model_dump(replays: List[Replay]) -> pyarrow.Table:
+    """Baseline: dump each player and replay to a dict"""
+    names: List[str] = players_schema().names
+    rows: List[Dict[str, Any]] = list()
+    for replay in replays:
+        replay_row: Dict[str, Any] = replay.model_dump()
+        replay_row["version"] = replay.game_version.get("name")
+        replay_row["arena_unique_id"] = int(replay.arena_unique_id)
+        for player in replay.players_data:
+            row: Dict[str, Any] = replay_row | player.model_dump()
+            rows.append({name: row[name] for name in names})
+    return pyarrow.Table.from_pylist(rows, schema=players_schema())
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else REPLAYS
+    example: Replay = Replay.example_instance()
+    replay_json: str = example.model_dump_json(by_alias=True)
+    replays: List[Replay] = [
+        example.model_copy(update={"id": f"{i}".zfill(32)}) for i in range(n)
+    ]
+    lines: List[str] = [replay_json] * n
+
+    run: Callable[[], pyarrow.Table]
+    for name, run in [
+        ("model_dump()", lambda: model_dump(replays)),
+        ("players_table(Replay)", lambda: players_table(replays)),
+        (
+            "parse + players_table(Replay)",
+            lambda: players_table(Replay.model_validate_json(line) for line in lines),
+        ),
+        (
+            "json.loads + players_table(dict)",
+            lambda: players_table(json.loads(line) for line in lines),
+        ),
+    ]:
+        start: float = perf_counter()
+        table: pyarrow.Table = run()
+        elapsed: float = perf_counter() - start
+        print(
+            f"{name:<34}: {n / elapsed:>9,.0f} replays/s, "
+            f"{table.num_rows / elapsed:>10,.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark aggregating shots of BattleDetails
+
+Usage: python benchmarks/bench_heatmap.py [BATTLES]
+"""
+
+import random
+import sys
+from time import perf_counter
+from typing import Any, Dict, List
+
+from blitzmodels.wotinspector import ShotAggregator
+
+BATTLES: int = 100_000
+BATCH_SIZE: int = 1000  # battles
+SHOTS: int = 60  # per battle
+SEGMENTS: List[str] = ["hull_front", "hull_side", "hull_rear", "turret_front", "track"]
+
+
+def battle(rnd: random.Random, i: int) -> Dict[str, Any]:
+    """Return BattleDetails JSON of random shots"""
+    shots: List[Dict[str, Any]] = list()
+    for _ in range(SHOTS):
+        hit: bool = rnd.random() < 0.7
+        shots.append(
+            {
+                "time": rnd.uniform(0, 420),
+                "shooter": rnd.randint(1, 1000),
+                "target": rnd.randint(1, 1000) if hit else 0,
+                "has_damage": hit,
+                "shell_id": 1,
+                "turret_yaw": 0.0,
+                "gun_pitch": 0.0,
+                "segment": rnd.choice(SEGMENTS) if hit else "",
+                "distance": rnd.uniform(0, 600),
+                "nominal_pen": 250,
+                "nominal_damage": 300,
+                "damage": rnd.randint(200, 400) if hit else 0,
+            }
+        )
+    return {"id": str(i), "map_id": rnd.randint(1, 30), "shots": shots}
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else BATTLES
+    rnd = random.Random(0)
+    batch: List[Dict[str, Any]] = [battle(rnd, i) for i in range(BATCH_SIZE)]
+
+    aggregator = ShotAggregator()
+    start: float = perf_counter()
+    for _ in range(n // BATCH_SIZE):
+        aggregator.add(batch)
+    table = aggregator.distance_table()
+    elapsed: float = perf_counter() - start
+    shots: int = aggregator.battles * SHOTS
+    print(
+        f"{aggregator.battles} battles, {shots} shots: {elapsed:.2f}s "
+        f"({shots / elapsed:.0f} shots/s), {table.num_rows} map/distance groups"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark reading Blitz game maps.yaml with Maps.load_yaml() vs. yaml.safe_load()
+
+Usage: python benchmarks/bench_maps_yaml.py [MAPS_YAML] [RUNS]
+"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import yaml  # type: ignore
+
+from blitzmodels import Map, Maps
+
+MAPS_YAML: Path = Path(__file__).parent.parent / "tests" / "05_maps.yaml"
+RUNS: int = 20
+
+
+def load_safe_load(path: Path, loader: Any) -> Maps:
+    """Previous implementation: construct the whole document"""
+    maps = Maps()
+    with open(path, "r", encoding="utf-8") as file:
+        maps_yaml: Dict[str, Any] = yaml.load(file, Loader=loader)
+    for key, map_cfg in maps_yaml["maps"].items():
+        maps.add(
+            Map(
+                id=int(map_cfg["id"]),
+                key=key,
+                modes=map_cfg["availableModes"],
+                localization_code=map_cfg["localName"],
+            )
+        )
+    return maps
+
+
+def load_streaming(path: Path) -> Maps:
+    if (maps := Maps.read_yaml(path)) is None:
+        raise ValueError(f"could not read {path}")
+    return maps
+
+
+def main() -> None:
+    path: Path = Path(sys.argv[1]) if len(sys.argv) > 1 else MAPS_YAML
+    runs: int = int(sys.argv[2]) if len(sys.argv) > 2 else RUNS
+    size: float = path.stat().st_size / 1024
+
+    loaders: Dict[str, Callable[[Path], Maps]] = {
+        "safe_load (SafeLoader)": lambda p: load_safe_load(p, yaml.SafeLoader),
+        "Maps.read_yaml()": load_streaming,
+    }
+    if yaml.__with_libyaml__:
+        loaders["safe_load (CSafeLoader)"] = lambda p: load_safe_load(
+            p, yaml.CSafeLoader
+        )
+
+    reference: Maps | None = None
+    for name, load in loaders.items():
+        times: List[float] = list()
+        for _ in range(runs):
+            start: float = perf_counter()
+            maps: Maps = load(path)
+            times.append(perf_counter() - start)
+        if reference is None:
+            reference = maps
+        assert maps.model_dump() == reference.model_dump(), f"{name}: maps differ"
+        best: float = min(times)
+        print(
+            f"{name:<24}: {len(maps)} maps in {best * 1000:.1f}ms "
+            f"({size / best:,.0f} KB/s, best of {runs})"
+        )
+    print(f"libyaml available: {yaml.__with_libyaml__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark converting V1 replay JSON (ReplayJSON) to V2 Replays
+
+Usage: python benchmarks/bench_migrate.py [REPLAYS]
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List
+
+from blitzmodels.wotinspector import Replay, ReplayJSON, migrate_replays
+from blitzmodels.wotinspector.migrate import MigrateStats, convert_batch
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+REPLAYS: int = 10_000
+
+
+def read_replays(n: int) -> List[str]:
+    """Read n compact V1 replay JSON documents of the test replays"""
+    docs: List[str] = [
+        json.dumps(json.loads(path.read_text()))
+        for path in sorted(REPLAY_DIR.glob("*.wotbreplay.json"))
+    ]
+    return [docs[i % len(docs)] for i in range(n)]
+
+
+def from_models(lines: List[str]) -> int:
+    """Baseline: validate ReplayJSON and convert it with Replay.from_ReplayJSON()"""
+    converted: int = 0
+    for line in lines:
+        replay_json: ReplayJSON = ReplayJSON.model_validate_json(line)
+        replay: Replay | None = Replay.from_ReplayJSON(replay_json)
+        if replay is not None:
+            replay.model_dump_json()
+            converted += 1
+    return converted
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else REPLAYS
+    lines: List[str] = read_replays(n)
+
+    run: Callable[[], int]
+    for name, run in [
+        ("ReplayJSON -> Replay.from_ReplayJSON()", lambda: from_models(lines)),
+        (
+            "convert_batch(validate=True)",
+            lambda: len(convert_batch(lines, False, True)[0]),
+        ),
+        ("convert_batch()", lambda: len(convert_batch(lines)[0])),
+    ]:
+        start: float = perf_counter()
+        converted: int = run()
+        elapsed: float = perf_counter() - start
+        print(f"{name:<40}: {converted / elapsed:>9,.0f} replays/s")
+
+    with TemporaryDirectory() as tmp:
+        source: Path = Path(tmp) / "replays_v1.ndjson"
+        source.write_text("\n".join(lines) + "\n")
+        for validate in [True, False]:
+            stats: MigrateStats = asyncio.run(
+                migrate_replays(
+                    [source], Path(tmp) / "replays_v2.ndjson", validate=validate
+                )
+            )
+            name = f"migrate_replays(validate={validate})"
+            print(f"{name:<40}: {stats.rate:>9,.0f} replays/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark scanning, rescanning and querying a replay archive
+
+Usage: python benchmarks/bench_replay_archive.py [COPIES] [WORKERS]
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List
+
+from blitzmodels import ReplayArchive
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+COPIES: int = 200
+WORKERS: int = 4
+FILES_PER_DIR: int = 100
+
+
+def make_tree(root: Path, copies: int) -> int:
+    """Hard link test replays into a directory tree"""
+    replays: List[Path] = sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+    count: int = 0
+    for i in range(copies):
+        for replay in replays:
+            subdir: Path = root / str(count // FILES_PER_DIR)
+            subdir.mkdir(exist_ok=True)
+            os.link(replay, subdir / f"{i}_{replay.name}")
+            count += 1
+    return count
+
+
+async def main() -> None:
+    copies: int = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    workers: int = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    with TemporaryDirectory() as tmp:
+        root = Path(tmp) / "replays"
+        root.mkdir()
+        files: int = make_tree(root, copies)
+        async with ReplayArchive(Path(tmp) / "archive.db") as archive:
+            for name in ["scan", "rescan"]:
+                start: float = perf_counter()
+                stats = await archive.scan([root], workers=workers)
+                elapsed: float = perf_counter() - start
+                print(f"{name:<8}: {stats} ({files / elapsed:,.0f} files/s)")
+
+            start = perf_counter()
+            found: int = len(
+                [
+                    entry
+                    async for entry in archive.find(
+                        vehicle="E-50", map_name="fort", version="6"
+                    )
+                ]
+            )
+            elapsed = perf_counter() - start
+            print(f"{'query':<8}: {found} replays in {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Benchmark memory use of scanning a batch of replays with and without
+keeping replay data in memory
+
+Usage: python benchmarks/bench_replay_memory.py [COPIES]
+"""
+
+import asyncio
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+from typing import List
+
+from blitzmodels import ReplayFile
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+COPIES: int = 20
+
+
+async def scan(replays: List[Path], keep_data: bool, meta_only: bool) -> None:
+    replay_files: List[ReplayFile] = list()
+    tracemalloc.start()
+    start: float = perf_counter()
+    async for replay in ReplayFile.open_many(
+        replays, keep_data=keep_data, meta_only=meta_only, workers=4
+    ):
+        _ = replay.hash
+        replay_files.append(replay)
+    elapsed: float = perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"keep_data={keep_data!s:<5} meta_only={meta_only!s:<5}: "
+        f"{len(replay_files)} replays in {elapsed:.2f}s, "
+        f"peak {peak / 2**20:.1f}MB, retained {current / 2**20:.1f}MB"
+    )
+
+
+async def main() -> None:
+    copies: int = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    replays: List[Path] = sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+    replays = replays * copies
+    size: int = sum(path.stat().st_size for path in replays)
+    print(f"{len(replays)} replays, {size / 2**20:.1f}MB")
+    for keep_data, meta_only in [(True, False), (False, False), (False, True)]:
+        await scan(replays, keep_data, meta_only)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Benchmark opening replay files one by one vs. ReplayFile.open_many()
+
+Usage: python benchmarks/bench_replay_open.py [COPIES] [WORKERS]
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import List
+
+from blitzmodels import ReplayFile
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+COPIES: int = 50
+WORKERS: int = 4
+
+
+def replay_files(copies: int) -> List[Path]:
+    replays: List[Path] = sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+    return replays * copies
+
+
+async def open_sequential(replays: List[Path]) -> int:
+    opened: int = 0
+    for path in replays:
+        replay = ReplayFile(path)
+        await replay.open()
+        opened += 1
+    return opened
+
+
+async def open_many(replays: List[Path], workers: int, processes: bool) -> int:
+    opened: int = 0
+    async for _ in ReplayFile.open_many(replays, workers=workers, processes=processes):
+        opened += 1
+    return opened
+
+
+async def main() -> None:
+    copies: int = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    workers: int = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    replays: List[Path] = replay_files(copies)
+
+    for name, run in [
+        ("sequential open()", lambda: open_sequential(replays)),
+        (f"open_many() {workers} threads", lambda: open_many(replays, workers, False)),
+        (f"open_many() {workers} procs", lambda: open_many(replays, workers, True)),
+    ]:
+        start: float = perf_counter()
+        opened: int = await run()
+        elapsed: float = perf_counter() - start
+        assert opened == len(replays), f"{name}: not all replays opened"
+        print(
+            f"{name:<26}: {opened} files in {elapsed:.2f}s ({opened / elapsed:,.0f} files/s)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark streaming packets from data.wotreplay and extracting shots
+
+Usage: python benchmarks/bench_replay_packets.py [COPIES]
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from struct import Struct
+from time import perf_counter
+from typing import Callable, List
+from zipfile import ZipFile
+
+from blitzmodels import ReplayFile
+from blitzmodels.replay_packets import PacketType
+from blitzmodels.wotinspector.shots import read_shots
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+COPIES: int = 5
+
+_HEADER = Struct("<IIf")
+
+
+def replay_files(copies: int) -> List[Path]:
+    replays: List[Path] = sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+    return replays * copies
+
+
+def read_all(replay_file: ReplayFile) -> int:
+    """Baseline: decompress the whole stream and slice payloads into bytes"""
+    assert replay_file.path is not None
+    with ZipFile(replay_file.path) as zreplay:
+        data: bytes = zreplay.read("data.wotreplay")
+    pos: int = 4 + 8
+    pos += 1 + data[pos]
+    pos += 1 + data[pos]
+    count: int = 0
+    while pos < len(data):
+        size, _, _ = _HEADER.unpack_from(data, pos)
+        data[pos + _HEADER.size : pos + _HEADER.size + size]
+        pos += _HEADER.size + size
+        count += 1
+    return count
+
+
+def stream_all(replay_file: ReplayFile) -> int:
+    return sum(1 for _ in replay_file.packets())
+
+
+def stream_methods(replay_file: ReplayFile) -> int:
+    return sum(1 for _ in replay_file.packets({PacketType.entity_method}))
+
+
+def shots(replay_file: ReplayFile) -> int:
+    return len(read_shots(replay_file))
+
+
+async def main() -> None:
+    copies: int = int(sys.argv[1]) if len(sys.argv) > 1 else COPIES
+    replays: List[ReplayFile] = list()
+    for path in replay_files(copies):
+        replay_file = ReplayFile(path, keep_data=False)
+        await replay_file.open(meta_only=True)
+        replays.append(replay_file)
+
+    run: Callable[[ReplayFile], int]
+    for name, run in [
+        ("read all + slice", read_all),
+        ("packets()", stream_all),
+        ("packets(entity_method)", stream_methods),
+        ("read_shots()", shots),
+    ]:
+        start: float = perf_counter()
+        count: int = sum(run(replay_file) for replay_file in replays)
+        elapsed: float = perf_counter() - start
+        print(
+            f"{name:<24}: {len(replays) / elapsed:,.0f} replays/s, "
+            f"{count / elapsed:,.0f} items/s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Benchmark peak memory of building replay upload bodies in memory vs. streaming
+
+Usage: python benchmarks/bench_replay_upload.py [UPLOADS]
+"""
+
+import asyncio
+import sys
+import tracemalloc
+from base64 import b64encode
+from pathlib import Path
+from time import perf_counter
+from typing import Awaitable, Callable, List
+from urllib.parse import urlencode
+
+from blitzmodels import ReplayFile
+from blitzmodels.wotinspector.wi_apiv1 import _b64_urlencoded
+
+REPLAY_DIR: Path = Path(__file__).parent.parent / "tests"
+UPLOADS: int = 20
+
+
+def replay_files() -> List[Path]:
+    return sorted(
+        path
+        for path in REPLAY_DIR.glob("*.wotbreplay")
+        if path.name != "BROKEN.wotbreplay"
+    )
+
+
+async def in_memory(replay_file: ReplayFile) -> int:
+    """Baseline: read the replay into memory and base64 encode it at once"""
+    assert replay_file.path is not None
+    body: str = urlencode(
+        {"file": (replay_file.path.name, b64encode(replay_file.data))}, doseq=True
+    )
+    await asyncio.sleep(0.1)  # the body is kept in memory while it is sent
+    return len(body)
+
+
+async def streamed(replay_file: ReplayFile) -> int:
+    assert replay_file.path is not None
+    size: int = 0
+    with replay_file.stream() as stream:
+        async for chunk in _b64_urlencoded("file", replay_file.path.name, stream):
+            size += len(chunk)
+    return size
+
+
+async def main() -> None:
+    uploads: int = int(sys.argv[1]) if len(sys.argv) > 1 else UPLOADS
+    replays: List[ReplayFile] = list()
+    for path in (replay_files() * uploads)[:uploads]:
+        replay_file = ReplayFile(path, keep_data=False)
+        await replay_file.open()
+        replays.append(replay_file)
+
+    run: Callable[[ReplayFile], Awaitable[int]]
+    for name, run in [("in memory", in_memory), ("streamed", streamed)]:
+        tracemalloc.start()
+        start: float = perf_counter()
+        sizes: List[int] = await asyncio.gather(*[run(replay) for replay in replays])
+        elapsed: float = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{name:<10}: {uploads} concurrent uploads, {sum(sizes) / 2**20:.1f} MiB "
+            f"in {elapsed:.2f}s, peak memory {peak / 2**20:.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
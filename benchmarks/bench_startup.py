@@ -0,0 +1,60 @@
+"""
+Benchmark opening the packaged Tankopedia and Maps with and without snapshots.
+
+Each run is timed in a fresh interpreter to include the cold start cost.
+
+Usage: python benchmarks/bench_startup.py [RUNS]
+"""
+
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List
+
+RUNS: int = 10
+
+OPEN: str = """
+from time import perf_counter
+start = perf_counter()
+from blitzmodels import Maps, WGApiWoTBlitzTankopedia
+imported = perf_counter()
+assert WGApiWoTBlitzTankopedia.open_default(snapshot={snapshot}) is not None
+assert Maps.open_default(snapshot={snapshot}) is not None
+print(imported - start, perf_counter() - imported)
+"""
+
+
+def run(snapshot: bool, cache_dir: str) -> tuple[float, float, float]:
+    start: float = perf_counter()
+    res = subprocess.run(
+        [sys.executable, "-c", OPEN.format(snapshot=snapshot)],
+        env={**os.environ, "BLITZMODELS_CACHE_DIR": cache_dir},
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    total: float = perf_counter() - start
+    imported, opened = (float(t) for t in res.stdout.split())
+    return total, imported, opened
+
+
+def main() -> None:
+    runs: int = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    with TemporaryDirectory() as cache_dir:
+        run(True, cache_dir)  # write snapshots
+        for snapshot in [False, True]:
+            times: List[tuple[float, float, float]] = [
+                run(snapshot, cache_dir) for _ in range(runs)
+            ]
+            total, imported, opened = (min(t) for t in zip(*times))
+            print(
+                f"snapshot={snapshot!s:<5}: process {total * 1000:.1f}ms, "
+                f"import {imported * 1000:.1f}ms, open_default() {opened * 1000:.1f}ms "
+                f"(best of {runs})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark joining TankStat rows to Tankopedia tank tier & type
+
+Usage: python benchmarks/bench_tankopedia_join.py [ROWS]
+"""
+
+import sys
+from random import choices
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from blitzmodels import Tank, TankStat, WGApiWoTBlitzTankopedia, WGTankStatAll
+
+ROWS: int = 1_000_000
+
+
+def make_stats(tank_ids: List[int], rows: int) -> List[TankStat]:
+    """Create TankStat rows without validation"""
+    all = WGTankStatAll.model_construct()
+    return [
+        TankStat.model_construct(
+            all=all, last_battle_time=0, account_id=1, tank_id=tank_id
+        )
+        for tank_id in choices(tank_ids, k=rows)
+    ]
+
+
+def join_str_keys(
+    tankopedia: WGApiWoTBlitzTankopedia, stats: List[TankStat]
+) -> List[Tuple[int, str]]:
+    data = tankopedia.data
+    res: List[Tuple[int, str]] = list()
+    for ts in stats:
+        tank: Tank = data[str(ts.tank_id)]
+        res.append((tank.tier, tank.type))
+    return res
+
+
+def join_get(
+    tankopedia: WGApiWoTBlitzTankopedia, stats: List[TankStat]
+) -> List[Tuple[int, str]]:
+    get = tankopedia.get
+    res: List[Tuple[int, str]] = list()
+    for ts in stats:
+        if (tank := get(ts.tank_id)) is not None:
+            res.append((tank.tier, tank.type))
+    return res
+
+
+def join_get_many(
+    tankopedia: WGApiWoTBlitzTankopedia, stats: List[TankStat]
+) -> List[Tuple[int, str]]:
+    return [
+        (tank.tier, tank.type)
+        for tank in tankopedia.get_many(ts.tank_id for ts in stats)
+        if tank is not None
+    ]
+
+
+def main() -> None:
+    rows: int = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    if (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is None:
+        raise SystemExit("could not open packaged tankopedia")
+    stats: List[TankStat] = make_stats(list(tankopedia.tank_ids()), rows)
+
+    join: Callable[[WGApiWoTBlitzTankopedia, List[TankStat]], List[Tuple[int, str]]]
+    for join in [join_str_keys, join_get, join_get_many]:
+        start: float = perf_counter()
+        res = join(tankopedia, stats)
+        elapsed: float = perf_counter() - start
+        assert len(res) == rows, f"{join.__name__}: rows missing"
+        print(
+            f"{join.__name__:<15}: {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
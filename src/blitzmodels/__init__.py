@@ -36,6 +36,25 @@ from .wg_api import (
     add_args_wg as add_args_wg,
 )
 from .replay import ReplayFile as ReplayFile, ReplayFileMeta as ReplayFileMeta
+from .replay_archive import (
+    ArchiveEntry as ArchiveEntry,
+    ReplayArchive as ReplayArchive,
+)
+from .replay_packets import (
+    PacketHeader as PacketHeader,
+    PacketReader as PacketReader,
+    PacketType as PacketType,
+)
+from .replay_index import (
+    ReplayIndex as ReplayIndex,
+    ReplayUpload as ReplayUpload,
+    UploadQueue as UploadQueue,
+)
+from .mongodb import (
+    BulkWriteStats as BulkWriteStats,
+    MongoBulkWriter as MongoBulkWriter,
+)
+from .snapshot import LazySnapshot as LazySnapshot
 
 
 __all__ = [
@@ -43,9 +62,16 @@ __all__ = [
     "account",
     "config",
     "map",
+    "mongodb",
     "release",
     "region",
     "replay",
+    "replay_archive",
+    "replay_index",
+    "replay_packets",
+    "snapshot",
+    "sqlite_store",
+    "stats",
     "tank",
     "wg_api",
 ]
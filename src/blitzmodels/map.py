@@ -1,19 +1,45 @@
+import asyncio
 import logging
 
 # import json
 # from warnings import warn
-from typing import List, ClassVar, Self, Dict, Optional
+from typing import (
+    Any,
+    List,
+    ClassVar,
+    Self,
+    Dict,
+    Iterator,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
 from enum import IntEnum, StrEnum
 from pydantic import (
-    # model_validator,
+    model_validator,
     ConfigDict,
     Field,
     # ValidationError,
 )
-import aiofiles
 from pathlib import Path
 from re import Pattern, compile, Match
-from yaml import safe_load  # type: ignore
+from yaml import YAMLError, load, parse  # type: ignore
+from yaml.events import (  # type: ignore
+    Event,
+    CollectionStartEvent,
+    CollectionEndEvent,
+    MappingStartEvent,
+    MappingEndEvent,
+    ScalarEvent,
+    SequenceStartEvent,
+    SequenceEndEvent,
+)
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # type: ignore
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
 from importlib.resources.abc import Traversable
 from importlib.resources import as_file
 import importlib
@@ -24,6 +50,8 @@ from pydantic_exportables import (
     Idx,
 )
 
+from .snapshot import load_snapshot, shared_default, snapshots_enabled
+
 logger = logging.getLogger()
 error = logger.error
 message = logger.warning
@@ -107,6 +135,65 @@ class Map(JSONExportable):
         return self.id
 
 
+def _yaml_mapping(events: Iterator[Event]) -> Iterator[Tuple[str, Event]]:
+    """
+    Iterate keys and first events of values of a YAML mapping whose
+    MappingStartEvent has been consumed. The caller must consume each value
+    with _yaml_value() or _yaml_skip() before the next iteration.
+    """
+    for event in events:
+        if isinstance(event, MappingEndEvent):
+            return
+        if not isinstance(event, ScalarEvent):
+            raise ValueError(f"unsupported YAML mapping key: {event}")
+        yield event.value, next(events)
+
+
+def _yaml_skip(events: Iterator[Event], event: Event) -> None:
+    """Skip YAML node starting with 'event' without constructing it"""
+    depth: int = 0
+    while True:
+        if isinstance(event, CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            depth -= 1
+        if depth == 0:
+            return
+        event = next(events)
+
+
+def _yaml_value(events: Iterator[Event], event: Event) -> Any:
+    """Construct YAML node starting with 'event'. Scalars are returned as str"""
+    if isinstance(event, ScalarEvent):
+        return event.value
+    elif isinstance(event, SequenceStartEvent):
+        res: List[Any] = list()
+        for event in events:
+            if isinstance(event, SequenceEndEvent):
+                return res
+            res.append(_yaml_value(events, event))
+    elif isinstance(event, MappingStartEvent):
+        return {key: _yaml_value(events, event) for key, event in _yaml_mapping(events)}
+    raise ValueError(f"unsupported YAML node: {event}")
+
+
+def _yaml_find_key(events: Iterator[Event], key: str) -> Event | None:
+    """
+    Consume events until root mapping 'key' and return the first event of its
+    value. Returns None if not found
+    """
+    for event in events:
+        if isinstance(event, MappingStartEvent):
+            break
+    else:
+        return None
+    for name, event in _yaml_mapping(events):
+        if name == key:
+            return event
+        _yaml_skip(events, event)
+    return None
+
+
 class Maps(JSONExportableRootDict[int, Map]):
     """Container model for Maps"""
 
@@ -114,6 +201,16 @@ class Maps(JSONExportableRootDict[int, Map]):
     _exclude_defaults = False
 
     _re_localization: ClassVar[Pattern] = compile(r"^#maps:(\w+):(.+?\/.+)$")
+    _re_normalize: ClassVar[Pattern] = compile(r"[\s\-.]+")
+    _re_variant: ClassVar[Pattern] = compile(r"_\d{2}$")
+    _yaml_fields: ClassVar[Set[str]] = {"id", "availableModes", "localName"}
+
+    # secondary indexes: key/localization_code -> map ids
+    _key_index: Dict[str, List[int]] = dict()
+    _lc_index: Dict[str, List[int]] = dict()
+    _index_size: int = -1
+    # normalized key/name/localization_code -> map id, None = needs rebuild
+    _lookup: Dict[str, int] | None = None
 
     model_config = ConfigDict(
         frozen=False,
@@ -122,50 +219,152 @@ class Maps(JSONExportableRootDict[int, Map]):
         from_attributes=True,
     )
 
+    @model_validator(mode="after")
+    def _validate_indexes(self) -> Self:
+        self._update_indexes()
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        """Compare maps. The private indexes are ignored since they are built lazily"""
+        if not isinstance(other, Maps):
+            return NotImplemented
+        return self.root == other.root
+
     @classmethod
     async def open_yaml(
-        cls, filename: Path | str, exceptions: bool = False
+        cls,
+        filename: Path | str,
+        exceptions: bool = False,
+        localization: Path | str | None = None,
     ) -> Self | None:
         """
-        Read Maps from Blitz game maps.yaml file
+        Read Maps from Blitz game maps.yaml file and optionally map names
+        from Blitz game localization file 'en.yaml'
         """
         try:
-            async with aiofiles.open(file=filename, mode="r", encoding="utf-8") as file:
-                debug(f"yaml file opened: {str(filename)}")
-                return cls.load_yaml(await file.read())
+            return await asyncio.to_thread(cls.read_yaml, filename, localization)
         except OSError as err:
             debug(f"Error reading file: {filename}: {err}")
+        except (ValueError, YAMLError) as err:
+            error(f"could not parse YAML file: {filename}: {err}")
         return None
 
     @classmethod
-    def load_yaml(cls, yaml_doc: str) -> Self | None:
+    def read_yaml(
+        cls, filename: Path | str, localization: Path | str | None = None
+    ) -> Self | None:
+        """
+        Read Maps from Blitz game maps.yaml file and optionally map names
+        from Blitz game localization file 'en.yaml'. Both files are streamed.
+        """
+        maps: Self | None
+        with open(filename, "r", encoding="utf-8") as file:
+            debug(f"yaml file opened: {str(filename)}")
+            if (maps := cls.load_yaml(file)) is None:
+                return None
+        if localization is not None:
+            with open(localization, "r", encoding="utf-8") as file:
+                maps.add_names(cls.load_localization_yaml(file))
+        return maps
+
+    @classmethod
+    def load_yaml(cls, yaml_doc: str | TextIO) -> Self | None:
         """
-        Read Maps from Blitz game maps.yaml input
+        Read Maps from Blitz game maps.yaml input.
+
+        The input is parsed incrementally and only the needed map config fields
+        are constructed. Input using YAML aliases in the map configs is read
+        with safe_load() instead. Raises ValueError or YAMLError on invalid input
         """
         try:
-            maps: Self = cls()
-            maps_yaml = safe_load(yaml_doc)
-            for key, map_cfg in maps_yaml["maps"].items():
-                try:
-                    map_id: int = int(map_cfg["id"])
-                    modes: List[int] = map_cfg["availableModes"]
-                    localization_code: str = map_cfg["localName"]
-                    maps.add(
-                        Map(
-                            id=map_id,
-                            key=key,
-                            modes=modes,
-                            localization_code=localization_code,
-                        )
-                    )
-                except KeyError as err:
-                    error(f"could not read map config for map_key={key}: {err}")
-            if len(maps) > 0:
-                return maps
-        except KeyError:
+            return cls._stream_yaml(yaml_doc)
+        except ValueError as err:
+            debug(f"could not stream YAML input, using safe_load(): {err}")
+        if not isinstance(yaml_doc, str):
+            yaml_doc.seek(0)
+        return cls._load_yaml_tree(load(yaml_doc, Loader=SafeLoader))
+
+    @classmethod
+    def _load_yaml_tree(cls, maps_yaml: Any) -> Self | None:
+        """Read Maps from maps.yaml constructed with safe_load()"""
+        if not isinstance(maps_yaml, dict) or "maps" not in maps_yaml:
+            error("no YAML root key 'maps' found in input")
+            return None
+        if not isinstance(maps_yaml["maps"], dict):
+            error("YAML root key 'maps' is not a mapping")
+            return None
+        maps: Self = cls()
+        for key, map_cfg in maps_yaml["maps"].items():
+            cls._add_map_cfg(maps, key, map_cfg if isinstance(map_cfg, dict) else {})
+        if len(maps) > 0:
+            return maps
+        return None
+
+    @classmethod
+    def _add_map_cfg(cls, maps: Self, key: str, map_cfg: Dict[str, Any]) -> None:
+        try:
+            maps.add(
+                Map(
+                    id=int(map_cfg["id"]),
+                    key=key,
+                    modes=[int(mode) for mode in map_cfg["availableModes"]],
+                    localization_code=map_cfg["localName"],
+                )
+            )
+        except KeyError as err:
+            error(f"could not read map config for map_key={key}: {err}")
+
+    @classmethod
+    def _stream_yaml(cls, yaml_doc: str | TextIO) -> Self | None:
+        """
+        Read Maps from maps.yaml parser events. Raises ValueError for YAML
+        aliases and other unsupported nodes
+        """
+        maps: Self = cls()
+        events: Iterator[Event] = parse(yaml_doc, Loader=SafeLoader)
+        if (event := _yaml_find_key(events, "maps")) is None:
             error("no YAML root key 'maps' found in input")
+            return None
+        if not isinstance(event, MappingStartEvent):
+            error("YAML root key 'maps' is not a mapping")
+            return None
+        for key, event in _yaml_mapping(events):
+            map_cfg: Dict[str, Any] = dict()
+            if isinstance(event, MappingStartEvent):
+                for field, event in _yaml_mapping(events):
+                    if field in cls._yaml_fields:
+                        map_cfg[field] = _yaml_value(events, event)
+                    else:
+                        _yaml_skip(events, event)
+            else:
+                _yaml_skip(events, event)
+            cls._add_map_cfg(maps, key, map_cfg)
+        if len(maps) > 0:
+            return maps
         return None
 
+    @classmethod
+    def load_localization_yaml(
+        cls, yaml_doc: str | TextIO, prefix: str = "#maps:"
+    ) -> Dict[str, str]:
+        """
+        Read localization strings starting with 'prefix' from Blitz game
+        localization file 'en.yaml' input. The input is parsed incrementally.
+        """
+        res: Dict[str, str] = dict()
+        events: Iterator[Event] = parse(yaml_doc, Loader=SafeLoader)
+        for event in events:
+            if isinstance(event, MappingStartEvent):
+                break
+        else:
+            return res
+        for key, event in _yaml_mapping(events):
+            if key.startswith(prefix) and isinstance(event, ScalarEvent):
+                res[key] = event.value
+            else:
+                _yaml_skip(events, event)
+        return res
+
     @classmethod
     def default_path(cls) -> Path:
         """
@@ -178,41 +377,180 @@ class Maps(JSONExportableRootDict[int, Map]):
             return maps_fn
 
     @classmethod
-    def open_default(cls) -> Optional[Self]:
+    def open_default(cls, snapshot: bool | None = None) -> Optional[Self]:
         """
-        Open maps shipped with the package
+        Open maps shipped with the package. Uses a binary snapshot
+        of the validated maps if snapshot=True, or by default if
+        BLITZMODELS_CACHE_DIR is set. See blitzmodels.snapshot
         """
+        if snapshot is None:
+            snapshot = snapshots_enabled()
+        if snapshot:
+            return load_snapshot(cls.default_path(), cls.parse_str, cls)
         with open(cls.default_path(), "r", encoding="utf-8") as file:
             return cls.parse_str(file.read())
 
-    def get_by_key(self, key: str) -> Map | None:
-        """A brute-force map search by key"""
+    @classmethod
+    def default(cls, copy: bool = True) -> Self:
+        """
+        Return a copy of the process-wide cached maps shipped with
+        the package. copy=False returns the cached instance itself: it is
+        shared and must not be modified.
+        """
+        return shared_default(cls, cls.open_default).get(copy=copy)
+
+    @classmethod
+    def refresh_default(cls) -> Self:
+        """Reload the cached default maps"""
+        return shared_default(cls, cls.open_default).refresh()
+
+    @classmethod
+    def share_default(cls) -> str:
+        """
+        Publish the default maps to worker processes via shared memory.
+        Returns shared memory name for attach_default()
+        """
+        return shared_default(cls, cls.open_default).share()
+
+    @classmethod
+    def attach_default(cls, name: str) -> None:
+        """Load the default maps from shared memory, e.g. in a pool initializer"""
+        shared_default(cls, cls.open_default).attach(name)
+
+    @classmethod
+    def unshare_default(cls) -> None:
+        """Release shared memory of share_default()"""
+        shared_default(cls, cls.open_default).unshare()
+
+    def _update_indexes(self) -> None:
+        """Rebuild key and localization_code indexes"""
+        self._key_index = dict()
+        self._lc_index = dict()
+        self._lookup = None
         for map in self.root.values():
-            if map.key == key:
-                return map
+            self._index_add(map)
+        self._index_size = len(self.root)
+
+    def _check_indexes(self) -> None:
+        """Rebuild indexes if root has been modified directly"""
+        if self._index_size != len(self.root):
+            self._update_indexes()
+
+    def _index_add(self, map: Map) -> None:
+        self._key_index.setdefault(map.key, list()).append(map.id)
+        self._lc_index.setdefault(map.localization_code, list()).append(map.id)
+
+    def _index_remove(self, map: Map) -> None:
+        for index, value in [
+            (self._key_index, map.key),
+            (self._lc_index, map.localization_code),
+        ]:
+            try:
+                ids: List[int] = index[value]
+                ids.remove(map.id)
+                if len(ids) == 0:
+                    del index[value]
+            except (KeyError, ValueError):
+                pass
+
+    def add(self, item: Map) -> None:
+        """Add or replace map"""
+        self._check_indexes()
+        if (old := self.root.get(item.id)) is not None:
+            self._index_remove(old)
+        super().add(item)
+        self._index_add(item)
+        self._index_size = len(self.root)
+        self._lookup = None
+
+    def pop(self, map_id: int) -> Map:
+        """Remove map by id. Raises KeyError if map_id is not found"""
+        self._check_indexes()
+        map: Map = self.root.pop(map_id)
+        self._index_remove(map)
+        self._index_size = len(self.root)
+        self._lookup = None
+        return map
+
+    def __delitem__(self, map_id: int) -> None:
+        self.pop(map_id)
+
+    def update(self, new: "Maps") -> Tuple[Set[int], Set[int]]:
+        """Update maps with another Maps instance. Returns added and updated map ids"""
+        res: Tuple[Set[int], Set[int]] = super().update(new)
+        self._update_indexes()
+        return res
+
+    def get_by_key(self, key: str) -> Map | None:
+        """Return map by key"""
+        self._check_indexes()
+        try:
+            return self.root[self._key_index[key][0]]
+        except KeyError:
+            return None
+
+    def get_by_localization_code(self, localization_code: str) -> List[Map]:
+        """Return maps by localization_code. Map variants share the code"""
+        self._check_indexes()
+        return [
+            self.root[map_id] for map_id in self._lc_index.get(localization_code, [])
+        ]
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        """Normalize map key/name for lookup, e.g. 'Desert Sands' -> 'desert_sands'"""
+        return cls._re_normalize.sub("_", name.strip().lower()).strip("_")
+
+    def _build_lookup(self) -> Dict[str, int]:
+        """Build normalized lookup of keys, localization codes and names"""
+        lookup: Dict[str, int] = dict()
+        # later entries in the list have lower precedence
+        for map in reversed(self.root.values()):
+            for name in [map.name, map.localization_code.split("/")[0], map.key]:
+                if name != "":
+                    lookup[self.normalize(name)] = map.id
+        return lookup
+
+    def find(self, name: str) -> Map | None:
+        """
+        Find map by key, name or localization code, e.g. replay's 'mapName'.
+        Tries exact key first, then normalized key/name and the base map
+        of a map variant (e.g. 'canal_01' -> 'canal').
+        """
+        if (map := self.get_by_key(name)) is not None:
+            return map
+        if self._lookup is None:
+            self._lookup = self._build_lookup()
+        normalized: str = self.normalize(name)
+        for lookup_key in [normalized, self._re_variant.sub("", normalized)]:
+            try:
+                return self.root[self._lookup[lookup_key]]
+            except KeyError:
+                pass
         return None
 
     def add_names(self, localization_strs: Dict[str, str]) -> int:
         """Update maps from Blitz game localization strings 'en.yaml'"""
-        updated: int = 0
-        names: Dict[str, str] = dict()
-
+        self._check_indexes()
+        updated: Set[int] = set()
         for loc_key, name in localization_strs.items():
             # some Halloween map variants have the same short name
             if (
-                (match := self._re_localization.match(loc_key))
+                loc_key.startswith("#maps:")
+                and (match := self._re_localization.match(loc_key))
                 and (key := match.group(1))
                 and (loc_str := match.group(2))
             ):
-                names[f"{key}:{loc_str}"] = name
-
-        for map in self.root.values():
-            try:
-                map.name = names[f"{map.key}:{map.localization_code}"]
-                updated += 1
-            except KeyError:
-                debug(f"no name found for map id={map.id}, key={map.key}")
-        return updated
+                for map_id in self._lc_index.get(loc_str, []):
+                    map: Map = self.root[map_id]
+                    if map.key == key:
+                        map._set_skip_validation("name", name)
+                        updated.add(map_id)
+
+        for map_id in self.root.keys() - updated:
+            debug(f"no name found for map id={map_id}, key={self.root[map_id].key}")
+        self._lookup = None
+        return len(updated)
 
     # @classmethod
     # async def open_json(
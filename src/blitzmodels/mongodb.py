@@ -0,0 +1,206 @@
+"""
+Bulk writer for exporting JSONExportable models to MongoDB
+
+"""
+
+import asyncio
+import logging
+from types import UnionType
+from typing import (
+    Any,
+    AsyncIterable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+)
+
+from pydantic import BaseModel
+from pymongo import ReplaceOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+from pydantic_exportables import JSONExportable, BackendIndex
+
+from .stats import Stats
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+
+def _sub_model(annotation: Any) -> Type[BaseModel] | None:
+    """Return the pydantic model inside a field annotation, if any"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    origin = get_origin(annotation)
+    if origin is Union or origin is UnionType or origin in (list, tuple, set):
+        for arg in get_args(annotation):
+            if (model := _sub_model(arg)) is not None:
+                return model
+    return None
+
+
+def db_field_name(model: Type[BaseModel], field: str) -> str:
+    """
+    Resolve a (dotted) model field name to the field name used in the DB export.
+
+    JSONExportable models are exported by alias, e.g. TankStat 'account_id' -> 'a'
+    and ReplayData 'summary.protagonist' -> 's.p'
+    """
+    res: List[str] = list()
+    sub_model: Type[BaseModel] | None = model
+    for name in field.split("."):
+        if sub_model is None or name not in sub_model.model_fields:
+            # nested field without a model, use as is
+            res.append(name)
+            sub_model = None
+            continue
+        field_info = sub_model.model_fields[name]
+        res.append(name if field_info.alias is None else field_info.alias)
+        sub_model = _sub_model(field_info.annotation)
+    return ".".join(res)
+
+
+def db_index(model: Type[BaseModel], index: List[BackendIndex]) -> List[BackendIndex]:
+    """Map a backend index of model field names to DB field names"""
+    return [(db_field_name(model, field), order) for field, order in index]
+
+
+class BulkWriteStats(Stats):
+    """Statistics of MongoBulkWriter"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.read: int = 0
+        self.inserted: int = 0
+        self.updated: int = 0
+        self.unchanged: int = 0
+        self.errors: int = 0
+        self.batches: int = 0
+
+    def add_result(self, result: BulkWriteResult) -> None:
+        self.inserted += result.upserted_count
+        self.updated += result.modified_count
+        self.unchanged += result.matched_count - result.modified_count
+
+    @property
+    def rate(self) -> float:
+        """Documents written per second"""
+        return self.per_second(self.read - self.errors)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.read} read, {self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.errors} errors in {self.batches} batches: "
+            f"{self.elapsed:.2f}s ({self.rate:.0f} docs/s)"
+        )
+
+
+class MongoBulkWriter:
+    """
+    Write streams of JSONExportable models to a MongoDB collection
+    using unordered bulk upserts keyed on model's 'index'.
+
+    Backend indexes declared with model's backend_indexes() are created
+    on first write of each model type. pymongo's sync collection is run in
+    a worker thread so that the next batch is buffered while the previous
+    one is being written.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 1000
+
+    def __init__(
+        self,
+        collection: Collection,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        ensure_indexes: bool = True,
+    ) -> None:
+        assert batch_size > 0, "batch_size must be > 0"
+        self.collection: Collection = collection
+        self.batch_size: int = batch_size
+        self.ensure_indexes: bool = ensure_indexes
+        self.stats: BulkWriteStats = BulkWriteStats()
+        self._indexed: Set[Type[JSONExportable]] = set()
+        self._batch: List[ReplaceOne] = list()
+        self._pending: Optional[asyncio.Task] = None
+
+    def create_indexes(self, model: Type[JSONExportable]) -> List[str]:
+        """Create model's backend indexes to the collection, return index names"""
+        res: List[str] = list()
+        for index in model.backend_indexes():
+            try:
+                res.append(self.collection.create_index(db_index(model, index)))
+            except Exception as err:
+                error(f"could not create index {index} for {model.__name__}: {err}")
+        self._indexed.add(model)
+        return res
+
+    async def add(self, obj: JSONExportable) -> None:
+        """Add an object to the current batch and write it when full"""
+        if self.ensure_indexes and (model := type(obj)) not in self._indexed:
+            await asyncio.to_thread(self.create_indexes, model)
+        self._batch.append(ReplaceOne({"_id": obj.index}, obj.obj_db(), upsert=True))
+        self.stats.read += 1
+        if len(self._batch) >= self.batch_size:
+            await self._write_batch()
+
+    async def _write_batch(self) -> None:
+        """Start writing the current batch once the previous write has finished"""
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        if len(self._batch) > 0:
+            batch: List[ReplaceOne] = self._batch
+            self._batch = list()
+            self._pending = asyncio.create_task(self._bulk_write(batch))
+
+    async def _bulk_write(self, batch: List[ReplaceOne]) -> None:
+        self.stats.batches += 1
+        try:
+            res: BulkWriteResult = await asyncio.to_thread(
+                self.collection.bulk_write, batch, ordered=False
+            )
+            self.stats.add_result(res)
+        except BulkWriteError as err:
+            details: Mapping[str, Any] = err.details
+            self.stats.inserted += details.get("nUpserted", 0)
+            self.stats.updated += details.get("nModified", 0)
+            self.stats.unchanged += details.get("nMatched", 0) - details.get(
+                "nModified", 0
+            )
+            self.stats.errors += len(details.get("writeErrors", []))
+            error(f"{len(details.get('writeErrors', []))} errors in bulk write")
+        except Exception as err:
+            self.stats.errors += len(batch)
+            error(f"bulk write of {len(batch)} documents failed: {err}")
+
+    async def flush(self) -> BulkWriteStats:
+        """Write remaining objects and wait for writes to complete"""
+        await self._write_batch()
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        self.stats.stop()
+        return self.stats
+
+    async def write(
+        self, objs: AsyncIterable[JSONExportable] | Iterable[JSONExportable]
+    ) -> BulkWriteStats:
+        """Write a (async) stream of objects and return write stats"""
+        if isinstance(objs, AsyncIterable):
+            async for obj in objs:
+                await self.add(obj)
+        else:
+            for obj in objs:
+                await self.add(obj)
+        stats: BulkWriteStats = await self.flush()
+        verbose(f"{self.collection.name}: {stats}")
+        return stats
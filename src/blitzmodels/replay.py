@@ -1,14 +1,35 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from os import cpu_count
 from pydantic import Field
 from pathlib import Path
-from hashlib import md5
+from hashlib import file_digest, md5
+from contextlib import aclosing, contextmanager
+from mmap import mmap, ACCESS_READ
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Collection,
+    Container,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
 from zipfile import ZipFile
 from io import BytesIO
-import aiofiles
 
 from pydantic_exportables import JSONExportable
 from .release import Release
 from .wg_api import WGApiWoTBlitzTankopedia
 from .map import Maps
+from .replay_packets import Packet, PacketReader
 
 import logging
 
@@ -25,6 +46,14 @@ debug = logger.debug
 #
 ###########################################
 
+DEFAULT_WORKERS: int = min(8, cpu_count() or 1)
+
+T = TypeVar("T")
+
+# on_error(item, exception) callback of map_executor()
+OnError = Callable[[Any, BaseException], None]
+_END = object()
+
 
 class ReplayFileMeta(JSONExportable):
     version: str
@@ -46,8 +75,16 @@ class ReplayFileMeta(JSONExportable):
         """Return version as Release()"""
         return Release(release=".".join(self.version.split(".")[0:2]))
 
-    def update_title(self, tankopedia: WGApiWoTBlitzTankopedia, maps: Maps) -> str:
-        """Create 'title' based on replay meta"""
+    def update_title(
+        self,
+        tankopedia: WGApiWoTBlitzTankopedia | None = None,
+        maps: Maps | None = None,
+    ) -> str:
+        """Create 'title' based on replay meta. Uses default Tankopedia and Maps if not given"""
+        if tankopedia is None:
+            tankopedia = WGApiWoTBlitzTankopedia.default(copy=False)
+        if maps is None:
+            maps = Maps.default(copy=False)
         tank_name: str = ""
         map_name: str = ""
         if (
@@ -67,13 +104,21 @@ class ReplayFileMeta(JSONExportable):
 
 
 class ReplayFile:
-    """Class for reading WoT Blitz replay files"""
+    """
+    Class for reading WoT Blitz replay files.
 
-    def __init__(self, replay: bytes | Path | str):
+    If keep_data=False, a replay read from a file does not keep the file data
+    in memory: the hash is calculated by streaming the file and 'data' re-reads
+    the file on each access. Use mapped() for zero-copy access to the data.
+    """
+
+    def __init__(self, replay: bytes | Path | str, keep_data: bool = True):
         self._path: Path | None = None
-        self._data: bytes
-        self._hash: str
+        # _data and _hash are loaded lazily if opened with meta_only=True
+        self._data: bytes | None = None
+        self._hash: str | None = None
         self._opened: bool = False
+        self._keep_data: bool = keep_data
         self.meta: ReplayFileMeta
 
         if isinstance(replay, str):
@@ -93,30 +138,149 @@ class ReplayFile:
         #     raise ValueError(f"replay {path} is not a valid Zip file")
 
     def _calc_hash(self) -> str:
-        hash = md5()
         try:
-            hash.update(self._data)
+            if self._data is None and self._path is not None:
+                # stream the file instead of reading it into memory
+                with open(self._path, "rb") as replay:
+                    self._hash = file_digest(replay, "md5").hexdigest()
+            else:
+                self._hash = md5(self.data).hexdigest()
         except Exception as err:
             error(f"{err}")
             raise
-        self._hash = hash.hexdigest()
         return self._hash
 
-    async def open(self):
-        """Open replay"""
+    async def open(self, meta_only: bool = False):
+        """
+        Open replay. If meta_only=True, only 'meta.json' is read from the replay
+        file and the replay data is read and hashed when 'data' or 'hash'
+        is accessed.
+        """
         if self._opened or self._path is None:
-            error(f"replay has been opened already: replay_id={self._hash}")
+            error(f"replay has been opened already: {self._path}")
             return None
-        debug("opening replay: %s", str(self._path))
-        async with aiofiles.open(self._path, "rb") as replay:
-            self._data = await replay.read()
-            self._calc_hash()
+        await asyncio.to_thread(self._read, meta_only)
 
-        with ZipFile(BytesIO(self._data)) as zreplay:
-            with zreplay.open("meta.json") as meta_json:
-                self.meta = ReplayFileMeta.model_validate_json(meta_json.read())
+    def _read(self, meta_only: bool = False) -> None:
+        """Read, hash and parse replay file. Blocking"""
+        if self._path is None:
+            raise ValueError("replay has no path")
+        debug("opening replay: %s", str(self._path))
+        if meta_only or not self._keep_data:
+            # ZipFile seeks to the central directory and reads only meta.json
+            with ZipFile(self._path) as zreplay:
+                self._read_meta(zreplay)
+            if not meta_only:
+                self._calc_hash()
+        else:
+            self._load_data()
+            with ZipFile(BytesIO(self.data)) as zreplay:
+                self._read_meta(zreplay)
         self._opened = True
 
+    def _read_meta(self, zreplay: ZipFile) -> None:
+        with zreplay.open("meta.json") as meta_json:
+            self.meta = ReplayFileMeta.model_validate_json(meta_json.read())
+
+    def _load_data(self) -> bytes:
+        """Read replay file into memory and hash it. Blocking"""
+        if self._path is None:
+            raise ValueError("replay has no path")
+        with open(self._path, "rb") as replay:
+            data: bytes = replay.read()
+        if self._keep_data:
+            self._data = data
+        if self._hash is None:
+            self._hash = md5(data).hexdigest()
+        return data
+
+    def read_battle_results(self) -> bytes:
+        """Read 'battle_results.dat' from the replay. Blocking"""
+        if not self.is_opened:
+            raise ValueError("replay has not been opened yet. Use open()")
+        if self._data is None and self._path is not None:
+            with ZipFile(self._path) as zreplay:
+                return zreplay.read("battle_results.dat")
+        with ZipFile(BytesIO(self.data)) as zreplay:
+            return zreplay.read("battle_results.dat")
+
+    def packets(self, types: Container[int] | None = None) -> Iterator[Packet]:
+        """
+        Yield (PacketHeader, payload) of the packets in 'data.wotreplay'.
+        The packet stream is decompressed in chunks. See PacketReader.packets().
+        Blocking
+        """
+        if not self.is_opened:
+            raise ValueError("replay has not been opened yet. Use open()")
+        replay: Path | BytesIO
+        if self._data is None and self._path is not None:
+            replay = self._path
+        else:
+            replay = BytesIO(self.data)
+        with ZipFile(replay) as zreplay, zreplay.open("data.wotreplay") as stream:
+            yield from PacketReader(stream).packets(types)
+
+    @contextmanager
+    def mapped(self) -> Iterator[memoryview]:
+        """
+        Context manager returning a read-only memoryview of the replay data.
+        Replay files are memory-mapped if the data is not kept in memory
+        """
+        if not self.is_opened:
+            raise ValueError("replay has not been opened yet. Use open()")
+        if self._data is not None or self._path is None:
+            yield memoryview(self.data)
+            return
+        with open(self._path, "rb") as replay:
+            with mmap(replay.fileno(), 0, access=ACCESS_READ) as mm:
+                view: memoryview = memoryview(mm)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def stream(self) -> BinaryIO:
+        """
+        Return a binary file object for reading the replay data in chunks
+        without loading it into memory. The caller must close it. Blocking
+        """
+        if not self.is_opened:
+            raise ValueError("replay has not been opened yet. Use open()")
+        if self._data is not None or self._path is None:
+            return BytesIO(self.data)
+        return open(self._path, "rb")
+
+    @classmethod
+    async def open_many(
+        cls,
+        replays: Iterable[Path | str],
+        workers: int = DEFAULT_WORKERS,
+        processes: bool = False,
+        ordered: bool = False,
+        meta_only: bool = False,
+        keep_data: bool = True,
+    ) -> AsyncIterator["ReplayFile"]:
+        """
+        Open replay files in a thread pool (or a process pool if processes=True)
+        and yield opened ReplayFiles. At most 2 * workers replays are read ahead.
+        Replays are yielded in input order if ordered=True, otherwise as they
+        are completed. Replays that fail to open are logged and skipped.
+        See open() for meta_only and ReplayFile for keep_data.
+        """
+        async with aclosing(
+            map_executor(
+                _open_replay,
+                replays,
+                meta_only,
+                keep_data,
+                workers=workers,
+                processes=processes,
+                ordered=ordered,
+            )
+        ) as replay_files:
+            async for replay_file in replay_files:
+                yield replay_file
+
     @property
     def is_opened(self) -> bool:
         return self._opened
@@ -124,6 +288,12 @@ class ReplayFile:
     @property
     def hash(self) -> str:
         if self.is_opened:
+            if self._hash is None:
+                if self._keep_data:
+                    self._load_data()
+                else:
+                    self._calc_hash()
+            assert self._hash is not None, "replay hash not calculated"
             return self._hash
         raise ValueError("replay has not been opened yet. Use open()")
 
@@ -135,10 +305,105 @@ class ReplayFile:
 
     @property
     def data(self) -> bytes:
-        if self.is_opened:
+        """
+        Replay file data. Read from the file if opened with meta_only=True
+        or keep_data=False
+        """
+        if self.is_opened or self._data is not None:
+            if self._data is None:
+                return self._load_data()
             return self._data
         raise ValueError("replay has not been opened yet. Use open()")
 
     @property
     def path(self) -> Path | None:
         return self._path
+
+
+def _open_replay(
+    replay: Path | str, meta_only: bool = False, keep_data: bool = True
+) -> ReplayFile:
+    """Open replay file in a worker thread/process"""
+    replay_file = ReplayFile(replay, keep_data=keep_data)
+    replay_file._read(meta_only=meta_only)
+    return replay_file
+
+
+async def map_executor(
+    func: Callable[..., T],
+    items: Iterable[Any],
+    *args: Any,
+    workers: int = DEFAULT_WORKERS,
+    processes: bool = False,
+    ordered: bool = False,
+    on_error: Optional[OnError] = None,
+) -> AsyncGenerator[T, None]:
+    """
+    Run func(item, *args) for items in a thread pool (or a process pool
+    if processes=True) and yield the results. At most 2 * workers items
+    are submitted ahead. Results are yielded in input order if ordered=True,
+    otherwise as they are completed.
+
+    Failed calls are skipped: on_error(item, exception) is called for them if
+    given, otherwise they are logged. Items of iterables other than
+    collections, e.g. generators reading files, are fetched in a worker thread
+    so they do not block the event loop.
+    """
+    if workers < 1:
+        raise ValueError(f"workers must be > 0: {workers}")
+    loop = asyncio.get_running_loop()
+    executor: Executor
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    pending: Deque[asyncio.Future] = deque()
+    submitted: Dict[asyncio.Future, Any] = dict()  # future -> item
+    max_pending: int = 2 * workers
+    iterator: Iterator[Any] = iter(items)
+    blocking: bool = not isinstance(items, Collection)
+
+    async def completed(fill: bool) -> AsyncIterator[T]:
+        """Yield completed results while pending queue is full (or non-empty)"""
+        while len(pending) >= (max_pending if fill else 1):
+            done: asyncio.Future
+            if ordered:
+                done = pending.popleft()
+                await asyncio.wait([done])
+            else:
+                finished, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                done = finished.pop()
+                pending.remove(done)
+            item: Any = submitted.pop(done)
+            try:
+                yield done.result()
+            except Exception as err:
+                if on_error is not None:
+                    on_error(item, err)
+                else:
+                    error(
+                        f"{getattr(func, '__name__', func)}() failed for {item}: "
+                        f"{type(err).__name__}: {err}"
+                    )
+
+    try:
+        while True:
+            if blocking:
+                item = await asyncio.to_thread(next, iterator, _END)
+            else:
+                item = next(iterator, _END)
+            if item is _END:
+                break
+            future = loop.run_in_executor(executor, func, item, *args)
+            pending.append(future)
+            submitted[future] = item
+            async for res in completed(fill=True):
+                yield res
+        async for res in completed(fill=False):
+            yield res
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,408 @@
+"""
+Persistent SQLite index of replay files in directory trees
+
+ReplayArchive.scan() walks directories concurrently and reads 'meta.json' of
+new and changed replay files only: files are matched by (size, mtime) to the
+previous scan.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from enum import IntEnum
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Set,
+    Tuple,
+)
+from zipfile import BadZipFile
+
+import aiosqlite
+from pydantic_exportables import JSONExportable
+
+from .replay import DEFAULT_WORKERS, ReplayFile, ReplayFileMeta, map_executor
+from .sqlite_store import SQLiteStore
+from .stats import Stats
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+SUFFIX: str = ".wotbreplay"
+BATCH_SIZE: int = 1000
+
+FileStat = Tuple[str, int, int]  # (path, size, mtime_ns)
+
+
+class ArchiveStatus(IntEnum):
+    ok = 1
+    failed = 2  # not a valid replay file
+
+
+class ArchiveEntry(JSONExportable):
+    """Replay file in the archive"""
+
+    path: str
+    size: int
+    mtime: int  # nanoseconds
+    status: ArchiveStatus = ArchiveStatus.ok
+    meta: ReplayFileMeta | None = None
+
+
+class ScanStats(Stats):
+    """Statistics of ReplayArchive.scan()"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.files: int = 0
+        self.added: int = 0
+        self.updated: int = 0
+        self.unchanged: int = 0
+        self.removed: int = 0
+        self.errors: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files, {self.added} added, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.removed} removed, "
+            f"{self.errors} errors: {self.elapsed:.2f}s"
+        )
+
+
+# ReplayFileMeta field -> column
+META_COLUMNS: Dict[str, str] = {
+    "version": "version",
+    "title": "title",
+    "dbid": "dbid",
+    "playerName": "player_name",
+    "battleStartTime": "battle_start_time",
+    "playerVehicleName": "vehicle",
+    "mapName": "map_name",
+    "arenaUniqueId": "arena_unique_id",
+    "battleDuration": "battle_duration",
+    "vehicleCompDescriptor": "tank_id",
+    "camouflageId": "camouflage_id",
+    "mapId": "map_id",
+    "arenaBonusType": "battle_type",
+}
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS replays (
+    path              TEXT    PRIMARY KEY,
+    size              INTEGER NOT NULL,
+    mtime             INTEGER NOT NULL,
+    status            INTEGER NOT NULL,
+    version           TEXT,
+    title             TEXT,
+    dbid              INTEGER,
+    player_name       TEXT,
+    battle_start_time INTEGER,
+    vehicle           TEXT,
+    map_name          TEXT,
+    arena_unique_id   INTEGER,
+    battle_duration   REAL,
+    tank_id           INTEGER,
+    camouflage_id     INTEGER,
+    map_id            INTEGER,
+    battle_type       INTEGER
+);
+CREATE INDEX IF NOT EXISTS replays_dbid ON replays (dbid, battle_start_time);
+CREATE INDEX IF NOT EXISTS replays_map ON replays (map_id, battle_start_time);
+CREATE INDEX IF NOT EXISTS replays_tank ON replays (tank_id, battle_start_time);
+CREATE INDEX IF NOT EXISTS replays_vehicle ON replays (vehicle);
+CREATE INDEX IF NOT EXISTS replays_time ON replays (battle_start_time);
+CREATE INDEX IF NOT EXISTS replays_arena ON replays (arena_unique_id);
+"""
+
+_COLUMNS: List[str] = ["path", "size", "mtime", "status", *META_COLUMNS.values()]
+_SELECT: str = f"SELECT {', '.join(_COLUMNS)} FROM replays"
+_INSERT: str = (
+    f"INSERT OR REPLACE INTO replays ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_COLUMNS))})"
+)
+
+
+def _scan_dir(path: str) -> Tuple[List[FileStat], List[str]]:
+    """List replay files and sub-directories of a directory. Blocking"""
+    files: List[FileStat] = list()
+    dirs: List[str] = list()
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.name.lower().endswith(SUFFIX) and entry.is_file():
+                    stat: os.stat_result = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    except OSError as err:
+        error(f"could not read directory {path}: {err}")
+    return files, dirs
+
+
+async def walk(
+    roots: Iterable[Path | str], workers: int = DEFAULT_WORKERS
+) -> AsyncGenerator[FileStat, None]:
+    """
+    Walk directory trees and yield (path, size, mtime_ns) of replay files.
+    Up to 'workers' directories are read concurrently in a thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    pending: Set[asyncio.Future] = set()
+    dirs: List[str] = [str(root) for root in roots]
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while dirs or pending:
+            while dirs and len(pending) < workers:
+                pending.add(loop.run_in_executor(executor, _scan_dir, dirs.pop()))
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                files, subdirs = future.result()
+                dirs.extend(subdirs)
+                for file in files:
+                    yield file
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _read_entry(path: str) -> ArchiveEntry:
+    """Read meta of a replay file. Invalid replays are returned as failed. Blocking"""
+    stat: os.stat_result = os.stat(path)
+    entry = ArchiveEntry(
+        path=path,
+        size=stat.st_size,
+        mtime=stat.st_mtime_ns,
+        status=ArchiveStatus.failed,
+    )
+    try:
+        replay_file = ReplayFile(path)
+        replay_file._read(meta_only=True)
+        entry.meta = replay_file.meta
+        entry.status = ArchiveStatus.ok
+    except (BadZipFile, KeyError, ValueError) as err:
+        debug(f"could not read replay {path}: {err}")
+    return entry
+
+
+def _prefix_range(root: str) -> Tuple[str, str]:
+    """Return (low, high) path range for paths under root"""
+    prefix: str = root.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class ReplayArchive(SQLiteStore):
+    """
+    Persistent index of replay files in directory trees.
+
+    Use as an async context manager or call open() and close():
+
+        async with ReplayArchive("replays.db") as archive:
+            await archive.scan(["replays/"])
+            async for entry in archive.find(vehicle="E-50", map_name="fort",
+                                            version="6"):
+                ...
+    """
+
+    SCHEMA: ClassVar[str] = _SCHEMA
+    NAME: ClassVar[str] = "replay archive"
+
+    async def _known(self, root: str) -> Dict[str, Tuple[int, int]]:
+        """Return (size, mtime) of archived files under root"""
+        res: Dict[str, Tuple[int, int]] = dict()
+        async with self.db.execute(
+            "SELECT path, size, mtime FROM replays WHERE path >= ? AND path < ?",
+            _prefix_range(root),
+        ) as cursor:
+            async for row in cursor:
+                res[row[0]] = (row[1], row[2])
+        return res
+
+    async def scan(
+        self,
+        roots: Iterable[Path | str],
+        workers: int = DEFAULT_WORKERS,
+        processes: bool = False,
+        prune: bool = True,
+    ) -> ScanStats:
+        """
+        Scan directory trees and update the archive. Only new and changed
+        replay files, by (size, mtime), are read. Removed files are pruned
+        from the archive if prune=True. See map_executor() for 'workers' and
+        'processes'.
+        """
+        stats = ScanStats()
+        known: Dict[str, Tuple[int, int]] = dict()
+        dirs: List[str] = list()
+        for root in roots:
+            root = os.path.abspath(root)
+            dirs.append(root)
+            known.update(await self._known(root))
+
+        changed: List[str] = list()
+        async with aclosing(walk(dirs, workers)) as files:
+            async for path, size, mtime in files:
+                stats.files += 1
+                if (stat := known.pop(path, None)) is None:
+                    changed.append(path)
+                elif stat != (size, mtime):
+                    changed.append(path)
+                    stats.updated += 1
+                else:
+                    stats.unchanged += 1
+        stats.added = len(changed) - stats.updated
+
+        def read_failed(path: str, err: BaseException) -> None:
+            error(f"could not read {path}: {type(err).__name__}: {err}")
+            stats.errors += 1
+
+        batch: List[ArchiveEntry] = list()
+        async with aclosing(
+            map_executor(
+                _read_entry,
+                changed,
+                workers=workers,
+                processes=processes,
+                on_error=read_failed,
+            )
+        ) as entries:
+            async for entry in entries:
+                if entry.status == ArchiveStatus.failed:
+                    stats.errors += 1
+                batch.append(entry)
+                if len(batch) >= BATCH_SIZE:
+                    await self.add(batch)
+                    batch = list()
+        await self.add(batch)
+
+        if prune and len(known) > 0:
+            await self.db.executemany(
+                "DELETE FROM replays WHERE path = ?", ((path,) for path in known)
+            )
+            await self.db.commit()
+            stats.removed = len(known)
+        stats.stop()
+        verbose(f"scanned replays: {stats}")
+        return stats
+
+    async def add(self, entries: Iterable[ArchiveEntry]) -> None:
+        """Add or update archive entries"""
+        await self.db.executemany(_INSERT, (self._row(entry) for entry in entries))
+        await self.db.commit()
+
+    async def get(self, path: Path | str) -> ArchiveEntry | None:
+        """Get archive entry by path"""
+        async with self.db.execute(
+            f"{_SELECT} WHERE path = ?", (os.path.abspath(path),)
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return self._entry(row)
+        return None
+
+    @staticmethod
+    def _where(
+        status: ArchiveStatus,
+        dbid: int | None = None,
+        player: str | None = None,
+        map_id: int | None = None,
+        map_name: str | None = None,
+        tank_id: int | None = None,
+        vehicle: str | None = None,
+        battle_type: int | None = None,
+        version: str | None = None,
+        since: int | None = None,
+        until: int | None = None,
+    ) -> Tuple[str, List[Any]]:
+        conditions: List[str] = ["status = ?"]
+        params: List[Any] = [status.value]
+        for column, value in [
+            ("dbid", dbid),
+            ("player_name", player),
+            ("map_id", map_id),
+            ("map_name", map_name),
+            ("tank_id", tank_id),
+            ("vehicle", vehicle),
+            ("battle_type", battle_type),
+        ]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if version is not None:
+            conditions.append("(version = ? OR version LIKE ?)")
+            params.extend([version, f"{version}.%"])
+        if since is not None:
+            conditions.append("battle_start_time >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("battle_start_time < ?")
+            params.append(until)
+        return " AND ".join(conditions), params
+
+    async def find(
+        self,
+        status: ArchiveStatus = ArchiveStatus.ok,
+        limit: int | None = None,
+        **filters: Any,
+    ) -> AsyncIterator[ArchiveEntry]:
+        """
+        Find replays ordered by battle start time. Filters:
+
+        dbid, player, map_id, map_name, tank_id, vehicle, battle_type: exact match
+        version: version prefix, e.g. "6" or "6.8"
+        since, until: battle start time (epoch seconds) range
+        """
+        where, params = self._where(status, **filters)
+        sql: str = f"{_SELECT} WHERE {where} ORDER BY battle_start_time, path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        async with self.db.execute(sql, params) as cursor:
+            async for row in cursor:
+                yield self._entry(row)
+
+    async def count(
+        self, status: ArchiveStatus = ArchiveStatus.ok, **filters: Any
+    ) -> int:
+        """Count replays. See find() for filters"""
+        where, params = self._where(status, **filters)
+        async with self.db.execute(
+            f"SELECT COUNT(*) FROM replays WHERE {where}", params
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return row[0]
+        return 0
+
+    @staticmethod
+    def _row(entry: ArchiveEntry) -> Tuple:
+        meta: Dict[str, Any] = dict()
+        if entry.meta is not None:
+            meta = entry.meta.model_dump()
+        return (
+            entry.path,
+            entry.size,
+            entry.mtime,
+            entry.status.value,
+            *(meta.get(field) for field in META_COLUMNS),
+        )
+
+    @staticmethod
+    def _entry(row: aiosqlite.Row | Tuple) -> ArchiveEntry:
+        entry = ArchiveEntry(
+            path=row[0], size=row[1], mtime=row[2], status=ArchiveStatus(row[3])
+        )
+        if entry.status == ArchiveStatus.ok:
+            entry.meta = ReplayFileMeta.model_validate(dict(zip(META_COLUMNS, row[4:])))
+        return entry
@@ -0,0 +1,399 @@
+"""
+Persistent SQLite index of replay uploads to WoTinspector.com
+
+Replays are keyed by ReplayFile.hash and by the battle (arenaUniqueId, dbid)
+so that re-saved copies of an uploaded replay are recognized too.
+
+UploadQueue is a persistent queue of replay files to upload so that
+interrupted bulk uploads can be resumed.
+"""
+
+import asyncio
+import logging
+from enum import IntEnum, StrEnum
+from pathlib import Path
+from time import time
+from typing import ClassVar, Dict, Iterable, List, Set, Sequence, Tuple
+
+import aiosqlite
+from pydantic_exportables import JSONExportable
+
+from .replay import ReplayFile, map_executor
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+# keep well below SQLite's host parameter limit
+QUERY_CHUNK: int = 500
+
+Battle = Tuple[int, int]  # (arenaUniqueId, dbid)
+
+
+class WIApi(StrEnum):
+    """WoTinspector.com API the replay was uploaded with"""
+
+    v1 = "v1"
+    v2 = "v2"
+
+
+class UploadStatus(IntEnum):
+    uploaded = 1
+    failed = 2
+
+
+class QueueStatus(IntEnum):
+    pending = 0
+    done = 1
+    failed = 2
+
+
+class ReplayUpload(JSONExportable):
+    """Upload record of a replay"""
+
+    hash: str
+    api: WIApi
+    status: UploadStatus
+    arena_unique_id: int | None = None
+    dbid: int | None = None
+    replay_id: str | None = None
+    path: str | None = None
+    updated: int = 0
+    response: str | None = None
+
+    @property
+    def is_uploaded(self) -> bool:
+        return self.status == UploadStatus.uploaded
+
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS uploads (
+    hash            TEXT    NOT NULL,
+    api             TEXT    NOT NULL,
+    status          INTEGER NOT NULL,
+    arena_unique_id INTEGER,
+    dbid            INTEGER,
+    replay_id       TEXT,
+    path            TEXT,
+    updated         INTEGER NOT NULL,
+    response        TEXT,
+    PRIMARY KEY (hash, api)
+);
+CREATE INDEX IF NOT EXISTS uploads_battle ON uploads (arena_unique_id, dbid);
+"""
+
+_COLUMNS: str = (
+    "hash, api, status, arena_unique_id, dbid, replay_id, path, updated, response"
+)
+_PARAMS: str = ", ".join("?" * len(_COLUMNS.split(",")))
+
+
+def _battle(replay_file: ReplayFile) -> Battle | None:
+    """Return replay's (arenaUniqueId, dbid) or None if the meta has not been read"""
+    try:
+        return replay_file.meta.arenaUniqueId, replay_file.meta.dbid
+    except AttributeError:
+        # replays given as bytes have no meta
+        return None
+
+
+def _replay_hash(replay_file: ReplayFile) -> Tuple[ReplayFile, str]:
+    """Return replay with its hash. Blocking: reads the replay if not hashed yet"""
+    return replay_file, replay_file.hash
+
+
+async def _hash(replay_file: ReplayFile) -> str:
+    """Return replay's hash, calculated in a worker thread"""
+    return (await asyncio.to_thread(_replay_hash, replay_file))[1]
+
+
+def _chunks(items: Sequence, size: int = QUERY_CHUNK) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class ReplayIndex(SQLiteStore):
+    """
+    Persistent index of replays uploaded to WoTinspector.com.
+
+    Use as an async context manager or call open() and close():
+
+        async with ReplayIndex("replays.db") as index:
+            for replay_file in await index.new_replays(replay_files):
+                await wi.post_replay(replay_file.path, replay_index=index)
+    """
+
+    SCHEMA: ClassVar[str] = _SCHEMA
+    NAME: ClassVar[str] = "replay index"
+
+    async def add(
+        self,
+        replay_file: ReplayFile,
+        api: WIApi,
+        status: UploadStatus = UploadStatus.uploaded,
+        replay_id: str | None = None,
+        response: str | None = None,
+    ) -> ReplayUpload:
+        """Add or update the upload record of the replay"""
+        battle: Battle | None = _battle(replay_file)
+        upload = ReplayUpload(
+            hash=await _hash(replay_file),
+            api=api,
+            status=status,
+            arena_unique_id=None if battle is None else battle[0],
+            dbid=None if battle is None else battle[1],
+            replay_id=replay_id,
+            path=None if replay_file.path is None else str(replay_file.path),
+            updated=int(time()),
+            response=response,
+        )
+        await self.db.execute(
+            f"INSERT OR REPLACE INTO uploads ({_COLUMNS}) VALUES ({_PARAMS})",
+            (
+                upload.hash,
+                upload.api.value,
+                upload.status.value,
+                upload.arena_unique_id,
+                upload.dbid,
+                upload.replay_id,
+                upload.path,
+                upload.updated,
+                upload.response,
+            ),
+        )
+        await self.db.commit()
+        return upload
+
+    async def get(self, hash: str, api: WIApi) -> ReplayUpload | None:
+        """Get upload record by replay hash"""
+        async with self.db.execute(
+            f"SELECT {_COLUMNS} FROM uploads WHERE hash = ? AND api = ?",
+            (hash, api.value),
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return self._upload(row)
+        return None
+
+    async def get_battle(
+        self, arena_unique_id: int, dbid: int, api: WIApi
+    ) -> ReplayUpload | None:
+        """Get the upload record of a battle's replay, uploaded ones first"""
+        async with self.db.execute(
+            f"""SELECT {_COLUMNS} FROM uploads
+                WHERE arena_unique_id = ? AND dbid = ? AND api = ?
+                ORDER BY status, updated DESC LIMIT 1""",
+            (arena_unique_id, dbid, api.value),
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return self._upload(row)
+        return None
+
+    async def get_upload(
+        self, replay_file: ReplayFile, api: WIApi
+    ) -> ReplayUpload | None:
+        """
+        Return the upload record of the replay if the replay or another replay
+        file of the same battle has been uploaded. Returns None otherwise
+        """
+        if (battle := _battle(replay_file)) is not None:
+            if (upload := await self.get_battle(*battle, api=api)) is not None:
+                if upload.is_uploaded:
+                    return upload
+        if (upload := await self.get(await _hash(replay_file), api)) is not None:
+            if upload.is_uploaded:
+                return upload
+        return None
+
+    async def is_uploaded(self, replay_file: ReplayFile, api: WIApi) -> bool:
+        return await self.get_upload(replay_file, api) is not None
+
+    async def new_hashes(self, hashes: Iterable[str], api: WIApi) -> List[str]:
+        """Return hashes of replays that have not been uploaded, in input order"""
+        hashes = list(hashes)
+        uploaded: Set[str] = set()
+        for chunk in _chunks(hashes):
+            async with self.db.execute(
+                f"""SELECT hash FROM uploads
+                    WHERE api = ? AND status = ?
+                    AND hash IN ({", ".join("?" * len(chunk))})""",
+                (api.value, UploadStatus.uploaded.value, *chunk),
+            ) as cursor:
+                async for row in cursor:
+                    uploaded.add(row[0])
+        return [hash for hash in hashes if hash not in uploaded]
+
+    async def _uploaded_battles(
+        self, battles: Iterable[Battle], api: WIApi
+    ) -> Set[Battle]:
+        arena_ids: List[int] = list({arena_id for arena_id, _ in battles})
+        res: Set[Battle] = set()
+        for chunk in _chunks(arena_ids):
+            async with self.db.execute(
+                f"""SELECT arena_unique_id, dbid FROM uploads
+                    WHERE api = ? AND status = ?
+                    AND arena_unique_id IN ({", ".join("?" * len(chunk))})""",
+                (api.value, UploadStatus.uploaded.value, *chunk),
+            ) as cursor:
+                async for row in cursor:
+                    res.add((row[0], row[1]))
+        return res
+
+    async def new_replays(
+        self, replays: Iterable[ReplayFile], api: WIApi = WIApi.v2
+    ) -> List[ReplayFile]:
+        """
+        Return replays that have not been uploaded, in input order.
+
+        Replays are first matched by battle so that replays opened with
+        meta_only=True are hashed only if their battle has not been uploaded.
+        The replays are hashed in worker threads. Replays that cannot be read
+        are logged and skipped.
+        """
+        replays = list(replays)
+        battles: Dict[int, Battle] = dict()
+        for i, replay_file in enumerate(replays):
+            if (battle := _battle(replay_file)) is not None:
+                battles[i] = battle
+        uploaded: Set[Battle] = await self._uploaded_battles(battles.values(), api)
+        candidates: List[ReplayFile] = [
+            replay_file
+            for i, replay_file in enumerate(replays)
+            if battles.get(i) not in uploaded
+        ]
+        hashes: List[Tuple[ReplayFile, str]] = [
+            res async for res in map_executor(_replay_hash, candidates, ordered=True)
+        ]
+        new: Set[str] = set(await self.new_hashes((hash for _, hash in hashes), api))
+        return [replay_file for replay_file, hash in hashes if hash in new]
+
+    async def count(self, api: WIApi, status: UploadStatus | None = None) -> int:
+        """Return number of replays in the index"""
+        sql: str = "SELECT COUNT(*) FROM uploads WHERE api = ?"
+        params: Tuple = (api.value,)
+        if status is not None:
+            sql += " AND status = ?"
+            params = (api.value, status.value)
+        async with self.db.execute(sql, params) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return row[0]
+        return 0
+
+    @staticmethod
+    def _upload(row: aiosqlite.Row | Tuple) -> ReplayUpload:
+        return ReplayUpload(
+            hash=row[0],
+            api=WIApi(row[1]),
+            status=UploadStatus(row[2]),
+            arena_unique_id=row[3],
+            dbid=row[4],
+            replay_id=row[5],
+            path=row[6],
+            updated=row[7],
+            response=row[8],
+        )
+
+
+_QUEUE_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS queue (
+    path      TEXT    NOT NULL,
+    api       TEXT    NOT NULL,
+    status    INTEGER NOT NULL,
+    replay_id TEXT,
+    error     TEXT,
+    added     INTEGER NOT NULL,
+    updated   INTEGER NOT NULL,
+    PRIMARY KEY (path, api)
+);
+CREATE INDEX IF NOT EXISTS queue_status ON queue (api, status, added);
+"""
+
+
+class UploadQueue(SQLiteStore):
+    """
+    Persistent queue of replay files to upload to WoTinspector.com.
+
+    Replays are queued by path. Use as an async context manager or call
+    open() and close():
+
+        async with UploadQueue("uploads.db") as queue:
+            async for res in wi.post_replays(replay_files, upload_queue=queue):
+                ...
+    """
+
+    SCHEMA: ClassVar[str] = _QUEUE_SCHEMA
+    NAME: ClassVar[str] = "upload queue"
+
+    def __init__(self, path: Path | str = ":memory:", api: WIApi = WIApi.v2) -> None:
+        super().__init__(path)
+        self.api: WIApi = api
+
+    async def add(self, paths: Iterable[Path | str]) -> None:
+        """Queue replay files. Files queued already keep their status"""
+        now: int = int(time())
+        await self.db.executemany(
+            """INSERT OR IGNORE INTO queue (path, api, status, added, updated)
+                VALUES (?, ?, ?, ?, ?)""",
+            (
+                (str(path), self.api.value, QueueStatus.pending.value, now, now)
+                for path in paths
+            ),
+        )
+        await self.db.commit()
+
+    async def status(self, path: Path | str) -> QueueStatus | None:
+        """Return status of a queued replay file or None if not queued"""
+        async with self.db.execute(
+            "SELECT status FROM queue WHERE path = ? AND api = ?",
+            (str(path), self.api.value),
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return QueueStatus(row[0])
+        return None
+
+    async def _set_status(
+        self,
+        path: Path | str,
+        status: QueueStatus,
+        replay_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        await self.db.execute(
+            """UPDATE queue SET status = ?, replay_id = ?, error = ?, updated = ?
+                WHERE path = ? AND api = ?""",
+            (status.value, replay_id, error, int(time()), str(path), self.api.value),
+        )
+        await self.db.commit()
+
+    async def done(self, path: Path | str, replay_id: str | None = None) -> None:
+        await self._set_status(path, QueueStatus.done, replay_id=replay_id)
+
+    async def failed(self, path: Path | str, error: str | None = None) -> None:
+        await self._set_status(path, QueueStatus.failed, error=error)
+
+    async def pending(self, retry_failed: bool = False) -> List[str]:
+        """Return replay files not uploaded yet in the order they were queued"""
+        statuses: List[int] = [QueueStatus.pending.value]
+        if retry_failed:
+            statuses.append(QueueStatus.failed.value)
+        async with self.db.execute(
+            f"""SELECT path FROM queue
+                WHERE api = ? AND status IN ({", ".join("?" * len(statuses))})
+                ORDER BY added, rowid""",
+            (self.api.value, *statuses),
+        ) as cursor:
+            return [row[0] async for row in cursor]
+
+    async def count(self, status: QueueStatus | None = None) -> int:
+        """Return number of queued replay files"""
+        sql: str = "SELECT COUNT(*) FROM queue WHERE api = ?"
+        params: Tuple = (self.api.value,)
+        if status is not None:
+            sql += " AND status = ?"
+            params = (self.api.value, status.value)
+        async with self.db.execute(sql, params) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return row[0]
+        return 0
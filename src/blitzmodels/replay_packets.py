@@ -0,0 +1,150 @@
+"""
+Streaming reader for the packet stream ('data.wotreplay') of WoT Blitz replays
+
+The stream starts with a header (magic, replay hash, game version) followed by
+packets. Each packet has a 12-byte header (payload size, packet type, clock)
+and a payload. The stream ends with a packet of type PacketType.end.
+
+PacketReader reads the stream in chunks and yields packet headers with
+memoryviews of the payloads without copying them or reading the whole stream
+into memory.
+"""
+
+import logging
+from enum import IntEnum
+from struct import Struct
+from typing import IO, Container, Iterator, NamedTuple, Tuple
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+MAGIC: int = 0x12345678
+CHUNK_SIZE: int = 64 * 1024
+
+_MAGIC: Struct = Struct("<I")
+_HEADER: Struct = Struct("<IIf")
+_ENTITY_CALL: Struct = Struct("<III")
+
+
+class PacketType(IntEnum):
+    """Known packet types. Other packet types are yielded as int"""
+
+    base_player_create = 0
+    cell_player_create = 1
+    entity_create = 5
+    entity_property = 7
+    entity_method = 8
+    position = 10
+    end = 0xFFFFFFFF
+
+
+class PacketHeader(NamedTuple):
+    type: int
+    clock: float
+    size: int
+
+
+class EntityCall(NamedTuple):
+    """Header of entity_method and entity_property packets"""
+
+    entity_id: int
+    method: int
+    size: int
+
+
+Packet = Tuple[PacketHeader, memoryview]
+
+
+def entity_call(payload: memoryview) -> Tuple[EntityCall, memoryview]:
+    """Split payload of an entity_method/entity_property packet into header and args"""
+    if len(payload) < _ENTITY_CALL.size:
+        raise ValueError(f"entity call too short: {len(payload)} bytes")
+    call = EntityCall(*_ENTITY_CALL.unpack_from(payload))
+    return call, payload[_ENTITY_CALL.size : _ENTITY_CALL.size + call.size]
+
+
+class PacketReader:
+    """
+    Read packets from a 'data.wotreplay' stream:
+
+        with ZipFile(replay) as zreplay, zreplay.open("data.wotreplay") as stream:
+            for header, payload in PacketReader(stream).packets():
+                ...
+
+    The payload memoryviews refer to the read buffer. Copy them with bytes()
+    to keep them around without keeping the buffer in memory.
+    """
+
+    def __init__(self, stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> None:
+        self._stream: IO[bytes] = stream
+        self._chunk_size: int = chunk_size
+        self.hash: str
+        self.version: str
+        self._read_header()
+
+    def _read_exactly(self, size: int) -> bytes:
+        data: bytes = self._stream.read(size)
+        if len(data) < size:
+            raise ValueError("truncated replay data header")
+        return data
+
+    def _read_str(self) -> str:
+        return self._read_exactly(self._read_exactly(1)[0]).decode()
+
+    def _read_header(self) -> None:
+        if _MAGIC.unpack(self._read_exactly(_MAGIC.size))[0] != MAGIC:
+            raise ValueError("not a replay data stream")
+        self._read_exactly(8)  # unknown
+        self.hash = self._read_str()
+        self.version = self._read_str()
+
+    def packets(self, types: Container[int] | None = None) -> Iterator[Packet]:
+        """
+        Yield (PacketHeader, payload) of packets. If 'types' is given, only
+        packets of those types are yielded and other payloads are skipped.
+        Raises ValueError if the stream is truncated.
+        """
+        stream: IO[bytes] = self._stream
+        unpack_from = _HEADER.unpack_from
+        header_size: int = _HEADER.size
+        buf: bytes = b""
+        view: memoryview = memoryview(buf)
+        pos: int = 0
+        size: int
+        packet_type: int
+        clock: float
+
+        while True:
+            if len(buf) - pos < header_size:
+                buf = buf[pos:] + stream.read(max(self._chunk_size, header_size))
+                view, pos = memoryview(buf), 0
+                if len(buf) == 0:
+                    debug("replay data stream ended without an end packet")
+                    return None
+                if len(buf) < header_size:
+                    raise ValueError("truncated packet header")
+            size, packet_type, clock = unpack_from(buf, pos)
+            pos += header_size
+
+            if types is not None and packet_type not in types:
+                if (remaining := size - len(buf) + pos) > 0:
+                    # skip the rest of the payload without buffering it
+                    if len(stream.read(remaining)) < remaining:
+                        raise ValueError("truncated packet")
+                    buf, pos = b"", 0
+                else:
+                    pos += size
+            else:
+                if len(buf) - pos < size:
+                    buf = buf[pos:] + stream.read(max(self._chunk_size, size))
+                    view, pos = memoryview(buf), 0
+                    if len(buf) < size:
+                        raise ValueError("truncated packet")
+                yield PacketHeader(packet_type, clock, size), view[pos : pos + size]
+                pos += size
+
+            if packet_type == PacketType.end:
+                return None
@@ -0,0 +1,313 @@
+"""
+Binary snapshots and process-wide shared instances of validated models
+for fast startup.
+
+Snapshots are pickles keyed by the hash of the source file, the package
+version, the Python version and the fingerprint of the model's fields and
+private attributes. Packaged models use snapshots only if BLITZMODELS_CACHE_DIR
+is set or if they are requested explicitly, e.g. open_default(snapshot=True).
+A snapshot is only as trustworthy as the cache dir it is read from.
+"""
+
+import logging
+import os
+import pickle
+import sys
+from hashlib import sha256
+from importlib.metadata import PackageNotFoundError, version
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from struct import Struct
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    Optional,
+    Set,
+    TypeVar,
+    get_args,
+)
+
+from pydantic import BaseModel
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+T = TypeVar("T")
+
+PACKAGE: str = "blitz-models"
+ENV_CACHE_DIR: str = "BLITZMODELS_CACHE_DIR"
+ENV_NO_SNAPSHOT: str = "BLITZMODELS_NO_SNAPSHOT"
+
+# bump when pickled model state changes in a way the fingerprint does not
+# cover, e.g. the contents of a private index
+SNAPSHOT_FORMAT: int = 1
+
+
+def cache_dir() -> Path:
+    """Return snapshot cache dir"""
+    if (path := os.environ.get(ENV_CACHE_DIR)) is not None:
+        return Path(path)
+    if (path := os.environ.get("XDG_CACHE_HOME")) is not None:
+        return Path(path) / "blitzmodels"
+    return Path.home() / ".cache" / "blitzmodels"
+
+
+def snapshots_enabled() -> bool:
+    """Whether snapshots are used by default: opt-in with BLITZMODELS_CACHE_DIR"""
+    return os.environ.get(ENV_CACHE_DIR) is not None and not os.environ.get(
+        ENV_NO_SNAPSHOT
+    )
+
+
+def _types(annotation: Any) -> Iterator[Any]:
+    """Iterate an annotation and its type arguments recursively"""
+    yield annotation
+    for arg in get_args(annotation):
+        yield from _types(arg)
+
+
+def _schema_names(model: type, seen: Set[type]) -> Iterator[str]:
+    if model in seen:
+        return
+    seen.add(model)
+    yield model.__qualname__
+    for name, field in model.model_fields.items():  # type: ignore[attr-defined]
+        yield name
+        for annotation in _types(field.annotation):
+            if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+                yield from _schema_names(annotation, seen)
+    yield from model.__private_attributes__  # type: ignore[attr-defined]
+
+
+def model_fingerprint(model: type) -> str:
+    """
+    Return hash of the field and private attribute names of a pydantic model
+    and its nested models
+    """
+    key = sha256(str(SNAPSHOT_FORMAT).encode())
+    if isinstance(model, type) and issubclass(model, BaseModel):
+        for name in _schema_names(model, set()):
+            key.update(name.encode())
+            key.update(b"\0")
+    return key.hexdigest()
+
+
+def package_version() -> str:
+    try:
+        return version(PACKAGE)
+    except PackageNotFoundError:
+        return "0"
+
+
+def snapshot_path(
+    source: Path, data: bytes, model: type, snapshot_dir: Path | None = None
+) -> Path:
+    """Return snapshot file path of 'model' for source file with content 'data'"""
+    if snapshot_dir is None:
+        snapshot_dir = cache_dir()
+    key = sha256(data)
+    key.update(package_version().encode())
+    key.update(f"{sys.version_info.major}.{sys.version_info.minor}".encode())
+    key.update(model_fingerprint(model).encode())
+    return snapshot_dir / f"{source.stem}-{key.hexdigest()[:32]}.pickle"
+
+
+def save_snapshot(obj: object, path: Path) -> bool:
+    """Write snapshot atomically. Returns False on failure"""
+    tmp: str | None = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=path.parent, delete=False) as file:
+            tmp = file.name
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        return True
+    except Exception as err:
+        debug(f"could not write snapshot {path}: {err}")
+        if tmp is not None:
+            Path(tmp).unlink(missing_ok=True)
+    return False
+
+
+def load_snapshot(
+    source: Path,
+    parse: Callable[[str], Optional[T]],
+    model: type[T],
+    snapshot_dir: Path | None = None,
+) -> Optional[T]:
+    """
+    Load 'model' from the snapshot of 'source' file or parse it with 'parse()'
+    and write the snapshot for the next time
+    """
+    data: bytes = source.read_bytes()
+    if os.environ.get(ENV_NO_SNAPSHOT):
+        return parse(data.decode("utf-8"))
+    path: Path = snapshot_path(source, data, model, snapshot_dir)
+    try:
+        with open(path, "rb") as file:
+            if isinstance(obj := pickle.load(file), model):
+                debug(f"snapshot loaded: {path}")
+                return obj
+            message(f"snapshot is not {model.__name__}: {path}")
+    except FileNotFoundError:
+        pass
+    except Exception as err:
+        debug(f"could not read snapshot {path}: {err}")
+
+    if (res := parse(data.decode("utf-8"))) is not None:
+        save_snapshot(res, path)
+    return res
+
+
+class LazySnapshot(Generic[T]):
+    """
+    Load a model lazily from a snapshot on first call
+
+        tankopedia = LazySnapshot(WGApiWoTBlitzTankopedia.open_default)
+        tank = tankopedia().get(tank_id)
+    """
+
+    def __init__(self, loader: Callable[[], Optional[T]]) -> None:
+        self._loader: Callable[[], Optional[T]] = loader
+        self._obj: Optional[T] = None
+
+    def __call__(self) -> T:
+        if self._obj is None:
+            if (obj := self._loader()) is None:
+                raise ValueError("could not load snapshot")
+            self._obj = obj
+        return self._obj
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._obj is not None
+
+
+class SharedDefault(Generic[T]):
+    """
+    Process-wide cached instance of a model.
+
+    get() returns a private copy of the cached instance, unpickled from a
+    cached pickle of it, so modifying it does not affect other callers.
+    get(copy=False) returns the shared instance itself for read-only use:
+    it must not be modified. refresh() replaces the cached instance without
+    touching the old one held by the callers.
+
+    share() publishes the cached instance to other processes via shared memory
+    and attach() loads it in worker processes, e.g. in a pool initializer.
+    Workers must be started by the sharing process to share its resource tracker.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[T]]) -> None:
+        self._loader: Callable[[], Optional[T]] = loader
+        self._obj: Optional[T] = None
+        self._pickle: bytes | None = None  # of _obj, for copies
+        self._lock: Lock = Lock()
+        self._shm: SharedMemory | None = None
+
+    def get(self, copy: bool = True) -> T:
+        """Return a copy of the cached instance or the instance if copy=False"""
+        if (obj := self._obj) is None:
+            with self._lock:
+                if (obj := self._obj) is None:
+                    obj = self._obj = self._load()
+        if copy:
+            return pickle.loads(self._dumps(obj))
+        return obj
+
+    def _dumps(self, obj: T) -> bytes:
+        """Return pickle of the cached instance 'obj'"""
+        with self._lock:
+            if self._pickle is None or self._obj is not obj:
+                data: bytes = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+                if self._obj is not obj:
+                    return data
+                self._pickle = data
+            return self._pickle
+
+    def _load(self) -> T:
+        if (obj := self._loader()) is None:
+            raise ValueError("could not load default instance")
+        return obj
+
+    def refresh(self) -> T:
+        """Reload and replace the cached instance"""
+        obj: T = self._load()
+        self.set(obj)
+        return obj
+
+    def set(self, obj: T) -> None:
+        """Replace the cached instance"""
+        with self._lock:
+            self._obj = obj
+            self._pickle = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._obj is not None
+
+    def share(self) -> str:
+        """
+        Publish the cached instance to a shared memory block and return its name.
+        The block is released with unshare()
+        """
+        data: bytes = self._dumps(self.get(copy=False))
+        with self._lock:
+            self._unshare()
+            shm = SharedMemory(create=True, size=len(data) + _SHM_HEADER.size)
+            assert (buf := shm.buf) is not None, "shared memory is closed"
+            _SHM_HEADER.pack_into(buf, 0, len(data))
+            buf[_SHM_HEADER.size : _SHM_HEADER.size + len(data)] = data
+            del buf
+            self._shm = shm
+        debug(f"shared {len(data)} bytes: {shm.name}")
+        return shm.name
+
+    def attach(self, name: str) -> T:
+        """Load the cached instance from shared memory published with share()"""
+        shm = SharedMemory(name=name)
+        try:
+            assert (buf := shm.buf) is not None, "shared memory is closed"
+            (size,) = _SHM_HEADER.unpack_from(buf, 0)
+            data: bytes = bytes(buf[_SHM_HEADER.size : _SHM_HEADER.size + size])
+            del buf
+        finally:
+            shm.close()
+        obj: T = pickle.loads(data)
+        self.set(obj)
+        return obj
+
+    def unshare(self) -> None:
+        """Release the shared memory block"""
+        with self._lock:
+            self._unshare()
+
+    def _unshare(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+_SHM_HEADER: Struct = Struct("<Q")
+_defaults: Dict[type, SharedDefault] = dict()
+_defaults_lock: Lock = Lock()
+
+
+def shared_default(
+    model: type[T], loader: Callable[[], Optional[T]]
+) -> SharedDefault[T]:
+    """Return process-wide SharedDefault of the model"""
+    try:
+        return _defaults[model]
+    except KeyError:
+        with _defaults_lock:
+            return _defaults.setdefault(model, SharedDefault(loader))
@@ -0,0 +1,62 @@
+"""
+Base class of the persistent SQLite stores: the replay index, the upload
+queue, the replay archive and the crawl state
+"""
+
+import logging
+from pathlib import Path
+from types import TracebackType
+from typing import ClassVar, Optional, Self, Type
+
+import aiosqlite
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+
+class SQLiteStore:
+    """
+    SQLite database with 'SCHEMA' created on open(). Use as an async context
+    manager or call open() and close()
+    """
+
+    SCHEMA: ClassVar[str] = ""
+    NAME: ClassVar[str] = "database"  # for messages
+
+    def __init__(self, path: Path | str = ":memory:") -> None:
+        self.path: Path | str = path
+        self._db: aiosqlite.Connection | None = None
+
+    async def open(self) -> None:
+        if self._db is not None:
+            return None
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.executescript(self.SCHEMA)
+        await self._db.commit()
+        debug("%s opened: %s", self.NAME, str(self.path))
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def __aenter__(self) -> Self:
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    @property
+    def db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            raise ValueError(f"{self.NAME} has not been opened yet. Use open()")
+        return self._db
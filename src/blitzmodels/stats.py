@@ -0,0 +1,30 @@
+"""
+Base class of the statistics of long running operations, e.g. scans,
+crawls and bulk writes
+"""
+
+from time import perf_counter
+
+
+class Stats:
+    """Elapsed time of an operation. Subclasses add the counters and __str__()"""
+
+    def __init__(self) -> None:
+        self._start: float = perf_counter()
+        self._end: float | None = None
+
+    def stop(self) -> None:
+        self._end = perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds elapsed since the start of the operation"""
+        if self._end is None:
+            return perf_counter() - self._start
+        return self._end - self._start
+
+    def per_second(self, count: int) -> float:
+        """Return 'count' per elapsed second"""
+        if (elapsed := self.elapsed) > 0:
+            return count / elapsed
+        return 0
@@ -1,5 +1,8 @@
 from typing import (
     Any,
+    Callable,
+    Iterable,
+    Iterator,
     Optional,
     ClassVar,
     TypeVar,
@@ -14,6 +17,7 @@ from typing import (
 from types import TracebackType
 import logging
 import pyarrow  # type: ignore
+import pyarrow.compute as pc  # type: ignore
 from bson import ObjectId
 from pydantic import (
     field_validator,
@@ -31,6 +35,7 @@ import importlib
 from aiohttp import ClientTimeout
 from urllib.parse import quote
 from collections import defaultdict
+from bisect import bisect_left
 
 # from sortedcollections import SortedDict  # type: ignore
 from argparse import ArgumentParser
@@ -51,6 +56,7 @@ from pyutils.utils import epoch_now
 from pyutils import ThrottledClientSession
 
 from .region import Region
+from .snapshot import load_snapshot, shared_default, snapshots_enabled
 from .tank import (
     Tank,
     EnumNation,
@@ -687,11 +693,31 @@ class WGApiWoTBlitzPlayerAchievements(WGApiWoTBlitz):
 
 
 class WGApiWoTBlitzTankopedia(WGApiWoTBlitz):
+    """
+    Tankopedia of WG API. Modify tanks with add(), pop() and update_tanks()
+    to keep the lookup indexes in sync. Assigning 'data' rebuilds the indexes.
+    Tanks added to or removed from 'data' directly are detected by the count
+    of tanks only.
+    """
+
     # data should be sorted by integer value of the key = tank_id
     data: Dict[str, Tank] = Field(default=dict(), alias="d")
     codes: Dict[str, Tank] = Field(default=dict(), alias="c")
 
+    # primary store keyed by int tank_id. 'data' keeps string keys for export
+    _tanks: Dict[TankId, Tank] = dict()
+
+    # secondary indexes: attribute value -> tank_ids
     _tier_cache: Dict[int, Set[TankId]] = dict()
+    _nation_cache: Dict[EnumNation, Set[TankId]] = dict()
+    _type_cache: Dict[EnumVehicleTypeStr, Set[TankId]] = dict()
+    _premium_cache: Dict[bool, Set[TankId]] = dict()
+    # tank_ids sorted numerically, None = needs rebuild
+    _sorted_ids: Tuple[TankId, ...] | None = None
+    # dense lookup arrays indexed by tank_id, None = needs rebuild
+    _lookup: Dict[str, pyarrow.Array] | None = None
+
+    LOOKUP_COLUMNS: ClassVar[Tuple[str, ...]] = ("tier", "type", "nation", "is_premium")
 
     _exclude_export_DB_fields = {"codes": True}
     _exclude_export_src_fields = {"codes": True}
@@ -704,8 +730,7 @@ class WGApiWoTBlitzTankopedia(WGApiWoTBlitz):
     def _validate_code(self) -> Self:
         if len(self.codes) == 0:
             self._set_skip_validation("codes", self._update_codes(data=self.data))
-        if len(self._tier_cache) == 0:
-            self._set_skip_validation("_tier_cache", self._update_tier_cache())
+        self._update_store()
         return self
 
     @classmethod
@@ -720,39 +745,263 @@ class WGApiWoTBlitzTankopedia(WGApiWoTBlitz):
             return tankopedia_fn
 
     @classmethod
-    def open_default(cls) -> Optional[Self]:
+    def open_default(cls, snapshot: bool | None = None) -> Optional[Self]:
         """
-        Open Tankopedia shipped with the package
+        Open Tankopedia shipped with the package. Uses a binary snapshot
+        of the validated Tankopedia if snapshot=True, or by default if
+        BLITZMODELS_CACHE_DIR is set. See blitzmodels.snapshot
         """
+        if snapshot is None:
+            snapshot = snapshots_enabled()
+        if snapshot:
+            return load_snapshot(cls.default_path(), cls.parse_str, cls)
         with open(cls.default_path(), "r", encoding="utf-8") as file:
             return cls.parse_str(file.read())
 
+    @classmethod
+    def default(cls, copy: bool = True) -> Self:
+        """
+        Return a copy of the process-wide cached Tankopedia shipped with
+        the package. copy=False returns the cached instance itself: it is
+        shared and must not be modified.
+        """
+        return shared_default(cls, cls.open_default).get(copy=copy)
+
+    @classmethod
+    def refresh_default(cls) -> Self:
+        """Reload the cached default Tankopedia"""
+        return shared_default(cls, cls.open_default).refresh()
+
+    @classmethod
+    def share_default(cls) -> str:
+        """
+        Publish the default Tankopedia to worker processes via shared memory.
+        Returns shared memory name for attach_default()
+        """
+        return shared_default(cls, cls.open_default).share()
+
+    @classmethod
+    def attach_default(cls, name: str) -> None:
+        """Load the default Tankopedia from shared memory, e.g. in a pool initializer"""
+        shared_default(cls, cls.open_default).attach(name)
+
+    @classmethod
+    def unshare_default(cls) -> None:
+        """Release shared memory of share_default()"""
+        shared_default(cls, cls.open_default).unshare()
+
+    def __eq__(self, other: object) -> bool:
+        """Compare fields. The private indexes are ignored since they are built lazily"""
+        if not isinstance(other, WGApiWoTBlitzTankopedia):
+            return NotImplemented
+        return (
+            all(
+                getattr(self, name) == getattr(other, name)
+                for name in type(self).model_fields
+            )
+            and self.__pydantic_extra__ == other.__pydantic_extra__
+        )
+
     def __len__(self) -> int:
         return len(self.data)
 
     def __getitem__(self, key: str | TankId) -> Tank:
-        if isinstance(key, int):
-            key = str(key)
-        return self.data[key]
+        if isinstance(key, str):
+            try:
+                key = int(key)
+            except ValueError:
+                raise KeyError(key)
+        try:
+            return self._tanks[key]
+        except KeyError:
+            if not self._check_store():
+                raise
+        return self._tanks[key]
+
+    def __contains__(self, tank_id: TankId) -> bool:
+        if tank_id in self._tanks:
+            return True
+        return self._check_store() and tank_id in self._tanks
+
+    def get(self, tank_id: TankId, default: Tank | None = None) -> Tank | None:
+        """Return tank by tank_id or default if not found"""
+        if (tank := self._tanks.get(tank_id)) is None and self._check_store():
+            tank = self._tanks.get(tank_id)
+        return default if tank is None else tank
+
+    def get_many(self, tank_ids: Iterable[TankId]) -> list[Tank | None]:
+        """Return tanks by tank_ids. None for tank_ids not found"""
+        self._check_store()
+        get = self._tanks.get
+        return [get(tank_id) for tank_id in tank_ids]
+
+    def __iter__(self) -> Iterator[Tank]:
+        """Iterate tanks in WGApiWoTBlitzTankopedia() sorted by tank_id"""
+        tanks: Dict[TankId, Tank] = self._tanks
+        return (tanks[tank_id] for tank_id in self.tank_ids())
+
+    def tank_ids(self) -> Tuple[TankId, ...]:
+        """Return tank_ids sorted numerically. The order is cached"""
+        self._check_store()
+        if self._sorted_ids is None or len(self._sorted_ids) != len(self._tanks):
+            self._sorted_ids = tuple(sorted(self._tanks.keys()))
+        return self._sorted_ids
+
+    def tank_ids_range(
+        self, start: TankId | None = None, stop: TankId | None = None
+    ) -> Tuple[TankId, ...]:
+        """Return sorted tank_ids for which start <= tank_id < stop"""
+        tank_ids: Tuple[TankId, ...] = self.tank_ids()
+        lo: int = 0 if start is None else bisect_left(tank_ids, start)
+        hi: int = len(tank_ids) if stop is None else bisect_left(tank_ids, stop)
+        return tank_ids[lo:hi]
+
+    def tanks_range(
+        self, start: TankId | None = None, stop: TankId | None = None
+    ) -> Iterator[Tank]:
+        """Iterate tanks sorted by tank_id for which start <= tank_id < stop"""
+        tanks: Dict[TankId, Tank] = self._tanks
+        return (tanks[tank_id] for tank_id in self.tank_ids_range(start, stop))
+
+    @classmethod
+    def arrow_schema(cls) -> pyarrow.schema:
+        return pyarrow.schema(
+            [
+                ("tank_id", pyarrow.int32()),
+                ("name", pyarrow.string()),
+                ("tier", pyarrow.int8()),
+                ("type", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+                ("nation", pyarrow.int8()),
+                ("is_premium", pyarrow.bool_()),
+            ]
+        )
+
+    def arrow_table(self) -> pyarrow.Table:
+        """Return tanks as an Arrow table sorted by tank_id"""
+        tanks: list[Tank] = list(self)
+        return pyarrow.table(
+            {
+                "tank_id": [tank.tank_id for tank in tanks],
+                "name": [tank.name for tank in tanks],
+                "tier": [int(tank.tier) for tank in tanks],
+                "type": [tank.type.value for tank in tanks],
+                "nation": [int(tank.nation) for tank in tanks],
+                "is_premium": [tank.is_premium for tank in tanks],
+            },
+            schema=self.arrow_schema(),
+        )
+
+    def lookup_arrays(self) -> Dict[str, pyarrow.Array]:
+        """
+        Return dense lookup arrays of tier, type, nation and is_premium
+        indexed by tank_id. Missing tank_ids are nulls. The arrays are cached
+        """
+        if self._lookup is None:
+            table: pyarrow.Table = self.arrow_table()
+            size: int = self.tank_ids()[-1] + 1 if len(self) > 0 else 0
+            # positions of the table rows in the dense arrays
+            index: list[int | None] = [None] * size
+            for row, tank_id in enumerate(self.tank_ids()):
+                index[tank_id] = row
+            positions = pyarrow.array(index, type=pyarrow.int32())
+            self._lookup = {
+                column: table.column(column).combine_chunks().take(positions)
+                for column in self.LOOKUP_COLUMNS
+            }
+        return self._lookup
+
+    def lookup(
+        self, tank_ids: Any, columns: Iterable[str] | None = None
+    ) -> Dict[str, pyarrow.Array | pyarrow.ChunkedArray]:
+        """
+        Vectorized lookup of tank attributes for an Arrow array, NumPy array
+        or a sequence of tank_ids. Returns Arrow arrays aligned with tank_ids,
+        nulls for unknown tank_ids.
+        """
+        if not isinstance(tank_ids, (pyarrow.Array, pyarrow.ChunkedArray)):
+            tank_ids = pyarrow.array(tank_ids)
+        if not pyarrow.types.is_int64(tank_ids.type):
+            tank_ids = pc.cast(tank_ids, pyarrow.int64())
+        lookup: Dict[str, pyarrow.Array] = self.lookup_arrays()
+        size: int = len(lookup[self.LOOKUP_COLUMNS[0]])
+        out_of_range = pc.or_(pc.less(tank_ids, 0), pc.greater_equal(tank_ids, size))
+        indices = pc.if_else(
+            out_of_range, pyarrow.scalar(None, pyarrow.int64()), tank_ids
+        )
+        if columns is None:
+            columns = self.LOOKUP_COLUMNS
+        return {column: pc.take(lookup[column], indices) for column in columns}
 
-    def __iter__(self):
-        """Iterate tanks in WGApiWoTBlitzTankopedia()"""
-        return iter([v for _, v in sorted(self.data.items())])
+    def join(
+        self,
+        batch: pyarrow.Table | pyarrow.RecordBatch,
+        tank_id: str = "tank_id",
+        columns: Iterable[str] | None = None,
+        prefix: str = "",
+    ) -> pyarrow.Table | pyarrow.RecordBatch:
+        """
+        Append tank tier, type, nation and is_premium columns to an Arrow
+        table/record batch of stats (e.g. TankStat.arrow_schema()) by tank_id column.
+        """
+        for column, values in self.lookup(batch.column(tank_id), columns).items():
+            batch = batch.append_column(prefix + column, values)
+        return batch
 
     def update_count(self) -> None:
         if self.meta is None:
             self.meta = dict()
         self.meta["count"] = len(self.data)
 
+    def _update_store(self) -> None:
+        """Rebuild the tank store and all the indexes derived from 'data'"""
+        self._tanks = {tank.tank_id: tank for tank in self.data.values()}
+        self._update_indexes()
+        self._sorted_ids = None
+        self._lookup = None
+
+    def _check_store(self) -> bool:
+        """
+        Rebuild the tank store if tanks have been added to or removed from
+        'data' directly. Returns True if the store was rebuilt
+        """
+        if len(self._tanks) != len(self.data):
+            debug("tankopedia data modified directly, rebuilding indexes")
+            self._update_store()
+            return True
+        return False
+
     def _update_tier_cache(self) -> Dict[int, Set[TankId]]:
         """Update tier cache and return new cache"""
         res: Dict[int, Set[TankId]] = dict()
         for tier in range(1, 11):
             res[tier] = set()
-        for tank in self.data.values():
+        for tank in self._tanks.values():
             res[tank.tier].add(tank.tank_id)
         return res
 
+    def _update_indexes(self) -> None:
+        """Rebuild secondary indexes by tier, nation, type and is_premium"""
+        self._tier_cache = self._update_tier_cache()
+        self._nation_cache = {nation: set() for nation in EnumNation}
+        self._type_cache = {tank_type: set() for tank_type in EnumVehicleTypeStr}
+        self._premium_cache = {True: set(), False: set()}
+        for tank in self._tanks.values():
+            self._index_add(tank)
+
+    def _index_add(self, tank: Tank) -> None:
+        """Add tank to secondary indexes"""
+        self._tier_cache[tank.tier].add(tank.tank_id)
+        self._nation_cache[tank.nation].add(tank.tank_id)
+        self._type_cache[tank.type].add(tank.tank_id)
+        self._premium_cache[tank.is_premium].add(tank.tank_id)
+
+    def _index_remove(self, tank: Tank) -> None:
+        """Remove tank from secondary indexes"""
+        self._tier_cache[tank.tier].discard(tank.tank_id)
+        self._nation_cache[tank.nation].discard(tank.tank_id)
+        self._type_cache[tank.type].discard(tank.tank_id)
+        self._premium_cache[tank.is_premium].discard(tank.tank_id)
+
     def _code_add(self, tank: Tank, codes: dict[str, Tank]) -> bool:
         if tank.code is not None:
             codes[tank.code] = tank
@@ -760,26 +1009,40 @@ class WGApiWoTBlitzTankopedia(WGApiWoTBlitz):
         return False
 
     def add(self, tank: Tank) -> None:
+        self._check_store()
+        if (old := self._tanks.get(tank.tank_id)) is not None:
+            self._index_remove(old)
+        else:
+            self._sorted_ids = None
+        self._lookup = None
+        self._tanks[tank.tank_id] = tank
         self.data[str(tank.tank_id)] = tank
-        self._tier_cache[tank.tier].add(tank.tank_id)
+        self._index_add(tank)
         self._code_add(tank, self.codes)
         self.update_count()
 
     def pop(self, tank_id: TankId) -> Tank:
         """Raises KeyError if tank_id is not found in self.data"""
-        tank: Tank = self.data.pop(str(tank_id))
+        self._check_store()
+        tank: Tank = self._tanks.pop(tank_id)
+        del self.data[str(tank_id)]
+        self._sorted_ids = None
+        self._lookup = None
         self.update_count()
-        if tank.code is not None:
-            try:
-                del self.codes[tank.code]
-                self._tier_cache[tank.tier].remove(tank.tank_id)
-            except Exception as err:
-                debug(f"could not remove code for tank_id={tank.tank_id}: {err}")
-                pass
+        self._index_remove(tank)
+        if tank.code is not None and self.codes.get(tank.code) is tank:
+            del self.codes[tank.code]
+            # fall back to the last other tank with the same code
+            for other in self.data.values():
+                if other.code == tank.code:
+                    self.codes[tank.code] = other
         return tank
 
     def by_code(self, code: str) -> Tank | None:
-        """Return tank by short code"""
+        """
+        Return tank by short code. Some tanks share a code: the last of them
+        in 'data' order, or the last one added with add(), is returned
+        """
         try:
             return self.codes[code]
         except KeyError as err:
@@ -807,26 +1070,104 @@ class WGApiWoTBlitzTankopedia(WGApiWoTBlitz):
         self, new: "WGApiWoTBlitzTankopedia"
     ) -> Tuple[set[TankId], set[TankId]]:
         """update tankopedia with another one"""
-        new_ids: set[TankId] = {tank.tank_id for tank in new}
-        old_ids: set[TankId] = {tank.tank_id for tank in self}
+        new_ids: set[TankId] = set(new.tank_ids())
+        old_ids: set[TankId] = set(self.tank_ids())
         added: set[TankId] = new_ids - old_ids
         updated: set[TankId] = new_ids & old_ids
         updated = {tank_id for tank_id in updated if new[tank_id] != self[tank_id]}
 
-        self.data.update({(str(tank_id), new[tank_id]) for tank_id in added})
+        for tank_id in added:
+            self._tanks[tank_id] = new[tank_id]
+            self.data[str(tank_id)] = new[tank_id]
         updated_ids: set[TankId] = set()
         for tank_id in updated:
-            if self.data[str(tank_id)].update(new[tank_id]):
+            if self._tanks[tank_id].update(new[tank_id]):
                 updated_ids.add(tank_id)
+        self._sorted_ids = None
+        self._lookup = None
         self.update_count()
         self.update_codes()
+        self._update_indexes()
         return (added, updated_ids)
 
     def get_tank_ids_by_tier(self, tier: int) -> Set[TankId]:
         if tier < 1 or tier > 10:
             raise ValueError(f"tier must be between 1-10: {tier}")
+        self._check_store()
         return self._tier_cache[tier]
 
+    def get_tank_ids(
+        self,
+        nation: EnumNation | str | Iterable[EnumNation | str] | None = None,
+        tank_type: str | Iterable[str] | None = None,
+        tier: int | str | Iterable[int | str] | None = None,
+        is_premium: bool | None = None,
+    ) -> Set[TankId]:
+        """
+        Return tank_ids matching all the given filters. Filters accept a single value
+        or an iterable of values, e.g. tier=[8, 9, 10]. Returns a new set.
+
+        Raises ValueError for unknown nation, tank_type or tier
+        """
+        self._check_store()
+        matches: list[Set[TankId]] = list()
+        if nation is not None:
+            matches.append(self._match(self._nation_cache, nation, self._read_nation))
+        if tank_type is not None:
+            matches.append(self._match(self._type_cache, tank_type, self._read_type))
+        if tier is not None:
+            matches.append(self._match(self._tier_cache, tier, self._read_tier))
+        if is_premium is not None:
+            matches.append(self._premium_cache[is_premium])
+
+        if len(matches) == 0:
+            return set(self._tanks.keys())
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    @classmethod
+    def _match(
+        cls, index: Dict[Any, Set[TankId]], values: Any, read: Callable[[Any], Any]
+    ) -> Set[TankId]:
+        """Return union of the index sets of the filter value(s)"""
+        if isinstance(values, (str, int)):
+            return index[read(values)]
+        res: Set[TankId] = set()
+        for value in values:
+            res.update(index[read(value)])
+        return res
+
+    @classmethod
+    def _read_nation(cls, nation: EnumNation | str) -> EnumNation:
+        if isinstance(nation, str):
+            try:
+                return EnumNation[nation.lower()]
+            except KeyError:
+                raise ValueError(f"unknown nation: {nation}")
+        return EnumNation(nation)
+
+    @classmethod
+    def _read_type(cls, tank_type: str) -> EnumVehicleTypeStr:
+        if isinstance(tank_type, EnumVehicleTypeStr):
+            return tank_type
+        try:
+            return EnumVehicleTypeStr(tank_type)
+        except ValueError:
+            pass
+        try:
+            return EnumVehicleTypeStr.from_str(tank_type)
+        except KeyError:
+            raise ValueError(f"unknown tank type: {tank_type}")
+
+    @classmethod
+    def _read_tier(cls, tier: int | str) -> EnumVehicleTier:
+        if isinstance(tier, str):
+            return EnumVehicleTier.read_tier(tier)
+        try:
+            return EnumVehicleTier(tier)
+        except ValueError:
+            raise ValueError(f"tier must be between 1-10: {tier}")
+
 
 class WGApiTankString(JSONExportable):
     id: int
@@ -11,10 +11,12 @@ from .wi_apiv2 import (
     PlayerData as PlayerData,
     Product as Product,
     Replay as Replay,
+    ReplayPostResult as ReplayPostResult,
     ReplaySummary as ReplaySummary,
     ReplayRequest as ReplayRequest,
     Shot as Shot,
     WoTinspector as WoTinspector,
+    convert_ReplayJSON as convert_ReplayJSON,
 )
 
 from .wi_apiv1 import (
@@ -30,7 +32,36 @@ from .wi_apiv1 import (
     EnumVehicleTypeInt as EnumVehicleTypeInt,
 )
 
+from .aggregate import (
+    ReplayAggregator as ReplayAggregator,
+    aggregate_files as aggregate_files,
+)
+from .battle_results import BattleResults as BattleResults
+from .columnar import (
+    PlayersParquetWriter as PlayersParquetWriter,
+    players_table as players_table,
+)
+from .crawler import (
+    CrawlState as CrawlState,
+    NDJSONSink as NDJSONSink,
+    ParquetSink as ParquetSink,
+    crawl_replays as crawl_replays,
+)
+from .heatmap import (
+    ShotAggregator as ShotAggregator,
+    shots_table as shots_table,
+)
+from .migrate import migrate_replays as migrate_replays
+from .shots import read_shots as read_shots
+
 __all__ = [
+    "aggregate",
+    "battle_results",
+    "columnar",
+    "crawler",
+    "heatmap",
+    "migrate",
+    "shots",
     "wi_apiv1",  # Legacy, to be removed
     "wi_apiv2",
 ]
@@ -0,0 +1,273 @@
+"""
+Aggregate per-player statistics of replays
+
+ReplayAggregator sums player statistics of replays (V2 Replay or V1 ReplayJSON)
+grouped by any combination of 'dbid', 'tank_id', 'map_id' and 'platoon'.
+Memory use is bounded by the number of groups, not by the number of replays.
+Aggregators can be merged, e.g. partial results of worker processes, see
+aggregate_files(). Results are returned as an Arrow table with totals and
+averages per group.
+"""
+
+import logging
+from contextlib import aclosing
+from operator import attrgetter
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import pyarrow  # type: ignore
+import pyarrow.compute as pc  # type: ignore
+
+from ..map import Map, Maps
+from ..replay import DEFAULT_WORKERS, map_executor
+from .wi_apiv1 import EnumBattleResult, ReplayDetail, ReplayJSON
+from .wi_apiv2 import PlayerData, Replay
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+# player stats summed as is
+STATS: Tuple[str, ...] = (
+    "damage_made",
+    "damage_received",
+    "damage_assisted",
+    "damage_assisted_track",
+    "damage_blocked",
+    "shots_made",
+    "shots_hit",
+    "shots_pen",
+    "enemies_spotted",
+    "enemies_damaged",
+    "enemies_destroyed",
+    "exp",
+    "time_alive",
+)
+# battles, wins, draws and survived are counted
+COUNTERS: Tuple[str, ...] = ("battles", "wins", "draws", "survived") + STATS
+
+# group key -> Arrow type
+KEYS: Dict[str, pyarrow.DataType] = {
+    "dbid": pyarrow.int64(),
+    "tank_id": pyarrow.int32(),
+    "map_id": pyarrow.int32(),
+    "platoon": pyarrow.bool_(),
+}
+
+# average column -> (numerator, denominator)
+AVERAGES: Dict[str, Tuple[str, str]] = {
+    "win_rate": ("wins", "battles"),
+    "survival_rate": ("survived", "battles"),
+    "avg_damage_made": ("damage_made", "battles"),
+    "avg_damage_received": ("damage_received", "battles"),
+    "avg_damage_assisted": ("damage_assisted", "battles"),
+    "avg_enemies_spotted": ("enemies_spotted", "battles"),
+    "avg_enemies_destroyed": ("enemies_destroyed", "battles"),
+    "avg_exp": ("exp", "battles"),
+    "hit_rate": ("shots_hit", "shots_made"),
+    "pen_rate": ("shots_pen", "shots_hit"),
+}
+
+_get_stats: Callable[[Any], Tuple[int | None, ...]] = attrgetter(*STATS)
+
+
+class ReplayAggregator:
+    """
+    Sum player statistics of replays by group. 'by' are the group keys:
+    'dbid', 'tank_id' (vehicle_descr), 'map_id' and 'platoon' (squad_index > 0).
+    Only players in 'dbids' are aggregated if given. map_id of V1 replays is
+    found by map name from 'maps' (default Maps if not given) and is null if
+    the map is not found. Incomplete battles are skipped. 'errors' counts
+    files that could not be aggregated, see aggregate_files().
+    """
+
+    def __init__(
+        self,
+        by: Sequence[str] = ("dbid",),
+        dbids: Optional[Iterable[int]] = None,
+        maps: Maps | None = None,
+    ) -> None:
+        if len(by) == 0:
+            raise ValueError("no group keys given")
+        for key in by:
+            if key not in KEYS:
+                raise ValueError(f"unknown group key: {key}, valid keys: {list(KEYS)}")
+        self.by: Tuple[str, ...] = tuple(by)
+        self.dbids: Set[int] | None = set(dbids) if dbids is not None else None
+        self.maps: Maps | None = maps
+        self.replays: int = 0
+        self.skipped: int = 0
+        self.errors: int = 0
+        self._totals: Dict[Tuple[Any, ...], List[int]] = dict()
+
+    def __len__(self) -> int:
+        """Number of groups"""
+        return len(self._totals)
+
+    def add(self, replay: Replay | ReplayJSON) -> None:
+        """Add players of a replay"""
+        players: Sequence[PlayerData | ReplayDetail]
+        map_id: int | None
+        if isinstance(replay, Replay):
+            players = replay.players_data
+            map_id = replay.map_id
+        else:
+            details = replay.data.summary.details
+            players = details if isinstance(details, list) else [details]
+            map_id = self._map_id(replay.data.summary.map_name)
+        if replay.get_battle_result() == EnumBattleResult.incomplete:
+            self.skipped += 1
+            return
+        self.replays += 1
+
+        keys: Dict[str, Any] = {"map_id": map_id}
+        for player in players:
+            if self.dbids is not None and player.dbid not in self.dbids:
+                continue
+            result: EnumBattleResult = replay.get_battle_result(player.dbid)
+            if result == EnumBattleResult.incomplete:
+                continue
+            keys["dbid"] = player.dbid
+            keys["tank_id"] = player.vehicle_descr
+            keys["platoon"] = (player.squad_index or 0) > 0
+            key: Tuple[Any, ...] = tuple(keys[k] for k in self.by)
+            if (totals := self._totals.get(key)) is None:
+                totals = self._totals[key] = [0] * len(COUNTERS)
+            totals[0] += 1
+            totals[1] += result == EnumBattleResult.win
+            totals[2] += result == EnumBattleResult.draw
+            totals[3] += (player.hitpoints_left or 0) > 0
+            for i, value in enumerate(_get_stats(player), 4):
+                if value is not None and value > 0:  # -1 == unknown
+                    totals[i] += value
+
+    def _map_id(self, map_name: str) -> int | None:
+        """Return map_id by map name or None if not found"""
+        maps: Maps = self.maps if self.maps is not None else Maps.default(copy=False)
+        map: Map | None = maps.find(map_name)
+        return map.id if map is not None else None
+
+    def add_many(self, replays: Iterable[Replay | ReplayJSON]) -> None:
+        for replay in replays:
+            self.add(replay)
+
+    def merge(self, other: "ReplayAggregator") -> None:
+        """Add totals of another aggregator"""
+        if other.by != self.by:
+            raise ValueError(f"cannot merge aggregates by {other.by} to {self.by}")
+        self.replays += other.replays
+        self.skipped += other.skipped
+        self.errors += other.errors
+        for key, other_totals in other._totals.items():
+            if (totals := self._totals.get(key)) is None:
+                self._totals[key] = list(other_totals)
+            else:
+                for i, value in enumerate(other_totals):
+                    totals[i] += value
+
+    def get(self, *key: Any) -> Dict[str, int] | None:
+        """Return totals of a group or None if not found"""
+        if (totals := self._totals.get(key)) is None:
+            return None
+        return dict(zip(COUNTERS, totals))
+
+    def arrow_schema(self) -> pyarrow.schema:
+        return pyarrow.schema(
+            [(key, KEYS[key]) for key in self.by]
+            + [(name, pyarrow.int64()) for name in COUNTERS]
+            + [(name, pyarrow.float64()) for name in AVERAGES]
+        )
+
+    def to_arrow(self) -> pyarrow.Table:
+        """
+        Return table of group keys, totals and averages. Averages with zero
+        denominator are null
+        """
+        keys: List[Tuple[Any, ...]] = list(self._totals.keys())
+        totals: List[List[int]] = list(self._totals.values())
+        schema: pyarrow.schema = self.arrow_schema()
+        columns: Dict[str, pyarrow.Array] = dict()
+        for i, key in enumerate(self.by):
+            columns[key] = pyarrow.array([k[i] for k in keys], KEYS[key])
+        for i, name in enumerate(COUNTERS):
+            columns[name] = pyarrow.array([t[i] for t in totals], pyarrow.int64())
+        for name, (numerator, denominator) in AVERAGES.items():
+            divisor = columns[denominator]
+            columns[name] = pc.divide(
+                pc.cast(columns[numerator], pyarrow.float64()),
+                pc.if_else(
+                    pc.equal(divisor, 0), pyarrow.scalar(None, divisor.type), divisor
+                ),
+            )
+        return pyarrow.Table.from_arrays(
+            [columns[name] for name in schema.names], schema=schema
+        )
+
+
+def aggregate_file(
+    path: Path | str,
+    by: Sequence[str] = ("dbid",),
+    dbids: Optional[Iterable[int]] = None,
+) -> ReplayAggregator:
+    """
+    Aggregate V2 replays of an NDJSON file (see NDJSONSink, migrate_replays()).
+    Lines that fail to validate are logged and skipped
+    """
+    aggregator = ReplayAggregator(by=by, dbids=dbids)
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                aggregator.add(Replay.model_validate_json(line))
+            except ValueError as err:
+                debug(f"could not read replay: {err}")
+                aggregator.skipped += 1
+    return aggregator
+
+
+async def aggregate_files(
+    files: Iterable[Path | str],
+    by: Sequence[str] = ("dbid",),
+    dbids: Optional[Iterable[int]] = None,
+    workers: int = DEFAULT_WORKERS,
+    processes: bool = True,
+) -> ReplayAggregator:
+    """
+    Aggregate V2 replay NDJSON files in a process pool (or a thread pool if
+    processes=False) and merge the partial results. Files that cannot be read
+    are logged and counted in 'errors'
+    """
+    dbid_list: List[int] | None = list(dbids) if dbids is not None else None
+    aggregator = ReplayAggregator(by=by, dbids=dbid_list)
+
+    def file_failed(path: Path | str, err: BaseException) -> None:
+        error(f"could not aggregate {path}: {type(err).__name__}: {err}")
+        aggregator.errors += 1
+
+    async with aclosing(
+        map_executor(
+            aggregate_file,
+            files,
+            by,
+            dbid_list,
+            workers=workers,
+            processes=processes,
+            on_error=file_failed,
+        )
+    ) as results:
+        async for partial in results:
+            aggregator.merge(partial)
+    return aggregator
@@ -0,0 +1,366 @@
+"""
+Decoder for 'battle_results.dat' in WoT Blitz replay files.
+
+battle_results.dat is a pickled (arenaUniqueId, protobuf message) tuple. The
+protobuf schema has not been published: the field numbers below have been
+mapped against WoTinspector.com API responses of the same replays.
+"""
+
+import logging
+import pickle
+from collections import defaultdict
+from io import BytesIO
+from typing import Any, Container, Dict, List, Tuple
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+# top level message
+FIELD_MODE_MAP: int = 1  # battle_type << 16 | map_id
+FIELD_BATTLE_TIME: int = 2
+FIELD_WINNER_TEAM: int = 3
+FIELD_FINISH_REASON: int = 4
+FIELD_AUTHOR: int = 8  # author's player results incl. premium bonuses
+FIELD_ROOM_TYPE: int = 9
+FIELD_EXP_BASE: int = 181
+FIELD_CREDITS_BASE: int = 183
+FIELD_PLAYER: int = 201
+FIELD_PLAYER_RESULTS: int = 301
+_TOP_FIELDS: frozenset[int] = frozenset(
+    [
+        FIELD_MODE_MAP,
+        FIELD_BATTLE_TIME,
+        FIELD_WINNER_TEAM,
+        FIELD_FINISH_REASON,
+        FIELD_AUTHOR,
+        FIELD_ROOM_TYPE,
+        FIELD_EXP_BASE,
+        FIELD_CREDITS_BASE,
+        FIELD_PLAYER,
+        FIELD_PLAYER_RESULTS,
+    ]
+)
+
+# author's results
+AUTHOR_FIELDS: Dict[int, str] = {
+    2: "credits_total",
+    3: "exp_total",
+    101: "protagonist",
+    102: "protagonist_team",
+}
+
+# player: {1: dbid, 2: player info}
+FIELD_PLAYER_DBID: int = 1
+FIELD_PLAYER_INFO: int = 2
+PLAYER_INFO_FIELDS: Dict[int, str] = {
+    1: "name",
+    3: "team",
+    4: "clanid",
+    5: "clan_tag",
+}
+FIELD_PLAYER_INFO_PLATOON: int = 2
+_PLAYER_INFO_FIELDS: frozenset[int] = frozenset(
+    [FIELD_PLAYER_INFO_PLATOON, *PLAYER_INFO_FIELDS]
+)
+
+# player results: {1: entity id, 2: results}
+FIELD_RESULTS_ENTITY_ID: int = 1
+FIELD_RESULTS: int = 2
+PLAYER_RESULTS_FIELDS: Dict[int, str] = {
+    1: "hitpoints_left",
+    2: "credits",
+    3: "exp",
+    4: "shots_made",
+    5: "shots_hit",
+    6: "shots_splash",
+    7: "shots_pen",
+    8: "damage_made",
+    9: "damage_assisted",
+    10: "damage_assisted_track",
+    11: "damage_received",
+    12: "hits_received",
+    13: "hits_bounced",
+    14: "hits_splash",
+    15: "hits_pen",
+    16: "enemies_spotted",
+    17: "enemies_damaged",
+    18: "enemies_destroyed",
+    21: "base_capture_points",
+    22: "base_defend_points",
+    23: "distance_travelled",
+    24: "time_alive",
+    25: "killed_by",  # entity id of the killer
+    29: "exp_for_damage",
+    30: "exp_for_assist",
+    31: "exp_team_bonus",
+    32: "wp_points_earned",
+    33: "wp_points_stolen",
+    34: "hero_bonus_credits",
+    35: "hero_bonus_exp",
+    101: "dbid",
+    102: "team",
+    103: "vehicle_descr",
+    105: "death_reason",
+}
+SIGNED_FIELDS: frozenset[str] = frozenset(["hitpoints_left", "death_reason"])
+FIELD_RESULTS_ACHIEVEMENT: int = 27  # {1: achievement id, 2: value}
+
+# Mastery badge achievement ids. The ace tanker id is not known yet
+MASTERY_BADGES: Dict[int, int] = {
+    474: 3,  # first class
+    475: 2,  # second class
+    476: 1,  # third class
+}
+
+_WIRE_VARINT: int = 0
+_WIRE_I64: int = 1
+_WIRE_LEN: int = 2
+_WIRE_I32: int = 5
+
+
+def _varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """Read a protobuf varint at 'pos'. Returns value and the next position"""
+    res: int = 0
+    shift: int = 0
+    while True:
+        b: int = buf[pos]
+        pos += 1
+        res |= (b & 0x7F) << shift
+        if b < 0x80:
+            return res, pos
+        shift += 7
+
+
+def _signed(value: int) -> int:
+    """Convert a protobuf (u)int64 varint to int64"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def decode_message(
+    buf: bytes, fields: Container[int] | None = None
+) -> Dict[int, List[Any]]:
+    """
+    Decode a protobuf message without a schema into a dict of field values
+    by field number. Varints are returned as int, length-delimited fields as bytes
+    and fixed width fields as raw bytes. Only 'fields' are returned if given.
+    Raises ValueError if 'buf' is not bytes, e.g. a nested message field
+    decoded as a varint
+    """
+    if not isinstance(buf, (bytes, memoryview)):
+        raise ValueError(f"protobuf message is not bytes: {type(buf).__name__}")
+    res: Dict[int, List[Any]] = defaultdict(list)
+    pos: int = 0
+    end: int = len(buf)
+    value: Any
+    try:
+        while pos < end:
+            # inline single byte varints, most keys and values are < 128
+            if (key := buf[pos]) < 0x80:
+                pos += 1
+            else:
+                key, pos = _varint(buf, pos)
+            wire_type: int = key & 0x7
+            if wire_type == _WIRE_VARINT:
+                if (value := buf[pos]) < 0x80:
+                    pos += 1
+                else:
+                    value, pos = _varint(buf, pos)
+            elif wire_type == _WIRE_LEN:
+                size, pos = _varint(buf, pos)
+                if fields is not None and key >> 3 not in fields:
+                    pos += size
+                    continue
+                value = buf[pos : pos + size]
+                pos += size
+            elif wire_type == _WIRE_I32:
+                value = buf[pos : pos + 4]
+                pos += 4
+            elif wire_type == _WIRE_I64:
+                value = buf[pos : pos + 8]
+                pos += 8
+            else:
+                raise ValueError(f"unsupported protobuf wire type {wire_type} at {pos}")
+            if fields is None or key >> 3 in fields:
+                res[key >> 3].append(value)
+    except IndexError:
+        pos = -1
+    if pos != end:
+        raise ValueError("truncated protobuf message")
+    return res
+
+
+class _BattleResultsUnpickler(pickle.Unpickler):
+    """Unpickler that refuses to load any classes or functions"""
+
+    def find_class(self, module: str, name: str) -> Any:
+        raise pickle.UnpicklingError(
+            f"forbidden object in battle results: {module}.{name}"
+        )
+
+
+def unpickle(data: bytes) -> Tuple[int, bytes]:
+    """Return arenaUniqueId and protobuf message from battle_results.dat"""
+    try:
+        res = _BattleResultsUnpickler(BytesIO(data), encoding="bytes").load()
+    except (pickle.UnpicklingError, EOFError) as err:
+        raise ValueError(f"could not unpickle battle_results.dat: {err}") from err
+    if not (
+        isinstance(res, tuple)
+        and len(res) == 2
+        and isinstance(res[0], int)
+        and isinstance(res[1], bytes)
+    ):
+        raise ValueError("battle_results.dat is not a (int, bytes) tuple")
+    return res
+
+
+def _first(msg: Dict[int, List[Any]], field: int, default: Any = None) -> Any:
+    try:
+        return msg[field][0]
+    except (KeyError, IndexError):
+        return default
+
+
+def _player(buf: bytes) -> Tuple[int, Dict[str, Any], int | None]:
+    """Decode player. Returns dbid, player info and platoon id"""
+    player = decode_message(buf)
+    info = decode_message(_first(player, FIELD_PLAYER_INFO, b""), _PLAYER_INFO_FIELDS)
+    res: Dict[str, Any] = dict()
+    for field, name in PLAYER_INFO_FIELDS.items():
+        if (value := _first(info, field)) is not None:
+            res[name] = value.decode("utf-8") if isinstance(value, bytes) else value
+    return (
+        _first(player, FIELD_PLAYER_DBID, 0),
+        res,
+        _first(info, FIELD_PLAYER_INFO_PLATOON),
+    )
+
+
+def _player_results(buf: bytes) -> Dict[str, Any]:
+    """Decode player results into PlayerData fields"""
+    results = decode_message(buf)
+    res: Dict[str, Any] = {"death_reason": 0}
+    info = decode_message(_first(results, FIELD_RESULTS, b""))
+    for field, values in info.items():
+        if (name := PLAYER_RESULTS_FIELDS.get(field)) is not None:
+            res[name] = _signed(values[0]) if name in SIGNED_FIELDS else values[0]
+    achievements: List[Dict[str, int]] = list()
+    for achievement in info.get(FIELD_RESULTS_ACHIEVEMENT, []):
+        a = decode_message(achievement)
+        achievements.append({"t": _first(a, 1, 0), "v": _first(a, 2, 0)})
+    if len(achievements) > 0:
+        res["achievements"] = achievements
+    res["entity_id"] = _first(results, FIELD_RESULTS_ENTITY_ID)
+    return res
+
+
+class BattleResults:
+    """
+    Battle results decoded from replay's battle_results.dat.
+
+    'replay' holds v2 Replay fields and 'players_data' v2 PlayerData fields
+    of each player. Fields not included in battle_results.dat are left out.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        arena_unique_id, buf = unpickle(data)
+        self.arena_unique_id: int = arena_unique_id
+        self.replay: Dict[str, Any] = dict()
+        self.players_data: List[Dict[str, Any]] = list()
+        self.battle_time: int | None = None
+        try:
+            self._decode(buf)
+        except TypeError as err:
+            # field of an unexpected wire type, e.g. bytes instead of an int
+            raise ValueError(f"invalid battle results: {err}") from err
+
+    def _decode(self, buf: bytes) -> None:
+        msg = decode_message(buf, fields=_TOP_FIELDS)
+        replay: Dict[str, Any] = self.replay
+        replay["arena_unique_id"] = str(self.arena_unique_id)
+        if (mode_map := _first(msg, FIELD_MODE_MAP)) is not None:
+            replay["map_id"] = mode_map & 0xFFFF
+            replay["battle_type"] = mode_map >> 16
+        replay["winner_team"] = _first(msg, FIELD_WINNER_TEAM)
+        replay["finish_reason"] = _first(msg, FIELD_FINISH_REASON, -1)
+        replay["room_type"] = _first(msg, FIELD_ROOM_TYPE)
+        replay["exp_base"] = _first(msg, FIELD_EXP_BASE, 0)
+        replay["credits_base"] = _first(msg, FIELD_CREDITS_BASE, 0)
+        self.battle_time = _first(msg, FIELD_BATTLE_TIME)
+
+        author = decode_message(_first(msg, FIELD_AUTHOR, b""))
+        for field, name in AUTHOR_FIELDS.items():
+            if (value := _first(author, field)) is not None:
+                replay[name] = value
+
+        players: Dict[int, Dict[str, Any]] = dict()
+        platoons: Dict[int, List[int]] = defaultdict(list)
+        for buf in msg.get(FIELD_PLAYER, []):
+            dbid, player, platoon = _player(buf)
+            players[dbid] = player
+            if platoon is not None:
+                platoons[platoon].append(dbid)
+        self._set_squad_indexes(players, platoons)
+
+        for buf in msg.get(FIELD_PLAYER_RESULTS, []):
+            player_data: Dict[str, Any] = _player_results(buf)
+            player_data.update(players.get(player_data.get("dbid", 0), {}))
+            self.players_data.append(player_data)
+        self._set_protagonist_stats()
+
+    @staticmethod
+    def _set_squad_indexes(
+        players: Dict[int, Dict[str, Any]], platoons: Dict[int, List[int]]
+    ) -> None:
+        """Number platoons of each team in order of appearance, 0 == solo"""
+        squad_index: Dict[int, int] = defaultdict(int)
+        for player in players.values():
+            player["squad_index"] = 0
+        for dbids in platoons.values():
+            if len(dbids) < 2:
+                continue  # platoon mate did not join the battle
+            team: int = players[dbids[0]].get("team", 0)
+            squad_index[team] += 1
+            for dbid in dbids:
+                players[dbid]["squad_index"] = squad_index[team]
+
+    def _set_protagonist_stats(self) -> None:
+        replay: Dict[str, Any] = self.replay
+        protagonist: int | None = replay.get("protagonist")
+        team: int | None = replay.get("protagonist_team")
+        replay["allies"] = list()
+        replay["enemies"] = list()
+        for player_data in self.players_data:
+            dbid: int = player_data.get("dbid", 0)
+            if player_data.get("team") == team:
+                replay["allies"].append(dbid)
+            else:
+                replay["enemies"].append(dbid)
+            if dbid != protagonist:
+                continue
+            for name in [
+                "enemies_spotted",
+                "enemies_destroyed",
+                "damage_assisted",
+                "damage_made",
+            ]:
+                replay[name] = player_data.get(name, 0)
+            replay["protagonist_clan"] = player_data.get("clanid")
+            replay["mastery_badge"] = max(
+                (
+                    MASTERY_BADGES.get(achievement["t"], 0)
+                    for achievement in player_data.get("achievements", [])
+                ),
+                default=0,
+            )
+
+        winner_team: int | None = replay.get("winner_team")
+        if winner_team is None or team is None:
+            replay["battle_result"] = None
+        elif winner_team == 0:
+            replay["battle_result"] = 2  # draw
+        else:
+            replay["battle_result"] = 1 if winner_team == team else 0
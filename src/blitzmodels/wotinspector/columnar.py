@@ -0,0 +1,220 @@
+"""
+Columnar export of WoTinspector API v2 replays to Arrow and Parquet
+
+Replay.players_data is flattened to one row per player per battle with the
+replay columns of Replay.arrow_schema() followed by the player columns of
+PlayerData.arrow_schema(). Replays can be given as Replay models or as replay
+JSON dicts (keyed by field names or by aliases) to skip model validation, e.g.
+'json.loads(line)' of NDJSONSink's output.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    Any,
+    AsyncIterable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Type,
+)
+
+import pyarrow  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+from .wi_apiv2 import PlayerData, Replay
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+# replay columns read as is, 'version' is read from 'game_version'
+_REPLAY_FIELDS: List[str] = [
+    name for name in Replay.arrow_schema().names if name != "version"
+]
+_PLAYER_FIELDS: List[str] = PlayerData.arrow_schema().names
+
+
+def _aliases(model: Type[PlayerData] | Type[Replay], names: List[str]) -> List[str]:
+    return [model.model_fields[name].alias or name for name in names]
+
+
+_REPLAY_ALIASES: List[str] = _aliases(Replay, _REPLAY_FIELDS)
+_PLAYER_ALIASES: List[str] = _aliases(PlayerData, _PLAYER_FIELDS)
+
+
+def players_schema() -> pyarrow.schema:
+    """Schema of players_data rows"""
+    return pyarrow.schema(list(Replay.arrow_schema()) + list(PlayerData.arrow_schema()))
+
+
+def _timestamp(value: Any) -> datetime | None:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    elif isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    return value
+
+
+class PlayersTableBuilder:
+    """
+    Build Arrow record batches of replays' players_data. Replay columns are
+    stored once per replay and repeated for its players when building a batch.
+    """
+
+    def __init__(self) -> None:
+        self._replays: Dict[str, List[Any]] = dict()
+        self._players: Dict[str, List[Any]] = dict()
+        self._rows: List[int] = list()
+        self.clear()
+
+    def clear(self) -> None:
+        self._replays = {name: list() for name in Replay.arrow_schema().names}
+        self._players = {name: list() for name in _PLAYER_FIELDS}
+        self._rows = list()
+
+    def __len__(self) -> int:
+        """Number of player rows"""
+        return len(self._rows)
+
+    def add(self, replay: Replay | Mapping[str, Any]) -> None:
+        """Add players of a replay"""
+        row: int = len(self._replays["id"])
+        players: List[Any]
+        if isinstance(replay, Replay):
+            for name in _REPLAY_FIELDS:
+                self._replays[name].append(getattr(replay, name))
+            self._replays["version"].append(replay.game_version.get("name"))
+            players = replay.players_data
+            for name in _PLAYER_FIELDS:
+                self._players[name].extend([getattr(p, name) for p in players])
+        else:
+            by_alias: bool = "_id" in replay
+            keys: List[str] = _REPLAY_ALIASES if by_alias else _REPLAY_FIELDS
+            for name, key in zip(_REPLAY_FIELDS, keys):
+                self._replays[name].append(replay.get(key))
+            game_version = replay.get("gv" if by_alias else "game_version") or {}
+            self._replays["version"].append(game_version.get("name"))
+            time: List[Any] = self._replays["battle_start_time"]
+            time[-1] = _timestamp(time[-1])
+            players = replay.get("d" if by_alias else "players_data") or []
+            keys = _PLAYER_ALIASES if by_alias else _PLAYER_FIELDS
+            for name, key in zip(_PLAYER_FIELDS, keys):
+                self._players[name].extend([p.get(key) for p in players])
+        arena_unique_id: List[Any] = self._replays["arena_unique_id"]
+        if arena_unique_id[-1] is not None:
+            arena_unique_id[-1] = int(arena_unique_id[-1])
+        self._rows.extend([row] * len(players))
+
+    def build(self) -> pyarrow.RecordBatch:
+        """Return a record batch of the added replays and clear the builder"""
+        rows = pyarrow.array(self._rows, pyarrow.int32())
+        arrays: List[pyarrow.Array] = [
+            pyarrow.array(self._replays[field.name], field.type).take(rows)
+            for field in Replay.arrow_schema()
+        ]
+        arrays += [
+            pyarrow.array(self._players[field.name], field.type)
+            for field in PlayerData.arrow_schema()
+        ]
+        self.clear()
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=players_schema())
+
+
+def players_table(replays: Iterable[Replay | Mapping[str, Any]]) -> pyarrow.Table:
+    """Return a table of players_data of replays"""
+    builder = PlayersTableBuilder()
+    for replay in replays:
+        builder.add(replay)
+    return pyarrow.Table.from_batches([builder.build()])
+
+
+class PlayersParquetWriter:
+    """
+    Write players_data of replays to a Parquet file in row groups of
+    'batch_size' player rows. Batches are built while the previous one is
+    being written. Can be used as a sink of crawl_replays():
+
+        async with PlayersParquetWriter("players.parquet") as writer:
+            rows: int = await writer.write(replays)
+    """
+
+    DEFAULT_BATCH_SIZE: int = 100_000  # player rows
+
+    def __init__(
+        self,
+        path: Path | str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        compression: str = "zstd",
+    ) -> None:
+        assert batch_size > 0, "batch_size must be > 0"
+        self.path: Path = Path(path)
+        self.batch_size: int = batch_size
+        self.rows: int = 0
+        self._builder = PlayersTableBuilder()
+        self._writer = pq.ParquetWriter(
+            self.path, players_schema(), compression=compression
+        )
+        self._pending: Optional[asyncio.Task] = None
+
+    async def add(self, obj: Replay | Mapping[str, Any]) -> None:
+        """Add a replay and write a row group when the batch is full"""
+        self._builder.add(obj)
+        if len(self._builder) >= self.batch_size:
+            await self._write_batch()
+
+    async def _write_batch(self) -> None:
+        """Start writing the current batch once the previous write has finished"""
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        if len(self._builder) > 0:
+            batch: pyarrow.RecordBatch = self._builder.build()
+            self.rows += batch.num_rows
+            self._pending = asyncio.create_task(
+                asyncio.to_thread(self._writer.write_batch, batch)
+            )
+
+    async def flush(self) -> None:
+        """Write added replays and wait for writes to complete"""
+        await self._write_batch()
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+
+    async def write(
+        self,
+        replays: AsyncIterable[Replay | Mapping[str, Any]]
+        | Iterable[Replay | Mapping[str, Any]],
+    ) -> int:
+        """Write a (async) stream of replays and return the number of player rows"""
+        if isinstance(replays, AsyncIterable):
+            async for replay in replays:
+                await self.add(replay)
+        else:
+            for replay in replays:
+                await self.add(replay)
+        await self.flush()
+        return self.rows
+
+    async def close(self) -> None:
+        await self.flush()
+        await asyncio.to_thread(self._writer.close)
+
+    async def __aenter__(self) -> "PlayersParquetWriter":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
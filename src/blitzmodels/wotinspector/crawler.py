@@ -0,0 +1,467 @@
+"""
+Crawl replay details from WoTinspector.com API v2
+
+crawl_replays() lists replays with WoTinspector.list_replays(), skips replays
+crawled already, fetches the replay details concurrently and adds them to a
+sink: NDJSONSink, ParquetSink or MongoBulkWriter. CrawlState stores crawled
+replay ids and a checkpoint of the replay list so that an interrupted crawl
+resumes where it stopped.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from enum import IntEnum
+from pathlib import Path
+from time import time, time_ns
+from types import TracebackType
+from typing import (
+    Any,
+    BinaryIO,
+    ClassVar,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    Type,
+)
+
+import pyarrow  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+from ..replay import DEFAULT_WORKERS
+from ..replay_index import QUERY_CHUNK
+from ..sqlite_store import SQLiteStore
+from ..stats import Stats
+from .wi_apiv2 import Replay, WoTinspector
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+CHECKPOINT_INTERVAL: int = 100  # replays
+
+Cursor = Tuple[int, int]  # (page, offset) of the replay list
+
+
+class ReplaySink(Protocol):
+    """Sink of crawled replays. MongoBulkWriter is a sink too"""
+
+    async def add(self, obj: Replay) -> Any: ...
+
+    async def flush(self) -> Any: ...
+
+
+class NDJSONSink:
+    """
+    Append replays to a newline delimited JSON file. Replays are written in
+    batches of 'batch_size' in a worker thread
+    """
+
+    DEFAULT_BATCH_SIZE: int = 100
+
+    def __init__(self, path: Path | str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        assert batch_size > 0, "batch_size must be > 0"
+        self.path: Path = Path(path)
+        self.batch_size: int = batch_size
+        self._lines: List[bytes] = list()
+        self._file: BinaryIO | None = None
+
+    async def add(self, obj: Replay) -> None:
+        self._lines.append(obj.model_dump_json(by_alias=True).encode() + b"\n")
+        if len(self._lines) >= self.batch_size:
+            await self.flush()
+
+    def _write(self, lines: List[bytes]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.writelines(lines)
+        self._file.flush()
+
+    async def flush(self) -> None:
+        """Write buffered replays"""
+        if len(self._lines) == 0:
+            return None
+        lines: List[bytes] = self._lines
+        self._lines = list()
+        await asyncio.to_thread(self._write, lines)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def __aenter__(self) -> "NDJSONSink":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+
+class ParquetSink:
+    """
+    Write replays to a Parquet dataset directory. Each sink writes a new
+    'part-<time>.parquet' file with a row group per 'batch_size' replays.
+    The replays are stored as JSON with columns for filtering.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 1000
+
+    def __init__(self, path: Path | str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        assert batch_size > 0, "batch_size must be > 0"
+        self.path: Path = Path(path)
+        self.batch_size: int = batch_size
+        self._rows: Dict[str, List[Any]] = self._empty()
+        self._writer: pq.ParquetWriter | None = None
+
+    @classmethod
+    def arrow_schema(cls) -> pyarrow.schema:
+        return pyarrow.schema(
+            [
+                ("id", pyarrow.string()),
+                ("battle_start_time", pyarrow.int64()),
+                ("map_id", pyarrow.int32()),
+                ("protagonist", pyarrow.int64()),
+                ("replay", pyarrow.string()),
+            ]
+        )
+
+    def _empty(self) -> Dict[str, List[Any]]:
+        return {name: list() for name in self.arrow_schema().names}
+
+    async def add(self, obj: Replay) -> None:
+        self._rows["id"].append(obj.id)
+        self._rows["battle_start_time"].append(int(obj.battle_start_time.timestamp()))
+        self._rows["map_id"].append(obj.map_id)
+        self._rows["protagonist"].append(obj.protagonist)
+        self._rows["replay"].append(obj.model_dump_json(by_alias=True))
+        if len(self._rows["id"]) >= self.batch_size:
+            await self.flush()
+
+    def _write(self, table: pyarrow.Table) -> None:
+        if self._writer is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(
+                self.path / f"part-{time_ns()}.parquet", self.arrow_schema()
+            )
+        self._writer.write_table(table)
+
+    async def flush(self) -> None:
+        """Write buffered replays as a row group"""
+        if len(self._rows["id"]) == 0:
+            return None
+        table = pyarrow.table(self._rows, schema=self.arrow_schema())
+        self._rows = self._empty()
+        await asyncio.to_thread(self._write, table)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._writer is not None:
+            await asyncio.to_thread(self._writer.close)
+            self._writer = None
+
+    async def __aenter__(self) -> "ParquetSink":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+
+class CrawlStatus(IntEnum):
+    done = 1
+    failed = 2
+
+
+class Checkpoint(NamedTuple):
+    """Position of a crawl in the replay list"""
+
+    filters: Dict[str, Any]
+    page: int
+    offset: int
+
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS replays (
+    id      TEXT    PRIMARY KEY,
+    status  INTEGER NOT NULL,
+    updated INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS replays_status ON replays (status);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name    TEXT    PRIMARY KEY,
+    filters TEXT    NOT NULL,
+    page    INTEGER NOT NULL,
+    offset  INTEGER NOT NULL,
+    updated INTEGER NOT NULL
+);
+"""
+
+
+class CrawlState(SQLiteStore):
+    """
+    Persistent SQLite state of replay crawls: ids of the crawled replays and
+    checkpoints of named crawls. Use as an async context manager or call open()
+    and close():
+
+        async with CrawlState("crawl.db") as state:
+            stats = await crawl_replays(wi, sink, state, tier=10)
+    """
+
+    SCHEMA: ClassVar[str] = _SCHEMA
+    NAME: ClassVar[str] = "crawl state"
+
+    async def crawled(self, ids: Iterable[str], failed: bool = False) -> Set[str]:
+        """
+        Return the ids crawled successfully already. Ids that could not be
+        fetched are included if failed=True
+        """
+        res: Set[str] = set()
+        ids = list(ids)
+        statuses: List[int] = [CrawlStatus.done.value]
+        if failed:
+            statuses.append(CrawlStatus.failed.value)
+        for i in range(0, len(ids), QUERY_CHUNK):
+            chunk: List[str] = ids[i : i + QUERY_CHUNK]
+            async with self.db.execute(
+                f"""SELECT id FROM replays
+                    WHERE status IN ({", ".join("?" * len(statuses))})
+                    AND id IN ({", ".join("?" * len(chunk))})""",
+                (*statuses, *chunk),
+            ) as cursor:
+                res.update([row[0] async for row in cursor])
+        return res
+
+    async def failed(self) -> List[str]:
+        """Return the ids that could not be fetched"""
+        async with self.db.execute(
+            "SELECT id FROM replays WHERE status = ? ORDER BY updated",
+            (CrawlStatus.failed.value,),
+        ) as cursor:
+            return [row[0] async for row in cursor]
+
+    async def add(
+        self, ids: Iterable[str], status: CrawlStatus = CrawlStatus.done
+    ) -> None:
+        now: int = int(time())
+        await self.db.executemany(
+            "INSERT OR REPLACE INTO replays (id, status, updated) VALUES (?, ?, ?)",
+            ((id, status.value, now) for id in ids),
+        )
+        await self.db.commit()
+
+    async def count(self, status: CrawlStatus | None = None) -> int:
+        """Return number of crawled replays"""
+        sql: str = "SELECT COUNT(*) FROM replays"
+        params: Tuple = ()
+        if status is not None:
+            sql += " WHERE status = ?"
+            params = (status.value,)
+        async with self.db.execute(sql, params) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return row[0]
+        return 0
+
+    async def checkpoint(self, name: str) -> Checkpoint | None:
+        """Return checkpoint of a crawl or None if the crawl has completed"""
+        async with self.db.execute(
+            "SELECT filters, page, offset FROM checkpoints WHERE name = ?", (name,)
+        ) as cursor:
+            if (row := await cursor.fetchone()) is not None:
+                return Checkpoint(json.loads(row[0]), row[1], row[2])
+        return None
+
+    async def save_checkpoint(
+        self, name: str, filters: Dict[str, Any], cursor: Cursor
+    ) -> None:
+        await self.db.execute(
+            """INSERT OR REPLACE INTO checkpoints
+                (name, filters, page, offset, updated) VALUES (?, ?, ?, ?, ?)""",
+            (name, json.dumps(filters, sort_keys=True), *cursor, int(time())),
+        )
+        await self.db.commit()
+
+    async def clear_checkpoint(self, name: str) -> None:
+        await self.db.execute("DELETE FROM checkpoints WHERE name = ?", (name,))
+        await self.db.commit()
+
+
+class CrawlStats(Stats):
+    """Statistics of crawl_replays()"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.listed: int = 0
+        self.skipped: int = 0
+        self.fetched: int = 0
+        self.errors: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Replays fetched per second"""
+        return self.per_second(self.fetched)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.listed} listed, {self.skipped} skipped, {self.fetched} fetched, "
+            f"{self.errors} errors: {self.elapsed:.2f}s ({self.rate:.1f} replays/s)"
+        )
+
+
+async def crawl_replays(
+    wi: WoTinspector,
+    sink: ReplaySink,
+    state: CrawlState,
+    name: str = "default",
+    workers: int = DEFAULT_WORKERS,
+    prefetch: int = 1,
+    max_pages: int = -1,
+    retry_failed: bool = False,
+    checkpoint_interval: int = CHECKPOINT_INTERVAL,
+    **filter_args,
+) -> CrawlStats:
+    """
+    Crawl replays matching 'filter_args' and add their details to 'sink'.
+
+    Replays in 'state' are skipped and up to 'workers' replays are fetched
+    concurrently. Every 'checkpoint_interval' replays the sink is flushed and
+    the crawled ids and the position in the replay list are saved to 'state'.
+    A crawl 'name' with the same filters resumes from its checkpoint. The
+    checkpoint is cleared when the replay list has been crawled to the end.
+    Replays may be added to the sink again if a crawl is killed between
+    checkpoints. Replays that could not be fetched are skipped too unless
+    retry_failed=True: they are then fetched first.
+    """
+    stats = CrawlStats()
+    page: int = 1
+    offset: int = 0
+    if (checkpoint := await state.checkpoint(name)) is not None:
+        if checkpoint.filters == json.loads(json.dumps(filter_args, sort_keys=True)):
+            page, offset = checkpoint.page, checkpoint.offset
+            verbose(f"resuming crawl '{name}' from page={page}, offset={offset}")
+        else:
+            message(f"filters of crawl '{name}' have changed, starting from page 1")
+
+    done: List[str] = list()
+    failed: List[str] = list()
+    # ids fetched but not saved to 'state' yet. Saved ids are matched in 'state'
+    unsaved: Set[str] = set()
+    # listed replays not fetched or skipped yet: (position, id)
+    batch: Deque[Tuple[Cursor, str]] = deque()
+    # replays in list order: (position in the replay list, fetch task)
+    queue: Deque[Tuple[Cursor, asyncio.Task[Replay | None] | None]] = deque()
+    pending: Set[asyncio.Task[Replay | None]] = set()
+    replays = wi.list_replays(
+        page=page,
+        max_pages=max_pages,
+        prefetch=prefetch,
+        offset=offset,
+        **filter_args,
+    )
+    position: Cursor = replays.cursor
+
+    async def completed(fill: bool) -> None:
+        """Add fetched replays to the sink"""
+        nonlocal pending
+        while len(pending) >= (workers if fill else 1):
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                replay: Replay | None = None
+                try:
+                    replay = task.result()
+                except Exception as err:
+                    error(f"could not fetch replay {task.get_name()}: {err}")
+                if replay is None:
+                    failed.append(task.get_name())
+                    stats.errors += 1
+                else:
+                    await sink.add(replay)
+                    done.append(replay.id)
+                    stats.fetched += 1
+        # the checkpoint is the position of the first replay not added yet
+        while queue and (queue[0][1] is None or queue[0][1] not in pending):
+            queue.popleft()
+
+    async def save() -> None:
+        """Flush the sink and save the crawled ids and the checkpoint"""
+        await sink.flush()
+        await state.add(done)
+        await state.add(failed, CrawlStatus.failed)
+        unsaved.difference_update(done)
+        unsaved.difference_update(failed)
+        done.clear()
+        failed.clear()
+        cursor: Cursor = position
+        if queue:
+            cursor = queue[0][0]
+        elif batch:
+            cursor = batch[0][0]
+        await state.save_checkpoint(name, filter_args, cursor)
+
+    async def fetch(id: str, cursor: Cursor) -> None:
+        task = asyncio.create_task(wi.get_replay(id), name=id)
+        unsaved.add(id)
+        pending.add(task)
+        queue.append((cursor, task))
+        await completed(fill=True)
+        if len(done) + len(failed) >= checkpoint_interval:
+            await save()
+
+    async def fetch_batch() -> None:
+        """Fetch listed replays that have not been crawled or failed already"""
+        crawled: Set[str] = await state.crawled([id for _, id in batch], failed=True)
+        while batch:
+            cursor, id = batch.popleft()
+            if id in unsaved or id in crawled:
+                stats.skipped += 1
+                if queue:
+                    queue.append((cursor, None))
+            else:
+                await fetch(id, cursor)
+
+    try:
+        if retry_failed:
+            for id in await state.failed():
+                await fetch(id, position)
+        async for summary in replays:
+            stats.listed += 1
+            batch.append((position, summary.id))
+            position = replays.cursor
+            # query the state once per page
+            if position[1] == 0 or len(batch) >= QUERY_CHUNK:
+                await fetch_batch()
+        await fetch_batch()
+        await completed(fill=False)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await save()
+        await replays.aclose()
+    if replays.completed:
+        await state.clear_checkpoint(name)
+    stats.stop()
+    verbose(f"crawl '{name}': {stats}")
+    return stats
@@ -0,0 +1,302 @@
+"""
+Aggregate shots of WoTinspector API v2 BattleDetails
+
+shots_table() flattens BattleDetails.shots of a batch of battles into an Arrow
+table. Battles can be given as BattleDetails models or as JSON dicts to skip
+model validation. ShotAggregator bins the shots by map and distance and counts
+hits by map and hit segment with Arrow compute kernels. Only the aggregates
+are kept, so shots of any number of battles can be added batch by batch.
+Aggregators can be merged, e.g. partial results of worker processes.
+"""
+
+import logging
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+import pyarrow  # type: ignore
+import pyarrow.compute as pc  # type: ignore
+
+from .wi_apiv2 import BattleDetails, Shot
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+_SHOT_FIELDS: List[str] = Shot.arrow_schema().names
+
+# aggregate columns: summed over groups
+DISTANCE_COLUMNS: List[str] = [
+    "shots",
+    "hits",
+    "damaging",
+    "damage",
+    "nominal_damage",
+    "nominal_pen",
+]
+SEGMENT_COLUMNS: List[str] = ["hits", "damaging", "damage"]
+
+
+def shots_schema() -> pyarrow.schema:
+    """Schema of shots_table()"""
+    return pyarrow.schema(
+        [("battle_id", pyarrow.string()), ("map_id", pyarrow.int32())]
+        + list(Shot.arrow_schema())
+    )
+
+
+def shots_table(battles: Iterable[BattleDetails | Mapping[str, Any]]) -> pyarrow.Table:
+    """Return a table of shots of battles with battle_id and map_id"""
+    ids: List[str | None] = list()
+    map_ids: List[int | None] = list()
+    rows: List[int] = list()
+    columns: Dict[str, List[Any]] = {name: list() for name in _SHOT_FIELDS}
+    for row, battle in enumerate(battles):
+        if isinstance(battle, BattleDetails):
+            ids.append(battle.id)
+            map_ids.append(battle.map_id)
+            shots: Sequence[Any] = battle.shots
+            for name in _SHOT_FIELDS:
+                columns[name].extend([getattr(shot, name) for shot in shots])
+        else:
+            ids.append(battle.get("id"))
+            map_ids.append(battle.get("map_id"))
+            shots = battle.get("shots") or []
+            for name in _SHOT_FIELDS:
+                columns[name].extend([shot.get(name) for shot in shots])
+        rows.extend([row] * len(shots))
+
+    schema: pyarrow.schema = shots_schema()
+    indices = pyarrow.array(rows, pyarrow.int32())
+    arrays: List[pyarrow.Array] = [
+        pyarrow.array(ids, pyarrow.string()).take(indices),
+        pyarrow.array(map_ids, pyarrow.int32()).take(indices),
+    ]
+    arrays += [
+        pyarrow.array(columns[field.name], field.type) for field in Shot.arrow_schema()
+    ]
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def _sum_by(table: pyarrow.Table, keys: List[str], columns: List[str]) -> pyarrow.Table:
+    """Sum columns of table by keys"""
+    res: pyarrow.Table = table.group_by(keys).aggregate(
+        [(column, "sum") for column in columns]
+    )
+    return res.rename_columns(
+        [
+            name.removesuffix("_sum") if name not in keys else name
+            for name in res.column_names
+        ]
+    ).select(keys + columns)
+
+
+class ShotAggregator:
+    """
+    Aggregate shots by map and distance bin of 'bin_size' meters and hits by
+    map and hit segment. Shots further than 'max_distance' are counted in the
+    last bin. Shots with no or negative distance are not binned, but counted
+    in 'no_distance'. A shot is a hit if it has a target.
+    """
+
+    DEFAULT_BIN_SIZE: float = 25.0  # meters
+    DEFAULT_MAX_DISTANCE: float = 600.0  # meters
+    MAX_PENDING: int = 16  # partial aggregates kept before compacting
+
+    def __init__(
+        self,
+        bin_size: float = DEFAULT_BIN_SIZE,
+        max_distance: float = DEFAULT_MAX_DISTANCE,
+    ) -> None:
+        if bin_size <= 0 or max_distance < bin_size:
+            raise ValueError(
+                f"invalid bins: bin_size={bin_size}, max_distance={max_distance}"
+            )
+        self.bin_size: float = bin_size
+        self.max_distance: float = max_distance
+        self.bins: int = int(max_distance // bin_size)
+        self.battles: int = 0
+        self.no_distance: int = 0
+        self._distance: List[pyarrow.Table] = list()
+        self._segments: List[pyarrow.Table] = list()
+
+    def add(self, battles: Iterable[BattleDetails | Mapping[str, Any]]) -> None:
+        """Add shots of a batch of battles"""
+        battle_list: List[BattleDetails | Mapping[str, Any]] = list(battles)
+        self.battles += len(battle_list)
+        self.add_shots(shots_table(battle_list))
+
+    def add_shots(self, shots: pyarrow.Table) -> None:
+        """Add shots in shots_table() format. Does not count battles"""
+        distance = pc.cast(shots["distance"], pyarrow.float64())
+        has_distance = pc.fill_null(pc.greater_equal(distance, 0), False)
+        self.no_distance += len(shots) - (pc.sum(has_distance).as_py() or 0)
+        distance_bin = pc.min_element_wise(
+            pc.cast(pc.floor(pc.divide(distance, self.bin_size)), pyarrow.int32()),
+            pyarrow.scalar(self.bins - 1, pyarrow.int32()),
+        )
+        hit = pc.not_equal(shots["target"], 0)
+        table = pyarrow.table(
+            {
+                "map_id": shots["map_id"],
+                "distance_bin": distance_bin,
+                "segment": pc.cast(shots["segment"], pyarrow.string()),
+                "shots": pc.cast(has_distance, pyarrow.int64()),
+                "hits": pc.cast(hit, pyarrow.int64()),
+                "damaging": pc.cast(shots["has_damage"], pyarrow.int64()),
+                "damage": pc.cast(shots["damage"], pyarrow.int64()),
+                "nominal_damage": pc.cast(shots["nominal_damage"], pyarrow.int64()),
+                "nominal_pen": pc.cast(shots["nominal_pen"], pyarrow.int64()),
+            }
+        )
+        self._distance.append(
+            _sum_by(
+                table.filter(has_distance),
+                ["map_id", "distance_bin"],
+                DISTANCE_COLUMNS,
+            )
+        )
+        self._segments.append(
+            _sum_by(table.filter(hit), ["map_id", "segment"], SEGMENT_COLUMNS)
+        )
+        if len(self._distance) > self.MAX_PENDING:
+            self._compact()
+
+    def merge(self, other: "ShotAggregator") -> None:
+        """Add aggregates of another aggregator with the same bins"""
+        if (other.bin_size, other.bins) != (self.bin_size, self.bins):
+            raise ValueError("cannot merge aggregates with different distance bins")
+        self.battles += other.battles
+        self.no_distance += other.no_distance
+        self._distance.extend(other._distance)
+        self._segments.extend(other._segments)
+        self._compact()
+
+    def _compact(self) -> None:
+        """Sum partial aggregates"""
+        if len(self._distance) > 1:
+            self._distance = [
+                _sum_by(
+                    pyarrow.concat_tables(self._distance),
+                    ["map_id", "distance_bin"],
+                    DISTANCE_COLUMNS,
+                )
+            ]
+        if len(self._segments) > 1:
+            self._segments = [
+                _sum_by(
+                    pyarrow.concat_tables(self._segments),
+                    ["map_id", "segment"],
+                    SEGMENT_COLUMNS,
+                )
+            ]
+
+    def _divide(
+        self, numerator: pyarrow.Array, denominator: pyarrow.Array
+    ) -> pyarrow.Array:
+        """Divide arrays, null if denominator is zero"""
+        return pc.divide(
+            pc.cast(numerator, pyarrow.float64()),
+            pc.if_else(
+                pc.equal(denominator, 0),
+                pyarrow.scalar(None, denominator.type),
+                denominator,
+            ),
+        )
+
+    def distance_table(self) -> pyarrow.Table:
+        """
+        Return shots by map_id and distance bin ('distance' is the lower edge
+        of the bin) with hit_rate, pen_rate (damaging hits / hits) and
+        avg_damage (damage / damaging hits)
+        """
+        self._compact()
+        if len(self._distance) == 0:
+            return self._empty_distance_table()
+        table: pyarrow.Table = self._distance[0].sort_by(
+            [("map_id", "ascending"), ("distance_bin", "ascending")]
+        )
+        return (
+            table.add_column(
+                2,
+                "distance",
+                pc.multiply(
+                    pc.cast(table["distance_bin"], pyarrow.float64()), self.bin_size
+                ),
+            )
+            .append_column("hit_rate", self._divide(table["hits"], table["shots"]))
+            .append_column("pen_rate", self._divide(table["damaging"], table["hits"]))
+            .append_column(
+                "avg_damage", self._divide(table["damage"], table["damaging"])
+            )
+        )
+
+    def _empty_distance_table(self) -> pyarrow.Table:
+        return pyarrow.table(
+            {
+                "map_id": pyarrow.array([], pyarrow.int32()),
+                "distance_bin": pyarrow.array([], pyarrow.int32()),
+                "distance": pyarrow.array([], pyarrow.float64()),
+            }
+            | {name: pyarrow.array([], pyarrow.int64()) for name in DISTANCE_COLUMNS}
+            | {
+                name: pyarrow.array([], pyarrow.float64())
+                for name in ["hit_rate", "pen_rate", "avg_damage"]
+            }
+        )
+
+    def segment_table(self) -> pyarrow.Table:
+        """
+        Return hits by map_id and hit segment with the segment's share of the
+        map's hits ('share')
+        """
+        self._compact()
+        if len(self._segments) == 0:
+            return pyarrow.table(
+                {
+                    "map_id": pyarrow.array([], pyarrow.int32()),
+                    "segment": pyarrow.array([], pyarrow.string()),
+                }
+                | {name: pyarrow.array([], pyarrow.int64()) for name in SEGMENT_COLUMNS}
+                | {"share": pyarrow.array([], pyarrow.float64())}
+            )
+        table: pyarrow.Table = self._segments[0]
+        totals: pyarrow.Table = _sum_by(table, ["map_id"], ["hits"]).rename_columns(
+            ["map_id", "map_hits"]
+        )
+        table = table.join(totals, "map_id").sort_by(
+            [("map_id", "ascending"), ("segment", "ascending")]
+        )
+        return table.append_column(
+            "share", self._divide(table["hits"], table["map_hits"])
+        ).drop_columns(["map_hits"])
+
+    def histogram(
+        self, column: str = "shots", map_id: Optional[int] = None
+    ) -> pyarrow.Array:
+        """
+        Return a dense array of 'column' totals by distance bin of a map or of
+        all maps. Use .to_numpy() to get a NumPy array
+        """
+        if column not in DISTANCE_COLUMNS:
+            raise ValueError(f"unknown column: {column}, valid: {DISTANCE_COLUMNS}")
+        self._compact()
+        counts: List[int] = [0] * self.bins
+        if len(self._distance) > 0:
+            table: pyarrow.Table = self._distance[0]
+            if map_id is not None:
+                table = table.filter(pc.equal(table["map_id"], map_id))
+            table = _sum_by(table, ["distance_bin"], [column])
+            for distance_bin, value in zip(
+                table["distance_bin"].to_pylist(), table[column].to_pylist()
+            ):
+                counts[distance_bin] = value
+        return pyarrow.array(counts, pyarrow.int64())
@@ -0,0 +1,145 @@
+"""
+Bulk migration of WoTinspector API v1 replays (ReplayJSON) to API v2 Replays
+
+migrate_replays() reads V1 replay JSON files, converts the replays in batches
+in a process pool with convert_ReplayJSON() and appends them to a newline
+delimited JSON file. Files ending with '.ndjson' or '.jsonl' are read as a
+replay per line, other files as a single replay.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from ..replay import DEFAULT_WORKERS, map_executor
+from ..stats import Stats
+from .wi_apiv2 import Replay, convert_ReplayJSON
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+BATCH_SIZE: int = 1000  # replays
+NDJSON_SUFFIXES: List[str] = [".ndjson", ".jsonl"]
+
+
+class MigrateStats(Stats):
+    """Statistics of migrate_replays()"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.converted: int = 0
+        self.errors: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Replays converted per second"""
+        return self.per_second(self.converted)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.converted} converted, {self.errors} errors: "
+            f"{self.elapsed:.2f}s ({self.rate:.1f} replays/s)"
+        )
+
+
+def convert_batch(
+    replays: List[str], by_alias: bool = False, validate: bool = False
+) -> Tuple[List[str], int]:
+    """
+    Convert a batch of V1 replay JSON documents to V2 replay JSON lines.
+    Validate the converted replays with Replay model if validate=True.
+    Returns the converted lines and the number of failed replays
+    """
+    lines: List[str] = list()
+    errors: int = 0
+    for replay_json in replays:
+        try:
+            replay: Dict[str, Any] = convert_ReplayJSON(
+                json.loads(replay_json), by_alias=by_alias
+            )
+            if validate:
+                lines.append(
+                    Replay.model_validate(replay).model_dump_json(by_alias=by_alias)
+                )
+            else:
+                lines.append(json.dumps(replay, ensure_ascii=False))
+        except (KeyError, ValueError, TypeError, IndexError) as err:
+            debug(f"could not convert replay: {type(err).__name__}: {err}")
+            errors += 1
+    return lines, errors
+
+
+def _read_replays(sources: Iterable[Path | str]) -> Iterator[str]:
+    """Stream V1 replay JSON documents of files"""
+    for source in sources:
+        path = Path(source)
+        try:
+            if path.suffix in NDJSON_SUFFIXES:
+                with open(path, "r", encoding="utf-8") as file:
+                    for line in file:
+                        if line.strip():
+                            yield line
+            else:
+                yield path.read_text(encoding="utf-8")
+        except OSError as err:
+            error(f"could not read {path}: {err}")
+
+
+def _batches(replays: Iterator[str], batch_size: int) -> Iterator[List[str]]:
+    batch: List[str] = list()
+    for replay in replays:
+        batch.append(replay)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = list()
+    if len(batch) > 0:
+        yield batch
+
+
+async def migrate_replays(
+    sources: Iterable[Path | str],
+    output: Path | str,
+    by_alias: bool = False,
+    validate: bool = False,
+    batch_size: int = BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    processes: bool = True,
+) -> MigrateStats:
+    """
+    Convert V1 replays in 'sources' files to V2 replays and append them to
+    'output' NDJSON file. Replays are converted in batches of 'batch_size' in
+    a process pool (or a thread pool if processes=False) in no particular order
+    """
+    assert batch_size > 0, "batch_size must be > 0"
+    stats = MigrateStats()
+
+    def batch_failed(batch: List[str], err: BaseException) -> None:
+        error(f"could not convert {len(batch)} replays: {type(err).__name__}: {err}")
+        stats.errors += len(batch)
+
+    with open(output, "a", encoding="utf-8") as file:
+        async with aclosing(
+            map_executor(
+                convert_batch,
+                _batches(_read_replays(sources), batch_size),  # type: ignore
+                by_alias,
+                validate,
+                workers=workers,
+                processes=processes,
+                on_error=batch_failed,
+            )
+        ) as results:
+            async for lines, errors in results:
+                stats.converted += len(lines)
+                stats.errors += errors
+                if len(lines) > 0:
+                    await asyncio.to_thread(file.write, "\n".join(lines) + "\n")
+    stats.stop()
+    verbose(f"migrated replays: {stats}")
+    return stats
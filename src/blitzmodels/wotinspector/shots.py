@@ -0,0 +1,172 @@
+"""
+Extract shots from the packet stream ('data.wotreplay') of WoT Blitz replays.
+
+The entity method ids and argument layouts below have been mapped against
+WoTinspector.com API v1 responses of the same replays. The packet stream has
+only the shots and hits visible to the recording player and does not have
+shell ids, hit segments or nominal penetration/damage: those Shot fields are
+left empty.
+"""
+
+import logging
+from math import atan2, dist, hypot
+from struct import Struct, error as StructError
+from typing import Any, Dict, Iterable, List, Tuple
+from zipfile import BadZipFile
+
+from ..replay import ReplayFile
+from ..replay_packets import Packet, PacketType, entity_call
+from .battle_results import BattleResults
+from .wi_apiv2 import Shot
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+ENTITY_TYPE_VEHICLE: int = 2
+VEHICLE_HEALTH_OFFSET: int = 51  # in entity_create payload
+
+# Avatar methods
+METHOD_SHOT_FIRED: int = 30  # shooter, shot id, effects, position, velocity, gravity
+METHOD_SHOT_STOPPED: int = 20  # shot id, position
+# Vehicle methods
+METHOD_SHOT_HIT: int = 8  # attacker, target, ..., has damage
+METHOD_HEALTH_CHANGED: int = 1  # health, attacker, reason
+
+SHOT_PACKETS: frozenset[int] = frozenset(
+    [
+        PacketType.base_player_create,
+        PacketType.entity_create,
+        PacketType.entity_method,
+    ]
+)
+
+_ENTITY: Struct = Struct("<I")
+_ENTITY_CREATE: Struct = Struct("<IH")
+_HEALTH: Struct = Struct("<H")
+_SHOT_FIRED: Struct = Struct("<IIB3f3f")
+_SHOT_STOPPED: Struct = Struct("<I3f")
+_SHOT_HIT: Struct = Struct("<II")
+_HEALTH_CHANGED: Struct = Struct("<hIB")
+
+
+def _shot(time: float, shooter: int) -> Dict[str, Any]:
+    return {
+        "time": time,
+        "shooter": shooter,
+        "target": 0,
+        "has_damage": False,
+        "shell_id": 0,
+        "turret_yaw": 0.0,
+        "gun_pitch": 0.0,
+        "segment": "",
+        "distance": 0.0,
+        "nominal_pen": 0,
+        "nominal_damage": 0,
+        "damage": 0,
+    }
+
+
+def shots_from_packets(
+    packets: Iterable[Packet], dbids: Dict[int, int] | None = None
+) -> List[Shot]:
+    """
+    Extract shots from replay packets. Shooters and targets are mapped from
+    entity ids to account ids with 'dbids' if given. turret_yaw and gun_pitch
+    are the direction of the shell in the map coordinates (radians).
+    Truncated packets are logged and skipped.
+    """
+    if dbids is None:
+        dbids = dict()
+    avatar: int | None = None
+    health: Dict[int, int] = dict()  # vehicle entity id -> health
+    shots: List[Dict[str, Any]] = list()
+    fired: Dict[int, Tuple[Dict[str, Any], Tuple[float, ...]]] = dict()
+    in_flight: Dict[int, Dict[str, Any]] = dict()  # shooter -> last shot without hit
+    # (target, attacker) -> last hit
+    last_hit: Dict[Tuple[int, int], Dict[str, Any]] = dict()
+    shot: Dict[str, Any] | None
+
+    skipped: int = 0
+
+    for header, payload in packets:
+        try:
+            if header.type == PacketType.entity_method:
+                call, args = entity_call(payload)
+                if len(args) < call.size:
+                    raise ValueError(f"entity call truncated: {len(args)} bytes")
+                if call.entity_id == avatar:
+                    if call.method == METHOD_SHOT_FIRED:
+                        shooter, shot_id, _, x, y, z, vx, vy, vz = (
+                            _SHOT_FIRED.unpack_from(args)
+                        )
+                        shot = _shot(header.clock, shooter)
+                        shot["turret_yaw"] = atan2(vx, vz)
+                        shot["gun_pitch"] = atan2(vy, hypot(vx, vz))
+                        shots.append(shot)
+                        fired[shot_id] = (shot, (x, y, z))
+                        in_flight[shooter] = shot
+                    elif call.method == METHOD_SHOT_STOPPED:
+                        shot_id, x, y, z = _SHOT_STOPPED.unpack_from(args)
+                        if (shot_fired := fired.pop(shot_id, None)) is not None:
+                            shot, origin = shot_fired
+                            shot["distance"] = dist(origin, (x, y, z))
+                elif call.entity_id in health:
+                    if call.method == METHOD_SHOT_HIT:
+                        # has damage flag is the last argument
+                        if len(args) <= _SHOT_HIT.size:
+                            raise ValueError(f"shot hit too short: {len(args)} bytes")
+                        attacker, _ = _SHOT_HIT.unpack_from(args)
+                        if (shot := in_flight.pop(attacker, None)) is None:
+                            # the shooter was not visible
+                            shot = _shot(header.clock, attacker)
+                            shots.append(shot)
+                        shot["target"] = call.entity_id
+                        shot["has_damage"] = args[-1] != 0
+                        last_hit[(call.entity_id, attacker)] = shot
+                    elif call.method == METHOD_HEALTH_CHANGED:
+                        hp, attacker, reason = _HEALTH_CHANGED.unpack_from(args)
+                        hp = max(hp, 0)
+                        if reason == 0 and (
+                            shot := last_hit.get((call.entity_id, attacker))
+                        ):
+                            shot["damage"] += health[call.entity_id] - hp
+                            shot["has_damage"] = True
+                        health[call.entity_id] = hp
+            elif header.type == PacketType.entity_create:
+                entity_id, entity_type = _ENTITY_CREATE.unpack_from(payload)
+                if entity_type == ENTITY_TYPE_VEHICLE:
+                    (health[entity_id],) = _HEALTH.unpack_from(
+                        payload, VEHICLE_HEALTH_OFFSET
+                    )
+            elif header.type == PacketType.base_player_create:
+                avatar = _ENTITY.unpack_from(payload)[0]
+        except (StructError, ValueError) as err:
+            debug(f"skipping malformed packet at {header.clock:.1f}s: {err}")
+            skipped += 1
+
+    if skipped > 0:
+        message(f"skipped {skipped} malformed packets")
+    for shot in shots:
+        shot["shooter"] = dbids.get(shot["shooter"], shot["shooter"])
+        shot["target"] = dbids.get(shot["target"], shot["target"])
+    return [Shot.model_validate(shot) for shot in shots]
+
+
+def read_shots(replay_file: ReplayFile) -> List[Shot]:
+    """
+    Read shots from a replay file. Shooters and targets are account ids
+    if battle_results.dat can be decoded, entity ids otherwise. Blocking
+    """
+    dbids: Dict[int, int] = dict()
+    try:
+        results = BattleResults(replay_file.read_battle_results())
+        dbids = {
+            player_data["entity_id"]: player_data["dbid"]
+            for player_data in results.players_data
+        }
+    except (BadZipFile, KeyError, ValueError) as err:
+        debug(f"could not read battle results: {err}")
+    return shots_from_packets(replay_file.packets(SHOT_PACKETS), dbids)
@@ -1,19 +1,28 @@
+import asyncio
 import logging
 from typing import (
+    AsyncIterator,
+    BinaryIO,
+    Generic,
+    Iterable,
+    NamedTuple,
     Optional,
+    TypeVar,
     cast,
     Any,
     Self,
     ClassVar,
+    Mapping,
     Tuple,
 )
 from aiohttp import ClientResponse
 from collections import defaultdict
+from functools import cached_property
 from datetime import datetime
 from enum import IntEnum, StrEnum
 from pathlib import Path
 from pydantic import ConfigDict, Field
-from urllib.parse import urlencode, quote
+from urllib.parse import urlencode, quote, quote_plus
 from base64 import b64encode
 from zipfile import BadZipFile
 from pydantic import field_validator, model_validator, HttpUrl
@@ -34,6 +43,7 @@ from ..wg_api import WGApiWoTBlitzTankopedia
 from ..tank import EnumVehicleTypeInt
 from ..map import Maps
 from ..replay import ReplayFile
+from ..replay_index import ReplayIndex, ReplayUpload, UploadStatus, WIApi
 
 
 # Setup logging
@@ -351,6 +361,61 @@ class ReplayData(JSONExportable):
 ###########################################
 
 
+D = TypeVar("D")
+
+
+class PlayerIndex(NamedTuple, Generic[D]):
+    """
+    Per-replay indexes of players. Teams are 1 and 2. Players of unknown team
+    are not indexed. Shared by V1 ReplayJSON and V2 Replay
+    """
+
+    ally_team: int  # protagonist's team
+    teams: dict[int, int]  # account_id -> team
+    players: dict[int, D]  # account_id -> ReplayDetail / PlayerData
+    platoons: dict[int, dict[int, list[int]]]  # team -> squad_index -> account_ids
+
+    @classmethod
+    def build(
+        cls,
+        protagonist_team: int | None,
+        allies: Iterable[int],
+        enemies: Iterable[int],
+        players: dict[int, D],
+        squads: Iterable[tuple[int, int | None, int | None]],
+    ) -> "PlayerIndex[D]":
+        """
+        Build index. 'squads' are (account_id, team, squad_index) tuples. The
+        team overrides the team of allies/enemies if it is 1 or 2
+        """
+        ally_team: int = protagonist_team if protagonist_team in (1, 2) else 1
+        teams: dict[int, int] = {account_id: 3 - ally_team for account_id in enemies}
+        teams.update({account_id: ally_team for account_id in allies})
+        platoons: dict[int, dict[int, list[int]]] = {1: dict(), 2: dict()}
+        squad_members: list[tuple[int, int]] = list()
+        for account_id, team, squad_index in squads:
+            if team == 1 or team == 2:
+                teams[account_id] = team
+            if squad_index is not None and squad_index > 0:
+                squad_members.append((account_id, squad_index))
+        for account_id, squad_index in squad_members:
+            if (team := teams.get(account_id)) is not None:
+                platoons[team].setdefault(squad_index, list()).append(account_id)
+        return cls(ally_team, teams, players, platoons)
+
+    def get_platoons(
+        self, player: int | None = None
+    ) -> Tuple[dict[int, list[int]], dict[int, list[int]]]:
+        """
+        Return allied and enemy platoons of the player (or the protagonist)
+        as shallow copies: squad_index -> account_ids
+        """
+        team: int = self.ally_team
+        if player is not None and (team := self.teams.get(player, 0)) == 0:
+            raise ValueError(f"player {player} not found in replay")
+        return dict(self.platoons[team]), dict(self.platoons[3 - team])
+
+
 class WoTinspectorAPI(JSONExportable):
     status: str = Field(default="ok", alias="s")
     error: dict[str, Any] = Field(default={}, alias="e")
@@ -1294,21 +1359,70 @@ class ReplayJSON(WoTinspectorAPI):
         # debug("set id=%s", values["id"])
         return self
 
+    @model_validator(mode="after")
+    def _reset_indexes(self) -> Self:
+        self.__dict__.pop("player_index", None)
+        return self
+
+    def model_copy(
+        self, *, update: Mapping[str, Any] | None = None, deep: bool = False
+    ) -> Self:
+        """Copy the replay. player_index is rebuilt for the copy"""
+        res: Self = super().model_copy(update=update, deep=deep)
+        res.__dict__.pop("player_index", None)
+        return res
+
     # def get_url_json(self) -> str:
     #     return f"{self._URL_REPLAY_JSON}{self.id}"
 
+    @cached_property
+    def player_index(self) -> PlayerIndex[ReplayDetail]:
+        """
+        Per-replay indexes of teams, details and platoons. Built on first use
+        and rebuilt when the replay is validated or copied.
+
+        Modifying fields in place, e.g. data.summary.details.append(), does not
+        update the index: use 'del replay.player_index' to rebuild it
+        """
+        summary: ReplaySummary = self.data.summary
+        details: list[ReplayDetail] = (
+            summary.details if isinstance(summary.details, list) else [summary.details]
+        )
+        return PlayerIndex.build(
+            summary.protagonist_team,
+            summary.allies,
+            summary.enemies,
+            {detail.dbid: detail for detail in details},
+            ((detail.dbid, None, detail.squad_index) for detail in details),
+        )
+
+    @property
+    def ally_team(self) -> int:
+        """Team of the protagonist. 1 if protagonist_team is not known"""
+        return self.player_index.ally_team
+
+    def get_team(self, player: int) -> int | None:
+        """Return player's team or None if the player is not in the replay"""
+        return self.player_index.teams.get(player)
+
+    def get_details(self, player: int) -> ReplayDetail | None:
+        """Return player's details or None if not available"""
+        return self.player_index.players.get(player)
+
     def get_enemies(self, player: int | None = None) -> list[int]:
-        if player is None or (player in self.data.summary.allies):
+        index: PlayerIndex[ReplayDetail] = self.player_index
+        if player is None or (team := index.teams.get(player)) == index.ally_team:
             return self.data.summary.enemies
-        elif player in self.data.summary.enemies:
+        elif team is not None:
             return self.data.summary.allies
         else:
             raise ValueError(f"account_id {player} not found in replay")
 
     def get_allies(self, player: int | None = None) -> list[int]:
-        if player is None or (player in self.data.summary.allies):
+        index: PlayerIndex[ReplayDetail] = self.player_index
+        if player is None or (team := index.teams.get(player)) == index.ally_team:
             return self.data.summary.allies
-        elif player in self.data.summary.enemies:
+        elif team is not None:
             return self.data.summary.enemies
         else:
             raise ValueError(f"player {player} not found in replay")
@@ -1319,48 +1433,44 @@ class ReplayJSON(WoTinspectorAPI):
     def get_platoons(
         self, player: int | None = None
     ) -> Tuple[defaultdict[int, list[int]], defaultdict[int, list[int]]]:
+        """
+        Return allied and enemy platoons of the player (or the protagonist):
+        squad_index -> account_ids. The account_id lists must not be modified
+        """
         if not isinstance(self.data.summary.details, list):
             raise ValueError(
                 "replay JSON is summary format: cannot get platoons w/o full details"
             )
-        allied_platoons: defaultdict[int, list[int]] = defaultdict(list)
-        enemy_platoons: defaultdict[int, list[int]] = defaultdict(list)
-
-        allies = self.get_allies(player)
-
-        for d in self.data.summary.details:
-            if d.squad_index is not None and d.squad_index > 0:
-                account_id = d.dbid
-                if account_id in allies:
-                    allied_platoons[d.squad_index].append(account_id)
-                else:
-                    enemy_platoons[d.squad_index].append(account_id)
-
-        return allied_platoons, enemy_platoons
+        allied, enemy = self.player_index.get_platoons(player)
+        return defaultdict(list, allied), defaultdict(list, enemy)
 
     def get_battle_result(self, player: int | None = None) -> EnumBattleResult:
         try:
-            if self.data.summary.battle_result == EnumBattleResult.incomplete:
+            summary: ReplaySummary = self.data.summary
+            if summary.battle_result == EnumBattleResult.incomplete:
                 return EnumBattleResult.incomplete
 
-            elif player is not None and player in self.get_enemies():
-                if self.data.summary.battle_result == EnumBattleResult.win:
+            index: PlayerIndex[ReplayDetail] = self.player_index
+            team: int | None = (
+                index.ally_team if player is None else index.teams.get(player)
+            )
+            if team is None:
+                debug(f"player ({str(player)}) not in the battle")
+                return EnumBattleResult.incomplete
+            elif team != index.ally_team:
+                if summary.battle_result == EnumBattleResult.win:
                     return EnumBattleResult.loss
-                elif self.data.summary.winner_team == EnumWinnerTeam.draw:
+                elif summary.winner_team == EnumWinnerTeam.draw:
                     return EnumBattleResult.draw
                 else:
                     return EnumBattleResult.win
-
-            elif player is None or player in self.get_allies():
-                if self.data.summary.battle_result == EnumBattleResult.win:
+            else:
+                if summary.battle_result == EnumBattleResult.win:
                     return EnumBattleResult.win
-                elif self.data.summary.winner_team == EnumWinnerTeam.draw:
+                elif summary.winner_team == EnumWinnerTeam.draw:
                     return EnumBattleResult.draw
                 else:
                     return EnumBattleResult.loss
-            else:
-                debug(f"player ({str(player)}) not in the battle")
-                return EnumBattleResult.incomplete
         except Exception:
             raise Exception("Error reading replay")
 
@@ -1492,6 +1602,27 @@ class WoTInspectorAPIReplays(JSONExportable):
 # replays.wotinspector.com
 ## -----------------------------------------------------------
 
+B64_CHUNK_SIZE: int = 3 * 2**14  # multiple of 3 to base64 encode in chunks
+
+
+async def _b64_urlencoded(
+    name: str, filename: str, stream: BinaryIO, chunk_size: int = B64_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Yield an 'application/x-www-form-urlencoded' body with the file base64 encoded
+    in chunks. Equal to urlencode({name: (filename, b64encode(data))}, doseq=True)
+    """
+    yield urlencode([(name, filename), (name, "")]).encode()
+    rest: bytes = b""
+    while chunk := await asyncio.to_thread(stream.read, chunk_size):
+        if rest:
+            chunk = rest + chunk
+        end: int = len(chunk) - len(chunk) % 3
+        rest = chunk[end:]
+        yield quote_plus(b64encode(chunk[:end])).encode()
+    if rest:
+        yield quote_plus(b64encode(rest)).encode()
+
 
 class WoTinspector:
     URL_WI: str = "https://replays.wotinspector.com"
@@ -1563,16 +1694,21 @@ class WoTinspector:
         fetch_json: bool = False,
         title: str | None = None,
         priv: bool = False,
+        replay_index: ReplayIndex | None = None,
         # N: int = -1,
     ) -> tuple[str | None, ReplayJSON | None]:
         """
         Post a WoT Blitz replay file to replays.WoTinspector.com
 
+        If 'replay_index' is given, replays already uploaded are not posted again
+        and the upload is recorded to the index. The replay file is streamed
+        to the upload and base64 encoded in chunks instead of in memory.
+
         Returns ID of the replay
         """
         filename: str = ""
         try:
-            replay_file: ReplayFile = ReplayFile(replay=replay)
+            replay_file: ReplayFile = ReplayFile(replay=replay, keep_data=False)
             if isinstance(replay, bytes):
                 filename = replay_file.hash + ".wotbreplay"
             else:
@@ -1581,6 +1717,15 @@ class WoTinspector:
                     raise ValueError("error reading reaply file path")
                 filename = replay_file.path.name
 
+            upload: ReplayUpload | None = None
+            if replay_index is not None:
+                upload = await replay_index.get_upload(replay_file, WIApi.v1)
+            if upload is not None:
+                verbose(f"replay has been uploaded already: {upload.replay_id}")
+                if upload.response is None:
+                    return upload.replay_id, None
+                return upload.replay_id, ReplayJSON.parse_str(upload.response)
+
             try:
                 if tankopedia is not None and maps is not None:
                     replay_file.meta.update_title(tankopedia=tankopedia, maps=maps)
@@ -1612,8 +1757,6 @@ class WoTinspector:
                 url = self.URL_REPLAY_UL
             url = f"{url}&" + urlencode(params, quote_via=quote)
             headers = {"Content-type": "application/x-www-form-urlencoded"}
-            # Hack to fool aiohttp.FormData to send the data as application/x-www-form-urlencoded
-            payload = {"file": (filename, b64encode(replay_file.data))}
         except BadZipFile:
             error(f"corrupted replay file: {filename}")
             return None, None
@@ -1624,11 +1767,16 @@ class WoTinspector:
         #     error(f"Thread {N}: Unexpected Exception: {err}")
         #     return None, None
         try:
-            if (
-                res := await post_url(
-                    self.session, url=url, headers=headers, data=payload, retries=1
+            # the replay is streamed from the file and base64 encoded in chunks
+            with replay_file.stream() as replay_data:
+                res = await post_url(
+                    self.session,
+                    url=url,
+                    headers=headers,
+                    data=_b64_urlencoded("file", filename, replay_data),
+                    retries=1,
                 )
-            ) is not None:
+            if res is not None:
                 debug("response from %s: %s", url, res)
                 if (api_json := WoTinspectorAPI.parse_str(res)) is None:
                     error(f"Could not parse API response: {api_json}")
@@ -1637,12 +1785,21 @@ class WoTinspector:
                     error(f"could not parse the JSON response: {res}")
                     return None, None
                 else:
+                    if replay_index is not None:
+                        await replay_index.add(
+                            replay_file,
+                            WIApi.v1,
+                            replay_id=replay_file.hash,
+                            response=replay_json.model_dump_json(by_alias=True),
+                        )
                     return replay_file.hash, replay_json
         except Exception as err:
             error(f"Unexpected Error: {type(err)}: {err}")
             return None, None
 
         debug(f"Could not post replay: {title}: {res}")
+        if replay_index is not None:
+            await replay_index.add(replay_file, WIApi.v1, status=UploadStatus.failed)
         return None, None
 
     # async def post_replays(
@@ -4,21 +4,33 @@
 
 from __future__ import annotations
 
+import asyncio
+from collections import deque
 from enum import Enum, IntEnum
+from functools import cached_property
+from math import ceil
 from typing import (
     Any,
     AsyncIterable,
+    AsyncGenerator,
+    AsyncIterator,
+    Iterable,
     ClassVar,
+    Deque,
     Mapping,
+    NamedTuple,
     Optional,
     Sequence,
     Self,
+    Set,
+    Tuple,
     Type,
     List,
     Dict,
 )
-from datetime import datetime
+from datetime import datetime, timezone
 from types import TracebackType
+from contextlib import aclosing
 from aiohttp import FormData
 from pydantic import (
     AnyUrl,
@@ -28,9 +40,11 @@ from pydantic import (
     # field_serializer,
     model_validator,
 )
-from zipfile import BadZipFile
+from zipfile import BadZipFile, ZipFile
+from io import BytesIO
 from pathlib import Path
 
+import pyarrow  # type: ignore
 from pyutils import ThrottledClientSession
 from pyutils.utils import post_url
 from pydantic_exportables import (
@@ -45,11 +59,27 @@ from pydantic_exportables.utils import get_model
 
 import logging
 
-from .wi_apiv1 import ReplayDetail, EnumWinnerTeam, EnumBattleResult
+from .wi_apiv1 import (
+    PlayerIndex,
+    ReplayDetail,
+    ReplayJSON,
+    ReplaySummary as ReplaySummaryV1,
+    EnumWinnerTeam,
+    EnumBattleResult,
+)
+from .battle_results import BattleResults
 
 from ..wg_api import WGApiWoTBlitzTankopedia
 from ..map import Maps
-from ..replay import ReplayFile
+from ..replay import DEFAULT_WORKERS, ReplayFile, ReplayFileMeta, map_executor
+from ..replay_index import (
+    QueueStatus,
+    ReplayIndex,
+    ReplayUpload,
+    UploadQueue,
+    UploadStatus,
+    WIApi,
+)
 
 
 # Setup logging
@@ -290,21 +320,63 @@ class PlayerData(JSONExportable):
     def from_ReplayDetail(cls, replay_detail: ReplayDetail) -> Self | None:
         """convert V1 ReplayDetail to V2 PlayerData"""
         try:
+            keys: Dict[str, str] = _V1_DETAIL_KEYS[False, False]
             d: dict[str, Any] = replay_detail.model_dump()
-
-            # dbid field
-            d["id"] = d["ai"]
-            del d["ai"]
-
-            # time_alive
-            d["ta"] = d["t"]
-            del d["t"]
-
-            return cls.model_validate(d)
-        except KeyError as err:
+            return cls.model_validate({keys.get(k, k): v for k, v in d.items()})
+        except ValueError as err:
             error(f"{err}")
         return None
 
+    @classmethod
+    def arrow_schema(cls) -> pyarrow.schema:
+        return pyarrow.schema(
+            [
+                ("dbid", pyarrow.int64()),
+                ("team", pyarrow.int8()),
+                ("name", pyarrow.string()),
+                ("clanid", pyarrow.int64()),
+                ("clan_tag", pyarrow.string()),
+                ("squad_index", pyarrow.int8()),
+                ("entity_id", pyarrow.int64()),
+                ("vehicle_descr", pyarrow.int32()),
+                ("chassis_id", pyarrow.int32()),
+                ("turret_id", pyarrow.int32()),
+                ("gun_id", pyarrow.int32()),
+                ("hitpoints_left", pyarrow.int32()),
+                ("time_alive", pyarrow.int32()),
+                ("death_reason", pyarrow.int16()),
+                ("killed_by", pyarrow.int64()),
+                ("credits", pyarrow.int32()),
+                ("exp", pyarrow.int32()),
+                ("exp_for_assist", pyarrow.int32()),
+                ("exp_for_damage", pyarrow.int32()),
+                ("exp_team_bonus", pyarrow.int32()),
+                ("hero_bonus_credits", pyarrow.int32()),
+                ("hero_bonus_exp", pyarrow.int32()),
+                ("shots_made", pyarrow.int32()),
+                ("shots_hit", pyarrow.int32()),
+                ("shots_pen", pyarrow.int32()),
+                ("shots_splash", pyarrow.int32()),
+                ("damage_made", pyarrow.int32()),
+                ("damage_received", pyarrow.int32()),
+                ("damage_assisted", pyarrow.int32()),
+                ("damage_assisted_track", pyarrow.int32()),
+                ("damage_blocked", pyarrow.int32()),
+                ("hits_received", pyarrow.int32()),
+                ("hits_bounced", pyarrow.int32()),
+                ("hits_pen", pyarrow.int32()),
+                ("hits_splash", pyarrow.int32()),
+                ("enemies_spotted", pyarrow.int32()),
+                ("enemies_damaged", pyarrow.int32()),
+                ("enemies_destroyed", pyarrow.int32()),
+                ("distance_travelled", pyarrow.int32()),
+                ("base_capture_points", pyarrow.int32()),
+                ("base_defend_points", pyarrow.int32()),
+                ("wp_points_earned", pyarrow.int32()),
+                ("wp_points_stolen", pyarrow.int32()),
+            ]
+        )
+
 
 class Product(JSONExportable):
     model_config = ConfigDict(
@@ -483,11 +555,117 @@ class Replay(JSONExportable):
             self.battle_result = EnumBattleResult.draw
         return self
 
+    @model_validator(mode="after")
+    def _reset_indexes(self) -> Self:
+        self.__dict__.pop("player_index", None)
+        return self
+
+    def model_copy(
+        self, *, update: Mapping[str, Any] | None = None, deep: bool = False
+    ) -> Self:
+        """Copy the replay. player_index is rebuilt for the copy"""
+        res: Self = super().model_copy(update=update, deep=deep)
+        res.__dict__.pop("player_index", None)
+        return res
+
     # @property
     # def has_full_details(self) -> bool:
     #     """Whether the replay has full details or is summary version"""
     #     return isinstance(self.player_data, list)
 
+    @cached_property
+    def player_index(self) -> PlayerIndex[PlayerData]:
+        """
+        Per-replay indexes of teams, players_data and platoons. Built on first
+        use and rebuilt when the replay is validated or copied. Teams of
+        players_data override teams derived from allies and enemies.
+
+        Modifying fields in place, e.g. players_data.append(), does not update
+        the index: use 'del replay.player_index' to rebuild it
+        """
+        return PlayerIndex.build(
+            self.protagonist_team,
+            self.allies,
+            self.enemies,
+            {player.dbid: player for player in self.players_data},
+            (
+                (player.dbid, player.team, player.squad_index)
+                for player in self.players_data
+            ),
+        )
+
+    @property
+    def ally_team(self) -> int:
+        """Team of the protagonist. 1 if protagonist_team is not known"""
+        return self.player_index.ally_team
+
+    def get_team(self, player: int) -> int | None:
+        """Return player's team or None if the player is not in the replay"""
+        return self.player_index.teams.get(player)
+
+    def get_player_data(self, player: int) -> PlayerData | None:
+        """Return player's PlayerData or None if not available"""
+        return self.player_index.players.get(player)
+
+    def get_enemies(self, player: int | None = None) -> List[int]:
+        index: PlayerIndex[PlayerData] = self.player_index
+        if player is None or (team := index.teams.get(player)) == index.ally_team:
+            return self.enemies
+        elif team is not None:
+            return self.allies
+        else:
+            raise ValueError(f"player {player} not found in replay")
+
+    def get_allies(self, player: int | None = None) -> List[int]:
+        index: PlayerIndex[PlayerData] = self.player_index
+        if player is None or (team := index.teams.get(player)) == index.ally_team:
+            return self.allies
+        elif team is not None:
+            return self.enemies
+        else:
+            raise ValueError(f"player {player} not found in replay")
+
+    def get_players(self) -> List[int]:
+        return self.get_enemies() + self.get_allies()
+
+    def get_platoons(
+        self, player: int | None = None
+    ) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+        """
+        Return allied and enemy platoons of the player (or the protagonist):
+        squad_index -> dbids. The dbid lists must not be modified
+        """
+        return self.player_index.get_platoons(player)
+
+    def get_battle_result(self, player: int | None = None) -> EnumBattleResult:
+        """Return battle result of the player (or the protagonist)"""
+        if (
+            self.battle_result is None
+            or self.battle_result == EnumBattleResult.incomplete
+        ):
+            return EnumBattleResult.incomplete
+        index: PlayerIndex[PlayerData] = self.player_index
+        team: int | None = (
+            index.ally_team if player is None else index.teams.get(player)
+        )
+        if team is None:
+            debug(f"player ({str(player)}) not in the battle")
+            return EnumBattleResult.incomplete
+        elif self.winner_team == EnumWinnerTeam.draw:
+            return EnumBattleResult.draw
+        elif team == index.ally_team:
+            return (
+                EnumBattleResult.win
+                if self.battle_result == EnumBattleResult.win
+                else EnumBattleResult.loss
+            )
+        else:
+            return (
+                EnumBattleResult.loss
+                if self.battle_result == EnumBattleResult.win
+                else EnumBattleResult.win
+            )
+
     _example = """
     {
   "id": "4e82956ce42fd8090a70d02a886a18be",
@@ -707,6 +885,267 @@ class Replay(JSONExportable):
         )
         return indexes
 
+    @classmethod
+    def arrow_schema(cls) -> pyarrow.schema:
+        """
+        Schema of replay columns for exporting players_data. 'version' is
+        game_version's 'name'
+        """
+        return pyarrow.schema(
+            [
+                ("id", pyarrow.string()),
+                ("arena_unique_id", pyarrow.int64()),
+                ("battle_start_time", pyarrow.timestamp("ms", tz="UTC")),
+                ("battle_duration", pyarrow.float32()),
+                ("map_id", pyarrow.int32()),
+                ("battle_type", pyarrow.int16()),
+                ("room_type", pyarrow.int16()),
+                ("version", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+                ("protagonist", pyarrow.int64()),
+                ("protagonist_team", pyarrow.int8()),
+                ("winner_team", pyarrow.int8()),
+                ("battle_result", pyarrow.int8()),
+                ("finish_reason", pyarrow.int16()),
+            ]
+        )
+
+    @classmethod
+    def from_ReplayFile(cls, replay_file: ReplayFile) -> Self | None:
+        """
+        Create Replay offline from a replay file by decoding its battle_results.dat.
+        Fields only available from WoTinspector.com are left to their defaults.
+        The replay file has to be opened (meta_only=True is enough). Blocking
+        """
+        try:
+            results = BattleResults(replay_file.read_battle_results())
+            meta: ReplayFileMeta = replay_file.meta
+            d: dict[str, Any] = results.replay
+            d["id"] = replay_file.hash
+            d["title"] = meta.title if meta.title != "" else None
+            d["player_name"] = meta.playerName
+            d["battle_duration"] = meta.battleDuration
+            d["battle_start_time"] = meta.battleStartTime
+            d["vehicle_descr"] = meta.vehicleCompDescriptor
+            d["camouflage_id"] = meta.camouflageId
+            d.setdefault("map_id", meta.mapId)
+            d.setdefault("protagonist", meta.dbid)
+            players_data: list[PlayerData] = list()
+            for player_data in results.players_data:
+                # not in battle_results.dat: null in WoTinspector.com data,
+                # validated to 0. Set it so that the replay re-imports equal
+                player_data.setdefault("gun_id", None)
+                if player_data.get("dbid") == d["protagonist"]:
+                    d["damage_assisted"] = player_data.get(
+                        "damage_assisted", 0
+                    ) + player_data.get("damage_assisted_track", 0)
+                players_data.append(PlayerData.model_validate(player_data))
+            d["players_data"] = players_data
+            return cls.model_validate(d)
+        except (BadZipFile, KeyError, ValueError) as err:
+            error(f"could not decode replay {replay_file.path}: {err}")
+        return None
+
+    @classmethod
+    def from_ReplayJSON(cls, replay_json: ReplayJSON) -> Self | None:
+        """Convert V1 ReplayJSON to V2 Replay. See convert_ReplayJSON()"""
+        try:
+            return cls.model_validate(
+                convert_ReplayJSON(replay_json.model_dump(mode="json"))
+            )
+        except (KeyError, ValueError) as err:
+            error(f"could not convert replay {replay_json.get_id()}: {err}")
+        return None
+
+    @classmethod
+    async def open_many(
+        cls,
+        replays: Iterable[Path | str],
+        workers: int = DEFAULT_WORKERS,
+        processes: bool = True,
+        ordered: bool = False,
+    ) -> AsyncIterator[Self]:
+        """
+        Decode replay files offline in a process pool (or a thread pool
+        if processes=False) and yield Replays. See ReplayFile.open_many().
+        Replays that fail to decode are logged and skipped
+        """
+        async with aclosing(
+            map_executor(
+                _read_replay,
+                replays,
+                cls,
+                workers=workers,
+                processes=processes,
+                ordered=ordered,
+            )
+        ) as results:
+            async for replay in results:
+                if replay is not None:
+                    yield replay
+
+
+def _read_replay(replay: Path | str, model: type[Replay]) -> Replay | None:
+    """Decode replay file in a worker thread/process"""
+    replay_file = ReplayFile(replay, keep_data=False)
+    replay_file._read(meta_only=True)
+    return model.from_ReplayFile(replay_file)
+
+
+###########################################
+#
+# V1 ReplayJSON -> V2 Replay conversion
+#
+###########################################
+
+KeyMap = Dict[Tuple[bool, bool], Dict[str, str]]
+
+
+def _key_map(
+    src: Type[JSONExportable], dst: Type[JSONExportable], fields: Mapping[str, str]
+) -> KeyMap:
+    """
+    Map src field keys to dst field keys for (src by_alias, dst by_alias).
+    Fields not in dst are kept by name
+    """
+
+    def key(model: Type[JSONExportable], name: str, by_alias: bool) -> str:
+        if by_alias and (field := model.model_fields.get(name)) is not None:
+            return field.alias or name
+        return name
+
+    return {
+        (src_alias, dst_alias): {
+            key(src, s, src_alias): key(dst, d, dst_alias) for s, d in fields.items()
+        }
+        for src_alias in (False, True)
+        for dst_alias in (False, True)
+    }
+
+
+# V1 ReplaySummary fields not copied as is: 'battle_start_time' duplicates
+# 'battle_start_timestamp' and 'details' are converted to players_data
+_V1_SUMMARY_SKIP: Set[str] = {"battle_start_time", "details"}
+_V1_SUMMARY_SKIP_KEYS: Dict[bool, Set[str]] = {
+    by_alias: {
+        (ReplaySummaryV1.model_fields[name].alias or name) if by_alias else name
+        for name in _V1_SUMMARY_SKIP
+    }
+    for by_alias in (False, True)
+}
+_V1_SUMMARY_KEYS: KeyMap = _key_map(
+    ReplaySummaryV1,
+    Replay,
+    {
+        name: "battle_start_time" if name == "battle_start_timestamp" else name
+        for name in ReplaySummaryV1.model_fields
+        if name not in _V1_SUMMARY_SKIP
+    },
+)
+_V1_DETAIL_KEYS: KeyMap = _key_map(
+    ReplayDetail, PlayerData, {name: name for name in ReplayDetail.model_fields}
+)
+_REPLAY_KEYS: Dict[bool, Dict[str, str]] = {
+    by_alias: {
+        name: (field.alias or name) if by_alias else name
+        for name, field in Replay.model_fields.items()
+    }
+    for by_alias in (False, True)
+}
+_PLAYER_KEYS: Dict[bool, Dict[str, str]] = {
+    by_alias: {
+        name: (field.alias or name) if by_alias else name
+        for name, field in PlayerData.model_fields.items()
+    }
+    for by_alias in (False, True)
+}
+
+
+def convert_ReplayJSON(
+    replay: Mapping[str, Any], by_alias: bool = False
+) -> Dict[str, Any]:
+    """
+    Convert a V1 ReplayJSON document (a dict keyed by field names or aliases)
+    to a V2 Replay document without model validation. The V1 summary fields
+    without V2 counterpart (map_name, vehicle, etc.) are kept as extra fields.
+
+    Raises KeyError or ValueError if the document is not a valid ReplayJSON
+    """
+    alias_in: bool = "d" in replay
+    data: Mapping[str, Any] = replay["d" if alias_in else "data"]
+    summary: Mapping[str, Any] = data["s" if alias_in else "summary"]
+    keys: Dict[str, str] = _V1_SUMMARY_KEYS[alias_in, by_alias]
+    skip: Set[str] = _V1_SUMMARY_SKIP_KEYS[alias_in]
+    out: Dict[str, str] = _REPLAY_KEYS[by_alias]
+    view_url: str | None = data.get("v" if alias_in else "view_url")
+    download_url: str | None = data.get("d" if alias_in else "download_url")
+
+    res: Dict[str, Any] = {
+        keys.get(k, k): v for k, v in summary.items() if k not in skip
+    }
+    id: str | None = (
+        replay.get("_id" if alias_in else "id")
+        or data.get("_id" if alias_in else "id")
+        or (view_url or download_url or "").rstrip("/").split("/")[-1]
+    )
+    if not id:
+        raise ValueError("replay id is missing")
+    res[out["id"]] = id
+    res[out["details_url"]] = view_url
+    res[out["download_url"]] = download_url
+
+    bts: str = out["battle_start_time"]
+    if isinstance(res.get(bts), (int, float)):
+        res[bts] = datetime.fromtimestamp(res[bts], timezone.utc).isoformat()
+    aid: str = out["arena_unique_id"]
+    if res.get(aid) is not None:
+        res[aid] = str(res[aid])
+    if (
+        res.get(out["battle_result"]) == EnumBattleResult.loss
+        and res.get(out["winner_team"]) == EnumWinnerTeam.draw
+    ):
+        res[out["battle_result"]] = EnumBattleResult.draw.value
+
+    details: Any = summary.get("d" if alias_in else "details") or []
+    if not isinstance(details, list):
+        details = [details]  # summary format: protagonist's details only
+    player_keys: Dict[str, str] = _V1_DETAIL_KEYS[
+        "ai" in details[0] if details else False, by_alias
+    ]
+    players: List[Dict[str, Any]] = [
+        {player_keys.get(k, k): v for k, v in detail.items()} for detail in details
+    ]
+    res[out["players_data"]] = players
+
+    # V1 details have no 'team'
+    p: Dict[str, str] = _PLAYER_KEYS[by_alias]
+    protagonist_team: int | None = res.get(out["protagonist_team"])
+    if protagonist_team in (1, 2):
+        allies: Set[int] = set(res.get(out["allies"]) or [])
+        for player in players:
+            player[p["team"]] = (
+                protagonist_team
+                if player.get(p["dbid"]) in allies
+                else 3 - protagonist_team
+            )
+
+    # protagonist's stats
+    protagonist: int | None = res.get(out["protagonist"])
+    for player in players:
+        if player.get(p["dbid"]) == protagonist:
+            for field in [
+                "vehicle_descr",
+                "enemies_spotted",
+                "enemies_destroyed",
+                "damage_made",
+            ]:
+                res[out[field]] = player.get(p[field])
+            res[out["damage_assisted"]] = (player.get(p["damage_assisted"]) or 0) + (
+                player.get(p["damage_assisted_track"]) or 0
+            )
+            res[out["protagonist_clan"]] = player.get(p["clanid"])
+            break
+    return res
+
 
 class ReplaySummary(JSONExportable):
     model_config = ConfigDict(
@@ -781,6 +1220,25 @@ class Shot(JSONExportable):
     nominal_damage: int
     damage: int
 
+    @classmethod
+    def arrow_schema(cls) -> pyarrow.schema:
+        return pyarrow.schema(
+            [
+                ("time", pyarrow.float32()),
+                ("shooter", pyarrow.int64()),
+                ("target", pyarrow.int64()),
+                ("has_damage", pyarrow.bool_()),
+                ("shell_id", pyarrow.int32()),
+                ("turret_yaw", pyarrow.float32()),
+                ("gun_pitch", pyarrow.float32()),
+                ("segment", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+                ("distance", pyarrow.float32()),
+                ("nominal_pen", pyarrow.int32()),
+                ("nominal_damage", pyarrow.int32()),
+                ("damage", pyarrow.int32()),
+            ]
+        )
+
 
 class BattleDetails(JSONExportable):
     model_config = ConfigDict(
@@ -847,6 +1305,30 @@ class PaginatedReplayList(JSONExportable):
     results: Optional[List[ReplaySummary]] = None
 
 
+class ReplayPostResult(NamedTuple):
+    """
+    Result of posting a replay with WoTinspector.post_replays(). 'duplicate'
+    is True if the replay was found in the replay index and not posted again:
+    'result' is then the indexed response or None if it was not stored
+    """
+
+    replay: Path | str | bytes
+    result: Replay | None
+    error: str | None = None
+    duplicate: bool = False
+
+
+def _open_replay_file(replay: Path | str | bytes) -> ReplayFile:
+    """Open replay file and read its meta for posting. Blocking"""
+    replay_file = ReplayFile(replay, keep_data=False)
+    if isinstance(replay, bytes):
+        with ZipFile(BytesIO(replay)) as zreplay:
+            replay_file._read_meta(zreplay)
+    else:
+        replay_file._read()
+    return replay_file
+
+
 class WoTinspector:
     """WoTinspector.com API v2 client"""
 
@@ -905,97 +1387,212 @@ class WoTinspector:
             resp_model=Replay,
         )
 
-    async def get_replay_list(
+    async def get_replay_page(
         self, page: int = 1, **kwargs
-    ) -> List[ReplaySummary] | None:
-        """Get list of replays"""
+    ) -> PaginatedReplayList | None:
+        """Get a page of the replay list"""
         debug(
             "starting: page=%d, %s",
             page,
             ", ".join([f"{k}={v}" for k, v in kwargs.items()]),
         )
+        return await get_model(
+            self.session,
+            url=self.get_url_replay_list(page=page, **kwargs),
+            resp_model=PaginatedReplayList,
+        )
+
+    async def get_replay_list(
+        self, page: int = 1, **kwargs
+    ) -> List[ReplaySummary] | None:
+        """Get list of replays"""
         paginated_list: PaginatedReplayList | None
-        if (
-            paginated_list := await get_model(
-                self.session,
-                url=self.get_url_replay_list(page=page, **kwargs),
-                resp_model=PaginatedReplayList,
-            )
-        ) is not None:
+        if (paginated_list := await self.get_replay_page(page, **kwargs)) is not None:
             return paginated_list.results
         message("could not retrieve valid replay list")
         return None
 
     class AsyncReplayIterable(AsyncIterable[ReplaySummary]):
-        """Async iterable ovar API v2' replays list"""
+        """
+        Async iterable over API v2's replay list.
+
+        Up to 'prefetch' pages are requested ahead of the page being iterated
+        over. The session's rate limit throttles the requests. Replays are
+        returned in the list order and the iteration stops at the last page.
+        'cursor' is the (page, offset) of the next replay and the iteration can
+        be resumed from it with list_replays(page=page, offset=offset).
+        """
 
         def __init__(
-            self, wi: WoTinspector, page: int = 1, max_pages: int = 10, **filter_args
+            self,
+            wi: WoTinspector,
+            page: int = 1,
+            max_pages: int = 10,
+            prefetch: int = 0,
+            offset: int = 0,
+            **filter_args,
         ) -> None:
             super().__init__()
             self._filter_args: Dict[str, Any] = filter_args
             self._wi: WoTinspector = wi
             self._replay_list: List[ReplaySummary] | None = None
-            self._index: int = -1  # must be -1 to work during the first time
+            self._last: bool = False
+            self._closed: bool = False
+            self._index: int = offset
             self._page: int = page
-            self._max_pages: int = max_pages
+            # pages [_page, _end) are listed, max_pages < 0 lists all pages
+            self._end: int = page + max_pages if max_pages >= 0 else -1
+            self._prefetch: int = max(prefetch, 0)
+            self._pages: Deque[asyncio.Task[PaginatedReplayList | None]] = deque()
+            self._requested: int = page
 
         def __aiter__(self) -> Self:
             return self
 
         async def __anext__(self) -> ReplaySummary:
-            self._index += 1
-            if self._replay_list is None or self._index == len(self._replay_list):
-                replay_list: List[ReplaySummary] | None
+            while not self._closed:
+                if self._replay_list is not None:
+                    if self._index < len(self._replay_list):
+                        self._index += 1
+                        return self._replay_list[self._index - 1]
+                    if self._last:
+                        break
+                    self._replay_list = None
+                    self._page += 1
+                    self._index = 0
+                paginated_list: PaginatedReplayList | None
                 if (
-                    self._max_pages == 0
-                    or (
-                        replay_list := await self._wi.get_replay_list(
-                            page=self._page, **self._filter_args
-                        )
-                    )
-                    is None
-                ):
-                    raise StopAsyncIteration
-                self._replay_list = replay_list
-                self._page += 1
-                self._max_pages -= 1
-                self._index = -1
-            if self._replay_list is not None and self._index < len(self._replay_list):
-                return self._replay_list[self._index]
+                    paginated_list := await self._get_page()
+                ) is None or paginated_list.results is None:
+                    break
+                self._replay_list = paginated_list.results
+                self._last = paginated_list.next is None
+                self._set_end(paginated_list)
+            await self.aclose()
             raise StopAsyncIteration
 
+        @property
+        def cursor(self) -> tuple[int, int]:
+            """(page, offset) of the next replay"""
+            if (
+                self._replay_list is not None
+                and not self._last
+                and self._index >= len(self._replay_list)
+            ):
+                return self._page + 1, 0
+            return self._page, self._index
+
+        @property
+        def completed(self) -> bool:
+            """True if the replays have been listed until the last page"""
+            return (
+                self._last
+                and self._replay_list is not None
+                and self._index >= len(self._replay_list)
+            )
+
+        def _listed(self, page: int) -> bool:
+            return self._end < 0 or page < self._end
+
+        async def _get_page(self) -> PaginatedReplayList | None:
+            """Get the current page and request up to 'prefetch' pages ahead"""
+            if not self._listed(self._page):
+                return None
+            while len(self._pages) <= self._prefetch and self._listed(self._requested):
+                self._pages.append(
+                    asyncio.create_task(
+                        self._wi.get_replay_page(self._requested, **self._filter_args)
+                    )
+                )
+                self._requested += 1
+            return await self._pages.popleft()
+
+        def _set_end(self, paginated_list: PaginatedReplayList) -> None:
+            """Stop prefetching past the last page if the replay count is known"""
+            count: Any = (paginated_list.model_extra or {}).get("count")
+            if self._last:
+                end: int = self._page + 1
+            elif isinstance(count, int) and paginated_list.results:
+                end = ceil(count / len(paginated_list.results)) + 1
+            else:
+                return
+            if self._listed(end):
+                self._end = end
+            while self._pages and not self._listed(self._requested - 1):
+                self._pages.pop().cancel()
+                self._requested -= 1
+
+        async def aclose(self) -> None:
+            """Stop the iteration and cancel prefetched page requests"""
+            self._closed = True
+            for task in self._pages:
+                task.cancel()
+            await asyncio.gather(*self._pages, return_exceptions=True)
+            self._pages.clear()
+
     def list_replays(
-        self, page: int = 1, max_pages: int = 10, **filter_args
+        self,
+        page: int = 1,
+        max_pages: int = 10,
+        prefetch: int = 0,
+        offset: int = 0,
+        **filter_args,
     ) -> AsyncReplayIterable:
+        """
+        List replays matching 'filter_args' starting from 'page' and 'offset'.
+        See AsyncReplayIterable
+        """
         return WoTinspector.AsyncReplayIterable(
-            self, page=page, max_pages=max_pages, **filter_args
+            self,
+            page=page,
+            max_pages=max_pages,
+            prefetch=prefetch,
+            offset=offset,
+            **filter_args,
         )
 
     async def post_replay(
         self,
-        replay: Path | str | bytes,
+        replay: Path | str | bytes | ReplayFile,
         title: str | None = None,
         priv: bool = False,
         tankopedia: WGApiWoTBlitzTankopedia | None = None,  # to auto-title
         maps: Maps | None = None,  # to auto-title
+        replay_index: ReplayIndex | None = None,
     ) -> Replay | None:
         """
         Post a WoT Blitz replay file to api.WoTinspector.com using API v2
 
+        'replay' can be given as an opened ReplayFile too. If 'replay_index'
+        is given, replays already uploaded are not posted again and the upload
+        is recorded to the index. Replay files are streamed to the upload
+        instead of reading them into memory.
+
         Returns 'Replay' model
         """
         filename: str = ""
         try:
-            replay_file: ReplayFile = ReplayFile(replay=replay)
-            if isinstance(replay, bytes):
+            replay_file: ReplayFile
+            if isinstance(replay, ReplayFile):
+                replay_file = replay
+            else:
+                replay_file = ReplayFile(replay=replay, keep_data=False)
+            if replay_file.path is None:
                 filename = replay_file.hash + ".wotbreplay"
             else:
-                await replay_file.open()
-                if replay_file.path is None:
-                    raise ValueError("error reading reaply file path")
+                if not replay_file.is_opened:
+                    await replay_file.open()
                 filename = replay_file.path.name
 
+            upload: ReplayUpload | None = None
+            if replay_index is not None:
+                upload = await replay_index.get_upload(replay_file, WIApi.v2)
+            if upload is not None:
+                verbose(f"replay has been uploaded already: {upload.replay_id}")
+                if upload.response is None:
+                    return None
+                return Replay.parse_str(upload.response)
+
             try:
                 if tankopedia is not None and maps is not None:
                     replay_file.meta.update_title(tankopedia=tankopedia, maps=maps)
@@ -1013,9 +1610,6 @@ class WoTinspector:
             data = FormData()
             data.add_field(name="title", value=title)
             data.add_field(name="private", value=str(priv))
-            data.add_field(
-                name="upload_file", value=replay_file.data, filename=filename
-            )
 
         except BadZipFile:
             error(f"corrupted replay file: {filename}")
@@ -1025,19 +1619,145 @@ class WoTinspector:
             return None
 
         try:
-            if (
-                res := await post_url(
+            # the replay is streamed from the file into the multipart body
+            with replay_file.stream() as replay_data:
+                data.add_field(name="upload_file", value=replay_data, filename=filename)
+                res = await post_url(
                     self.session,
                     url=self.URL_REPLAYS,
                     # headers=headers,
                     data=data,
                     retries=1,
                 )
-            ) is None:
+            if res is None:
                 error("received NULL response")
             else:
                 debug("response from %s: %s", self.URL_REPLAYS, res)
-                return Replay.parse_str(res)
+                if (replay_v2 := Replay.parse_str(res)) is not None:
+                    if replay_index is not None:
+                        await replay_index.add(
+                            replay_file, WIApi.v2, replay_id=replay_v2.id, response=res
+                        )
+                    return replay_v2
         except Exception as err:
             error(f"Unexpected Error: {type(err)}: {err}")
+        if replay_index is not None:
+            await replay_index.add(replay_file, WIApi.v2, status=UploadStatus.failed)
         return None
+
+    async def post_replays(
+        self,
+        replays: Iterable[Path | str | bytes] | AsyncIterable[Path | str | bytes],
+        workers: int = DEFAULT_WORKERS,
+        upload_queue: UploadQueue | None = None,
+        retry_failed: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[ReplayPostResult]:
+        """
+        Post replays concurrently and yield ReplayPostResults as the uploads
+        complete. Replay files are opened in a thread pool and up to 'workers'
+        uploads are kept in flight. The session's rate limit throttles them.
+
+        If 'upload_queue' is given, replay files left pending by an earlier run
+        are posted first and the files already posted are skipped. Failed
+        uploads are retried only if retry_failed=True. Replays given as bytes
+        are not queued. Replays found in 'replay_index' are yielded as
+        duplicates. A failed upload does not stop the others: it is yielded
+        with the error.
+
+        Other keyword arguments are passed to post_replay()
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be > 0: {workers}")
+        pending: Set[asyncio.Task[ReplayPostResult]] = set()
+
+        async def is_queued(replay: Path | str | bytes, queued: Set[str]) -> bool:
+            """Queue replay file. Returns True if the replay should be posted"""
+            if upload_queue is None or isinstance(replay, bytes):
+                return True
+            if str(replay) in queued:
+                return False
+            status: QueueStatus | None = await upload_queue.status(replay)
+            if status is None:
+                await upload_queue.add([replay])
+                return True
+            return status == QueueStatus.pending or (
+                retry_failed and status == QueueStatus.failed
+            )
+
+        async def queued() -> AsyncGenerator[Path | str | bytes, None]:
+            resumed: Set[str] = set()
+            if upload_queue is not None:
+                for path in await upload_queue.pending(retry_failed=retry_failed):
+                    resumed.add(path)
+                    yield path
+            if isinstance(replays, AsyncIterable):
+                async for replay in replays:
+                    if await is_queued(replay, resumed):
+                        yield replay
+            else:
+                for replay in replays:
+                    if await is_queued(replay, resumed):
+                        yield replay
+
+        replay_index: ReplayIndex | None = kwargs.get("replay_index")
+
+        async def post(replay: Path | str | bytes) -> ReplayPostResult:
+            res: ReplayPostResult
+            replay_id: str | None = None
+            try:
+                replay_file = await asyncio.to_thread(_open_replay_file, replay)
+                upload: ReplayUpload | None = None
+                if replay_index is not None:
+                    upload = await replay_index.get_upload(replay_file, WIApi.v2)
+                if upload is not None:
+                    verbose(f"replay has been uploaded already: {upload.replay_id}")
+                    replay_id = upload.replay_id
+                    res = ReplayPostResult(
+                        replay,
+                        None
+                        if upload.response is None
+                        else Replay.parse_str(upload.response),
+                        duplicate=True,
+                    )
+                elif (result := await self.post_replay(replay_file, **kwargs)) is None:
+                    res = ReplayPostResult(replay, None, "upload failed")
+                else:
+                    replay_id = result.id
+                    res = ReplayPostResult(replay, result)
+            except (BadZipFile, KeyError, OSError, ValueError) as err:
+                res = ReplayPostResult(
+                    replay, None, f"could not open replay: {type(err).__name__}: {err}"
+                )
+            except Exception as err:
+                error(f"could not post replay {replay!r:.100}: {err}")
+                res = ReplayPostResult(
+                    replay, None, f"upload failed: {type(err).__name__}: {err}"
+                )
+            if upload_queue is not None and not isinstance(replay, bytes):
+                if res.result is None and not res.duplicate:
+                    await upload_queue.failed(replay, error=res.error)
+                else:
+                    await upload_queue.done(replay, replay_id=replay_id)
+            return res
+
+        async def completed(fill: bool) -> AsyncIterator[ReplayPostResult]:
+            nonlocal pending
+            while len(pending) >= (workers if fill else 1):
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+
+        try:
+            async with aclosing(queued()) as replays_queued:
+                async for replay in replays_queued:
+                    pending.add(asyncio.create_task(post(replay)))
+                    async for res in completed(fill=True):
+                        yield res
+            async for res in completed(fill=False):
+                yield res
+        finally:
+            for task in pending:
+                task.cancel()
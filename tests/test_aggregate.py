@@ -0,0 +1,236 @@
+import pytest  # type: ignore
+import json
+from collections import defaultdict
+from pathlib import Path
+import logging
+
+import pyarrow as pa  # type: ignore
+
+from blitzmodels.map import Maps
+from blitzmodels.wotinspector import (
+    EnumBattleResult,
+    Replay,
+    ReplayAggregator,
+    ReplayJSON,
+    aggregate_files,
+)
+from blitzmodels.wotinspector.aggregate import AVERAGES, COUNTERS
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Aggregate V1 and V2 replays by player
+# 2) Merge partial aggregates
+# 3) Export aggregates to Arrow
+# 4) Aggregate replay files in a process pool
+# 5) Group V1 replays by map_id found by map name
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay.json",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay.json",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay.json",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay.json",
+    "20200229_2337__jylpah_E-50_skit.wotbreplay.json",
+    "20200229_2341__jylpah_E-50_erlenberg.wotbreplay.json",
+    "20200229_2344__jylpah_E-50_rock.wotbreplay.json",
+    "20200229_2349__jylpah_E-50_himmelsdorf.wotbreplay.json",
+]
+
+PROTAGONIST: int = 521458531
+
+
+def replays_v1() -> list[ReplayJSON]:
+    return [
+        ReplayJSON.model_validate(json.loads((FIXTURE_DIR / replay_fn).read_text()))
+        for replay_fn in REPLAYS
+    ]
+
+
+def replays_v2() -> list[Replay]:
+    res: list[Replay] = list()
+    for replay_json in replays_v1():
+        replay: Replay | None = Replay.from_ReplayJSON(replay_json)
+        assert replay is not None, f"could not convert replay: {replay_json.id}"
+        res.append(replay)
+    return res
+
+
+def sort(table: pa.Table, by: list[str]) -> pa.Table:
+    return table.sort_by([(key, "ascending") for key in by])
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+def test_1_aggregate_players() -> None:
+    v1: list[ReplayJSON] = replays_v1()
+    battles: dict[int, int] = defaultdict(int)
+    wins: dict[int, int] = defaultdict(int)
+    damage: dict[int, int] = defaultdict(int)
+    for replay_json in v1:
+        details = replay_json.data.summary.details
+        assert isinstance(details, list), "test replays have full details"
+        for detail in details:
+            battles[detail.dbid] += 1
+            wins[detail.dbid] += (
+                replay_json.get_battle_result(detail.dbid) == EnumBattleResult.win
+            )
+            damage[detail.dbid] += detail.damage_made or 0
+
+    aggregator = ReplayAggregator(by=["dbid"])
+    aggregator.add_many(v1)
+    assert aggregator.replays == len(REPLAYS), (
+        f"incorrect replays: {aggregator.replays}"
+    )
+    assert len(aggregator) == len(battles), f"incorrect groups: {len(aggregator)}"
+    for dbid in battles:
+        totals = aggregator.get(dbid)
+        assert totals is not None, f"player missing: {dbid}"
+        assert totals["battles"] == battles[dbid], f"incorrect battles: {dbid}"
+        assert totals["wins"] == wins[dbid], f"incorrect wins: {dbid}"
+        assert totals["damage_made"] == damage[dbid], f"incorrect damage: {dbid}"
+
+    aggregator_v2 = ReplayAggregator(by=["dbid"])
+    aggregator_v2.add_many(replays_v2())
+    for dbid in battles:
+        assert aggregator_v2.get(dbid) == aggregator.get(dbid), (
+            f"V1 and V2 totals differ: {dbid}"
+        )
+
+    protagonist = ReplayAggregator(by=["dbid", "tank_id"], dbids=[PROTAGONIST])
+    protagonist.add_many(v1)
+    assert len(protagonist) == 1, "other players aggregated"
+    assert aggregator.get(PROTAGONIST) == protagonist.get(PROTAGONIST, 10257), (
+        "incorrect protagonist totals"
+    )
+
+    with pytest.raises(ValueError):
+        ReplayAggregator(by=["tier"])
+
+
+def test_2_merge() -> None:
+    v2: list[Replay] = replays_v2()
+    by: list[str] = ["tank_id", "platoon"]
+    total = ReplayAggregator(by=by)
+    total.add_many(v2)
+
+    merged = ReplayAggregator(by=by)
+    for i in range(3):
+        partial = ReplayAggregator(by=by)
+        partial.add_many(v2[i::3])
+        merged.merge(partial)
+    assert merged.replays == total.replays, "incorrect replay count"
+    assert sort(merged.to_arrow(), by).equals(sort(total.to_arrow(), by)), (
+        "merged totals differ"
+    )
+
+    with pytest.raises(ValueError):
+        merged.merge(ReplayAggregator(by=["dbid"]))
+
+
+def test_3_to_arrow() -> None:
+    aggregator = ReplayAggregator(by=["dbid", "map_id"])
+    aggregator.add_many(replays_v2())
+    table = aggregator.to_arrow()
+    assert table.schema == aggregator.arrow_schema(), "incorrect schema"
+    assert table.column_names == ["dbid", "map_id"] + list(COUNTERS) + list(AVERAGES), (
+        f"incorrect columns: {table.column_names}"
+    )
+    assert table.num_rows == len(aggregator), f"incorrect rows: {table.num_rows}"
+    for row in table.to_pylist():
+        totals = aggregator.get(row["dbid"], row["map_id"])
+        assert totals is not None, f"group missing: {row}"
+        assert row["win_rate"] == totals["wins"] / totals["battles"], (
+            f"incorrect win rate: {row}"
+        )
+        if totals["shots_made"] == 0:
+            assert row["hit_rate"] is None, f"hit rate of no shots: {row}"
+        else:
+            assert row["hit_rate"] == totals["shots_hit"] / totals["shots_made"], (
+                f"incorrect hit rate: {row}"
+            )
+    assert ReplayAggregator().to_arrow().num_rows == 0, "empty aggregate not empty"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("processes", [False, True])
+async def test_4_aggregate_files(tmp_path: Path, processes: bool) -> None:
+    v2: list[Replay] = replays_v2()
+    files: list[Path] = list()
+    for i in range(3):
+        path: Path = tmp_path / f"replays_{i}.ndjson"
+        with open(path, "w") as file:
+            for replay in v2[i::3]:
+                file.write(replay.model_dump_json(by_alias=True) + "\n")
+            file.write('{"broken": true}\n')
+        files.append(path)
+
+    total = ReplayAggregator(by=["dbid", "tank_id"])
+    total.add_many(v2)
+    aggregator: ReplayAggregator = await aggregate_files(
+        files + [tmp_path / "missing.ndjson"],
+        by=["dbid", "tank_id"],
+        workers=2,
+        processes=processes,
+    )
+    assert aggregator.replays == len(v2), f"incorrect replays: {aggregator.replays}"
+    assert aggregator.skipped == len(files), f"broken lines: {aggregator.skipped}"
+    assert aggregator.errors == 1, f"missing file not counted: {aggregator.errors}"
+    by: list[str] = ["dbid", "tank_id"]
+    assert sort(aggregator.to_arrow(), by).equals(sort(total.to_arrow(), by)), (
+        "file aggregates differ"
+    )
+
+
+def test_5_aggregate_v1_by_map() -> None:
+    v1: list[ReplayJSON] = replays_v1()
+    maps: Maps = Maps.default()
+    battles: dict[int | None, int] = defaultdict(int)
+    for replay_json in v1:
+        map = maps.find(replay_json.data.summary.map_name)
+        assert map is not None, f"map not found: {replay_json.data.summary.map_name}"
+        battles[map.id] += 1
+
+    aggregator = ReplayAggregator(by=["dbid", "map_id"], dbids=[PROTAGONIST])
+    aggregator.add_many(v1)
+    assert len(aggregator) == len(battles), f"incorrect groups: {len(aggregator)}"
+    for map_id, count in battles.items():
+        totals = aggregator.get(PROTAGONIST, map_id)
+        assert totals is not None, f"map missing: {map_id}"
+        assert totals["battles"] == count, f"incorrect battles: map_id={map_id}"
+
+    # maps are injectable, map_id is null if the map is not found
+    map_id: int = next(iter(battles))
+    single = Maps()
+    single.add(maps[map_id])
+    aggregator = ReplayAggregator(by=["map_id"], dbids=[PROTAGONIST], maps=single)
+    aggregator.add_many(v1)
+    totals = aggregator.get(map_id)
+    assert totals is not None, f"map missing: {map_id}"
+    assert totals["battles"] == battles[map_id], f"incorrect battles: map_id={map_id}"
+    totals = aggregator.get(None)
+    assert totals is not None, "unknown maps not grouped as null"
+    assert totals["battles"] == len(v1) - battles[map_id], (
+        f"incorrect battles of unknown maps: {totals['battles']}"
+    )
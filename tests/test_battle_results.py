@@ -0,0 +1,208 @@
+import pytest  # type: ignore
+import pickle
+from pathlib import Path
+import logging
+from typing import Any, Dict
+
+from blitzmodels import ReplayFile
+from blitzmodels.wotinspector.battle_results import BattleResults, decode_message
+from blitzmodels.wotinspector.wi_apiv1 import ReplayJSON, ReplayDetail
+from blitzmodels.wotinspector.wi_apiv2 import Replay
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Decode battle_results.dat and compare to WoTinspector API v1 replays
+# 2) Create v2 Replay from replay files offline
+# 3) Decode replay files concurrently
+# 4) Reject invalid battle_results.dat, incl. fields of a wrong wire type
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay",
+    "20200229_2337__jylpah_E-50_skit.wotbreplay",
+    "20200229_2341__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2344__jylpah_E-50_rock.wotbreplay",
+    "20200229_2349__jylpah_E-50_himmelsdorf.wotbreplay",
+    "20200229_2353__jylpah_E-50_fort.wotbreplay",
+    "20200301_0022__jylpah_E-50_rudniki.wotbreplay",
+    "20200301_0026__jylpah_E-50_himmelsdorf.wotbreplay",
+    "20200301_0030__jylpah_E-50_rift.wotbreplay",
+    "20200301_0035__jylpah_E-50_rock.wotbreplay",
+    "20200301_0039__jylpah_E-50_desert_train.wotbreplay",
+]
+
+REPLAY_FILES = pytest.mark.datafiles(
+    *[FIXTURE_DIR / replay for replay in REPLAYS],
+    *[FIXTURE_DIR / f"{replay}.json" for replay in REPLAYS],
+    on_duplicate="overwrite",
+)
+
+SKIP_FIELDS: set[str] = {
+    "achievements",
+    "killed_by",  # entity id in battle_results.dat, dbid in v1
+}
+
+
+async def open_replay(replay_fn: Path) -> tuple[ReplayFile, ReplayJSON]:
+    replay_file = ReplayFile(replay_fn)
+    await replay_file.open(meta_only=True)
+    replay_json: ReplayJSON | None = await ReplayJSON.open_json(
+        replay_fn.with_name(f"{replay_fn.name}.json")
+    )
+    assert replay_json is not None, f"could not open {replay_fn.name}.json"
+    return replay_file, replay_json
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_1_battle_results(datafiles: Path) -> None:
+    for replay_fn in sorted(datafiles.glob("*.wotbreplay")):
+        replay_file, replay_json = await open_replay(replay_fn)
+        results = BattleResults(replay_file.read_battle_results())
+        summary = replay_json.data.summary
+        assert isinstance(summary.details, list), "replay has no player details"
+        assert results.arena_unique_id == summary.arena_unique_id, (
+            f"incorrect arenaUniqueId: {replay_fn.name}"
+        )
+        assert len(results.players_data) == len(summary.details), (
+            f"incorrect number of players: {replay_fn.name}"
+        )
+        details: Dict[int, ReplayDetail] = {
+            detail.dbid: detail for detail in summary.details
+        }
+        entity_ids: Dict[int, int] = {
+            player_data["entity_id"]: player_data["dbid"]
+            for player_data in results.players_data
+        }
+        for player_data in results.players_data:
+            detail: Dict[str, Any] = details[player_data["dbid"]].model_dump()
+            for field, value in player_data.items():
+                if field in SKIP_FIELDS or field not in detail:
+                    continue
+                assert (detail[field] or 0) == value, (
+                    f"{replay_fn.name}: {field} differs: {value} != {detail[field]}"
+                )
+            killer: int = entity_ids.get(player_data.get("killed_by", 0), 0)
+            assert killer == detail["killed_by"], (
+                f"{replay_fn.name}: incorrect killer: {killer}"
+            )
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_2_replay_from_file(datafiles: Path) -> None:
+    for replay_fn in sorted(datafiles.glob("*.wotbreplay")):
+        replay_file, replay_json = await open_replay(replay_fn)
+        replay: Replay | None = Replay.from_ReplayFile(replay_file)
+        assert replay is not None, f"could not decode replay: {replay_fn.name}"
+        summary = replay_json.data.summary
+        assert replay.id == replay_file.hash, f"incorrect id: {replay.id}"
+        assert replay.arena_unique_id == str(summary.arena_unique_id), (
+            f"incorrect arena_unique_id: {replay.arena_unique_id}"
+        )
+        for field in [
+            "protagonist",
+            "protagonist_team",
+            "winner_team",
+            "battle_result",
+            "battle_type",
+            "room_type",
+            "mastery_badge",
+            "exp_base",
+            "credits_base",
+            "exp_total",
+            "credits_total",
+        ]:
+            assert getattr(replay, field) == getattr(summary, field), (
+                f"{replay_fn.name}: {field} differs: {getattr(replay, field)}"
+            )
+        assert sorted(replay.allies) == sorted(summary.allies), "incorrect allies"
+        assert sorted(replay.enemies) == sorted(summary.enemies), "incorrect enemies"
+        assert replay.map_id == replay_file.meta.mapId, "incorrect map_id"
+        assert len(replay.players_data) == len(summary.allies) + len(summary.enemies)
+        assert Replay.parse_str(replay.model_dump_json(by_alias=True)) == replay, (
+            f"could not re-import decoded replay: {replay_fn.name}"
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("processes", [False, True])
+@REPLAY_FILES
+async def test_3_open_many(datafiles: Path, processes: bool) -> None:
+    replay_fns: list[Path] = sorted(datafiles.glob("*.wotbreplay"))
+    (datafiles / "BROKEN.wotbreplay").write_bytes(b"not a zip file")
+    replays: list[Replay] = [
+        replay
+        async for replay in Replay.open_many(
+            replay_fns + [datafiles / "BROKEN.wotbreplay"],
+            workers=2,
+            processes=processes,
+            ordered=True,
+        )
+    ]
+    assert len(replays) == len(replay_fns), f"incorrect number of replays: {replays}"
+    for replay, replay_fn in zip(replays, replay_fns):
+        replay_file, _ = await open_replay(replay_fn)
+        assert replay == Replay.from_ReplayFile(replay_file), (
+            f"replay differs: {replay_fn.name}"
+        )
+
+
+def battle_results(msg: bytes) -> bytes:
+    """Pickle (1, msg) as Python 2 does: bytes as a short binary string"""
+    return b"\x80\x02K\x01U" + bytes([len(msg)]) + msg + b"\x86."
+
+
+class Exploit:
+    def __reduce__(self):
+        return (print, ("unpickled",))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"not a pickle",
+        b"\x80\x02K\x01U\x01\x08\x86.",  # (1, '\x08'): truncated protobuf
+        b"\x80\x02U\x011U\x00\x86.",  # ('1', ''): invalid arenaUniqueId
+        pickle.dumps((1, Exploit()), protocol=2),
+        # fields of a wrong wire type
+        battle_results(b"\x40\x01"),  # author as varint
+        battle_results(b"\xc8\x0c\x01"),  # player as varint
+        battle_results(b"\xe8\x12\x01"),  # player results as varint
+        battle_results(b"\x0a\x01x"),  # mode & map as bytes
+    ],
+)
+def test_4_invalid_battle_results(data: bytes) -> None:
+    with pytest.raises(ValueError):
+        BattleResults(data)
+    assert decode_message(b"\x08\x96\x01\x12\x02ab") == {1: [150], 2: [b"ab"]}
+    with pytest.raises(ValueError):
+        decode_message(1)  # type: ignore
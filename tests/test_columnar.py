@@ -0,0 +1,140 @@
+import pytest  # type: ignore
+import json
+from pathlib import Path
+import logging
+
+import pyarrow.parquet as pq  # type: ignore
+
+from blitzmodels.wotinspector import (
+    PlayerData,
+    PlayersParquetWriter,
+    Replay,
+    players_table,
+)
+from blitzmodels.wotinspector.columnar import players_schema
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Flatten players_data of Replays and replay JSON dicts
+# 2) Stream players_data to Parquet in batches
+# 3) Export players_data of replay files
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAY_FILES = pytest.mark.datafiles(
+    FIXTURE_DIR / "20200229_2321__jylpah_E-50_fort.wotbreplay",
+    FIXTURE_DIR / "20200229_2324__jylpah_E-50_erlenberg.wotbreplay",
+    FIXTURE_DIR / "20200229_2328__jylpah_E-50_grossberg.wotbreplay",
+    FIXTURE_DIR / "20200229_2332__jylpah_E-50_lumber.wotbreplay",
+    on_duplicate="overwrite",
+)
+
+
+def replays(n: int) -> list[Replay]:
+    example: Replay = Replay.example_instance()
+    return [
+        example.model_copy(
+            update={
+                "id": f"{i}".zfill(32),
+                "players_data": example.players_data[: 1 + i % 2],
+            }
+        )
+        for i in range(n)
+    ]
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+def test_1_players_table() -> None:
+    replay_list: list[Replay] = replays(20)
+    table = players_table(replay_list)
+    assert table.schema == players_schema(), "incorrect schema"
+    assert table.num_rows == sum(len(replay.players_data) for replay in replay_list), (
+        f"incorrect number of rows: {table.num_rows}"
+    )
+    rows: list[dict] = table.to_pylist()
+    row: int = 0
+    for replay in replay_list:
+        for player in replay.players_data:
+            assert rows[row]["id"] == replay.id, f"incorrect replay id: {row}"
+            assert rows[row]["battle_start_time"] == replay.battle_start_time, (
+                f"incorrect battle_start_time: {row}"
+            )
+            assert rows[row]["winner_team"] == replay.winner_team, "winner_team"
+            assert rows[row]["version"] == replay.game_version["name"], "version"
+            for name in PlayerData.arrow_schema().names:
+                assert rows[row][name] == getattr(player, name), (
+                    f"incorrect {name}: {row}"
+                )
+            row += 1
+
+    for by_alias in [True, False]:
+        dicts = [
+            json.loads(replay.model_dump_json(by_alias=by_alias))
+            for replay in replay_list
+        ]
+        assert players_table(dicts).equals(table), (
+            f"tables differ for JSON dicts: {by_alias=}"
+        )
+    assert players_table([]).num_rows == 0, "empty table has rows"
+
+
+@pytest.mark.asyncio
+async def test_2_players_parquet(tmp_path: Path) -> None:
+    replay_list: list[Replay] = replays(50)
+    parquet: Path = tmp_path / "players.parquet"
+    async with PlayersParquetWriter(parquet, batch_size=20) as writer:
+        rows: int = await writer.write(replay_list)
+    assert rows == sum(len(replay.players_data) for replay in replay_list), (
+        f"incorrect number of rows: {rows}"
+    )
+    assert pq.ParquetFile(parquet).num_row_groups > 1, "replays not written in batches"
+    assert pq.read_table(parquet).equals(players_table(replay_list)), (
+        "incorrect Parquet table"
+    )
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_3_replay_files(datafiles: Path, tmp_path: Path) -> None:
+    replay_list: list[Replay] = [
+        replay
+        async for replay in Replay.open_many(
+            sorted(datafiles.glob("*.wotbreplay")), ordered=True
+        )
+    ]
+    assert len(replay_list) == 4, "could not open replays"
+    parquet: Path = tmp_path / "players.parquet"
+    async with PlayersParquetWriter(parquet) as writer:
+        await writer.write(replay_list)
+    table = pq.read_table(parquet)
+    assert table.num_rows == sum(len(replay.players_data) for replay in replay_list), (
+        f"incorrect number of rows: {table.num_rows}"
+    )
+    assert table.column("dbid").to_pylist() == [
+        player.dbid for replay in replay_list for player in replay.players_data
+    ], "incorrect dbids"
+    assert set(table.column("map_id").to_pylist()) == {
+        replay.map_id for replay in replay_list
+    }, "incorrect map_ids"
@@ -0,0 +1,265 @@
+import pytest  # type: ignore
+import asyncio
+from aiohttp import web
+from contextlib import asynccontextmanager
+from pathlib import Path
+import logging
+from typing import AsyncIterator, Dict, List, Any, Set
+
+import pyarrow.parquet as pq  # type: ignore
+
+from blitzmodels.wotinspector import (
+    CrawlState,
+    NDJSONSink,
+    ParquetSink,
+    Replay,
+    WoTinspector,
+    crawl_replays,
+)
+from blitzmodels.wotinspector.crawler import CrawlStats, CrawlStatus
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Crawl replays to NDJSON, skip crawled and failed replays with one query
+#    per listing page, retry failed ones
+# 2) Resume an interrupted crawl from its checkpoint
+# 3) Crawl replays to Parquet
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+PAGES: int = 4
+PAGE_SIZE: int = 5
+IDS: List[str] = [
+    f"{page}{i}".zfill(32) for page in range(1, PAGES + 1) for i in range(PAGE_SIZE)
+]
+
+
+def replay_summary(id: str) -> Dict[str, Any]:
+    return {
+        "id": id,
+        "map_id": 1,
+        "battle_duration": 300.0,
+        "player_name": "jylpah",
+        "protagonist": 521458531,
+        "vehicle_descr": 19201,
+        "game_version": {"name": "6.8"},
+        "arena_unique_id": id,
+    }
+
+
+class ReplayAPI:
+    """Local WoTinspector API v2 serving a replay list and replays"""
+
+    def __init__(self) -> None:
+        self.pages: List[int] = list()
+        self.replays: List[str] = list()
+        self.broken: Set[str] = set()
+        self.example: Replay = Replay.example_instance()
+
+    async def handler(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(0.01)
+        if "page" in request.query:
+            page: int = int(request.query["page"])
+            self.pages.append(page)
+            next_url: str | None = None
+            if page < PAGES:
+                next_url = f"{request.url.with_query(page=page + 1)}"
+            return web.json_response(
+                {
+                    "count": len(IDS),
+                    "next": next_url,
+                    "previous": None,
+                    "results": [
+                        replay_summary(id)
+                        for id in IDS[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+                    ],
+                }
+            )
+        id: str = request.path.strip("/").split("/")[-1]
+        self.replays.append(id)
+        if id in self.broken:
+            raise web.HTTPInternalServerError()
+        return web.Response(
+            text=self.example.model_copy(update={"id": id}).model_dump_json(
+                by_alias=True
+            ),
+            content_type="application/json",
+        )
+
+
+@asynccontextmanager
+async def local_wotinspector(api: ReplayAPI) -> AsyncIterator[WoTinspector]:
+    """Run a local HTTP server for the API and yield a client for it"""
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", api.handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+
+    class LocalWoTinspector(WoTinspector):
+        URL_REPLAYS = f"http://127.0.0.1:{runner.addresses[0][1]}/blitz/replays/"
+
+    wotinspector = LocalWoTinspector()
+    try:
+        yield wotinspector
+    finally:
+        await wotinspector.close()
+        await runner.cleanup()
+
+
+def read_ndjson(path: Path) -> List[str]:
+    with open(path) as file:
+        return [replay.id for line in file if (replay := Replay.parse_str(line))]
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.asyncio
+async def test_1_crawl_ndjson(tmp_path: Path) -> None:
+    api = ReplayAPI()
+    api.broken = {IDS[3], IDS[12]}
+    ndjson: Path = tmp_path / "replays.ndjson"
+    async with (
+        local_wotinspector(api) as wi,
+        CrawlState(tmp_path / "crawl.db") as state,
+    ):
+        async with NDJSONSink(ndjson) as sink:
+            stats: CrawlStats = await crawl_replays(
+                wi, sink, state, workers=3, checkpoint_interval=4
+            )
+        assert (stats.listed, stats.fetched, stats.errors) == (len(IDS), 18, 2), (
+            f"incorrect crawl: {stats}"
+        )
+        assert sorted(read_ndjson(ndjson)) == sorted(set(IDS) - api.broken), (
+            "incorrect replays written"
+        )
+        assert await state.count(CrawlStatus.done) == len(IDS) - 2, "ids not stored"
+        assert sorted(await state.failed()) == sorted(api.broken), "failed ids"
+        assert await state.checkpoint("default") is None, "checkpoint not cleared"
+
+        # re-crawl skips crawled and failed replays, one query per page
+        api.replays.clear()
+        queries: List[List[str]] = list()
+        crawled = state.crawled
+
+        async def count_crawled(ids: List[str], failed: bool = False) -> Set[str]:
+            queries.append(list(ids))
+            return await crawled(ids, failed=failed)
+
+        state.crawled = count_crawled  # type: ignore[method-assign]
+        async with NDJSONSink(ndjson) as sink:
+            stats = await crawl_replays(wi, sink, state)
+        del state.crawled
+        assert (stats.skipped, stats.fetched, stats.errors) == (len(IDS), 0, 0), (
+            f"incorrect re-crawl: {stats}"
+        )
+        assert api.replays == [], f"replays re-fetched: {api.replays}"
+        assert [len(ids) for ids in queries if ids] == [PAGE_SIZE] * PAGES, (
+            f"crawled ids not queried once per page: {queries}"
+        )
+
+        # re-crawl with retry_failed=True retries failed replays
+        api.broken.clear()
+        async with NDJSONSink(ndjson) as sink:
+            stats = await crawl_replays(wi, sink, state, retry_failed=True)
+        assert (stats.skipped, stats.fetched, stats.errors) == (len(IDS), 2, 0), (
+            f"incorrect re-crawl: {stats}"
+        )
+        assert sorted(api.replays) == sorted([IDS[3], IDS[12]]), "replays re-fetched"
+        assert sorted(read_ndjson(ndjson)) == IDS, "incorrect replays written"
+        assert await state.failed() == [], "failed ids not cleared"
+
+
+@pytest.mark.asyncio
+async def test_2_crawl_resume(tmp_path: Path) -> None:
+    api = ReplayAPI()
+    ndjson: Path = tmp_path / "replays.ndjson"
+    async with (
+        local_wotinspector(api) as wi,
+        CrawlState(tmp_path / "crawl.db") as state,
+        NDJSONSink(ndjson) as sink,
+    ):
+        stats: CrawlStats = await crawl_replays(
+            wi, sink, state, name="tier10", max_pages=2, tier=10
+        )
+        assert stats.fetched == 2 * PAGE_SIZE, f"incorrect crawl: {stats}"
+        checkpoint = await state.checkpoint("tier10")
+        assert checkpoint is not None, "checkpoint not saved"
+        assert checkpoint.filters == {"tier": 10}, "filters not saved"
+
+        # interrupt the crawl during the 3rd page
+        task = asyncio.create_task(
+            crawl_replays(wi, sink, state, name="tier10", workers=1, tier=10)
+        )
+        while len(api.replays) < 2 * PAGE_SIZE + 2:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        checkpoint = await state.checkpoint("tier10")
+        assert checkpoint is not None, "checkpoint not saved"
+        assert checkpoint.page == 3, f"incorrect checkpoint: {checkpoint}"
+        await sink.flush()
+        assert read_ndjson(ndjson) == IDS[: len(read_ndjson(ndjson))], (
+            "replays not in order"
+        )
+
+        api.pages.clear()
+        stats = await crawl_replays(wi, sink, state, name="tier10", tier=10)
+        assert min(api.pages) == 3, f"crawl did not resume: {api.pages}"
+        assert stats.listed <= len(IDS) - 2 * PAGE_SIZE, f"not resumed: {stats}"
+        await sink.flush()
+        assert sorted(read_ndjson(ndjson)) == IDS, "incorrect replays written"
+        assert await state.checkpoint("tier10") is None, "checkpoint not cleared"
+
+        # changed filters start from the first page
+        api.pages.clear()
+        await state.save_checkpoint("tier10", {"tier": 10}, (3, 0))
+        stats = await crawl_replays(wi, sink, state, name="tier10", tier=9)
+        assert min(api.pages) == 1, "crawl with changed filters resumed"
+        assert stats.skipped == len(IDS), f"crawled replays not skipped: {stats}"
+
+
+@pytest.mark.asyncio
+async def test_3_crawl_parquet(tmp_path: Path) -> None:
+    api = ReplayAPI()
+    dataset: Path = tmp_path / "replays"
+    async with (
+        local_wotinspector(api) as wi,
+        CrawlState() as state,
+    ):
+        async with ParquetSink(dataset, batch_size=7) as sink:
+            await crawl_replays(wi, sink, state, checkpoint_interval=5)
+        async with ParquetSink(dataset) as sink:
+            await crawl_replays(wi, sink, state)
+
+    assert len(list(dataset.glob("*.parquet"))) == 1, "empty parquet file written"
+    table = pq.read_table(dataset)
+    assert table.schema == ParquetSink.arrow_schema(), "incorrect schema"
+    assert sorted(table.column("id").to_pylist()) == IDS, "incorrect replays"
+    for id, replay_json in zip(
+        table.column("id").to_pylist(), table.column("replay").to_pylist()
+    ):
+        assert (replay := Replay.parse_str(replay_json)) is not None, (
+            f"could not parse replay {id}"
+        )
+        assert replay.id == id, f"incorrect replay: {replay.id} != {id}"
@@ -0,0 +1,234 @@
+import pytest  # type: ignore
+import pickle
+import random
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any
+import logging
+
+import pyarrow as pa  # type: ignore
+import pyarrow.compute as pc  # type: ignore
+
+from blitzmodels.wotinspector import BattleDetails, Shot, ShotAggregator, shots_table
+from blitzmodels.wotinspector.heatmap import shots_schema
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Flatten shots of BattleDetails models and JSON dicts to a table
+# 2) Aggregate shots by map and distance, and hits by map and segment
+# 3) Merge partial aggregates
+# 4) Skip shots with no or negative distance in distance bins
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+MAP_IDS: list[int] = [1, 2, 5]
+SEGMENTS: list[str] = ["hull_front", "hull_side", "turret_front", "track"]
+BIN_SIZE: float = 50.0
+MAX_DISTANCE: float = 400.0
+
+
+def shot(rnd: random.Random) -> dict[str, Any]:
+    hit: bool = rnd.random() < 0.7
+    has_damage: bool = hit and rnd.random() < 0.6
+    return {
+        "time": rnd.uniform(0, 420),
+        "shooter": rnd.randint(1, 1000),
+        "target": rnd.randint(1, 1000) if hit else 0,
+        "has_damage": has_damage,
+        "shell_id": rnd.randint(1, 3),
+        "turret_yaw": rnd.uniform(-3, 3),
+        "gun_pitch": rnd.uniform(-0.2, 0.2),
+        "segment": rnd.choice(SEGMENTS) if hit else "",
+        "distance": rnd.uniform(0, 500),
+        "nominal_pen": rnd.randint(100, 300),
+        "nominal_damage": rnd.randint(200, 400),
+        "damage": rnd.randint(150, 450) if has_damage else 0,
+    }
+
+
+def battles(n: int = 30, seed: int = 42) -> list[dict[str, Any]]:
+    rnd = random.Random(seed)
+    now: str = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "id": f"battle-{i}",
+            "map_id": rnd.choice(MAP_IDS),
+            "battle_type": 1,
+            "room_type": 1,
+            "data_version": 1,
+            "game_version": {"name": "10.7"},
+            "winner_team": 1,
+            "battle_start_time": now,
+            "tier": 8,
+            "has_team1": True,
+            "has_team2": True,
+            "last_accessed_time": now,
+            "chat": [],
+            "shots": [shot(rnd) for _ in range(rnd.randint(0, 40))],
+            "properties_json": {},
+        }
+        for i in range(n)
+    ]
+
+
+def distance_bin(distance: float) -> int:
+    return min(int(distance // BIN_SIZE), int(MAX_DISTANCE // BIN_SIZE) - 1)
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+def test_1_shots_table() -> None:
+    data: list[dict[str, Any]] = battles()
+    models: list[BattleDetails] = [BattleDetails.model_validate(b) for b in data]
+    table: pa.Table = shots_table(data)
+    assert table.schema == shots_schema(), "incorrect schema"
+    assert table.num_rows == sum(len(b["shots"]) for b in data), (
+        f"incorrect rows: {table.num_rows}"
+    )
+    assert shots_table(models).equals(table), "models and dicts differ"
+
+    rows: list[dict[str, Any]] = table.to_pylist()
+    i: int = 0
+    for battle in data:
+        for s in battle["shots"]:
+            row = rows[i]
+            assert row["battle_id"] == battle["id"], f"incorrect battle_id: {i}"
+            assert row["map_id"] == battle["map_id"], f"incorrect map_id: {i}"
+            for name in ["shooter", "target", "segment", "damage"]:
+                assert row[name] == s[name], f"incorrect {name}: {i}"
+            i += 1
+    assert shots_table([]).num_rows == 0, "empty table not empty"
+    assert Shot.arrow_schema().names == list(Shot.model_fields), (
+        "Shot schema and fields differ"
+    )
+
+
+def test_2_aggregate() -> None:
+    data: list[dict[str, Any]] = battles()
+    shots: dict[tuple[int, int], int] = defaultdict(int)
+    hits: dict[tuple[int, int], int] = defaultdict(int)
+    damage: dict[tuple[int, int], int] = defaultdict(int)
+    segments: dict[tuple[int, str], int] = defaultdict(int)
+    for battle in data:
+        for s in battle["shots"]:
+            key = (battle["map_id"], distance_bin(s["distance"]))
+            shots[key] += 1
+            hits[key] += s["target"] != 0
+            damage[key] += s["damage"]
+            if s["target"] != 0:
+                segments[(battle["map_id"], s["segment"])] += 1
+
+    aggregator = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+    aggregator.add(data)
+    assert aggregator.battles == len(data), f"incorrect battles: {aggregator.battles}"
+
+    table: pa.Table = aggregator.distance_table()
+    assert table.num_rows == len(shots), f"incorrect groups: {table.num_rows}"
+    for row in table.to_pylist():
+        key = (row["map_id"], row["distance_bin"])
+        assert row["shots"] == shots[key], f"incorrect shots: {key}"
+        assert row["hits"] == hits[key], f"incorrect hits: {key}"
+        assert row["damage"] == damage[key], f"incorrect damage: {key}"
+        assert row["distance"] == row["distance_bin"] * BIN_SIZE, (
+            f"incorrect distance: {key}"
+        )
+        assert row["hit_rate"] == pytest.approx(hits[key] / shots[key]), (
+            f"incorrect hit rate: {key}"
+        )
+
+    table = aggregator.segment_table()
+    assert table.num_rows == len(segments), f"incorrect segments: {table.num_rows}"
+    for map_id in MAP_IDS:
+        map_hits: int = sum(v for k, v in segments.items() if k[0] == map_id)
+        for row in table.filter(pc.equal(table["map_id"], map_id)).to_pylist():
+            key = (map_id, row["segment"])
+            assert row["hits"] == segments[key], f"incorrect segment hits: {key}"
+            assert row["share"] == pytest.approx(segments[key] / map_hits), (
+                f"incorrect segment share: {key}"
+            )
+
+    histogram = aggregator.histogram("hits", map_id=MAP_IDS[0])
+    assert len(histogram) == aggregator.bins, f"incorrect bins: {len(histogram)}"
+    for i, value in enumerate(histogram.to_pylist()):
+        assert value == hits[(MAP_IDS[0], i)], f"incorrect histogram: {i}"
+    assert sum(aggregator.histogram().to_pylist()) == sum(shots.values()), (
+        "incorrect histogram of all maps"
+    )
+
+    empty = ShotAggregator()
+    assert empty.distance_table().num_rows == 0, "empty aggregate not empty"
+    assert empty.segment_table().num_rows == 0, "empty aggregate not empty"
+    assert sum(empty.histogram().to_pylist()) == 0, "empty histogram not empty"
+    with pytest.raises(ValueError):
+        empty.histogram("shell_id")
+    with pytest.raises(ValueError):
+        ShotAggregator(bin_size=0)
+
+
+def test_3_merge() -> None:
+    data: list[dict[str, Any]] = battles(n=60)
+    total = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+    total.add(data)
+
+    merged = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+    for i in range(3):
+        partial = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+        for j in range(i * 20, (i + 1) * 20, 5):
+            partial.add(data[j : j + 5])
+        merged.merge(pickle.loads(pickle.dumps(partial)))
+    assert merged.battles == total.battles, "incorrect battle count"
+    assert merged.distance_table().equals(total.distance_table()), (
+        "merged distance aggregates differ"
+    )
+    assert merged.segment_table().equals(total.segment_table()), (
+        "merged segment aggregates differ"
+    )
+
+    with pytest.raises(ValueError):
+        merged.merge(ShotAggregator())
+
+
+def test_4_no_distance() -> None:
+    data: list[dict[str, Any]] = battles(n=10)
+    total = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+    total.add(data)
+
+    rnd = random.Random(7)
+    broken: list[dict[str, Any]] = [shot(rnd) for _ in range(4)]
+    for s, distance in zip(broken, [None, None, -1.0, -250.0]):
+        s["target"] = 1
+        s["segment"] = SEGMENTS[0]
+        s["distance"] = distance
+    data[0]["shots"].extend(broken)
+    aggregator = ShotAggregator(bin_size=BIN_SIZE, max_distance=MAX_DISTANCE)
+    aggregator.add(data)
+    assert aggregator.no_distance == len(broken), (
+        f"incorrect shots without distance: {aggregator.no_distance}"
+    )
+    assert aggregator.distance_table().equals(total.distance_table()), (
+        "shots without distance binned"
+    )
+    table: pa.Table = aggregator.segment_table()
+    hits: int = pc.sum(table["hits"]).as_py()
+    assert hits == pc.sum(total.segment_table()["hits"]).as_py() + len(broken), (
+        f"hits without distance not counted by segment: {hits}"
+    )
@@ -1,8 +1,9 @@
 import pytest  # type: ignore
 from pathlib import Path
-from typing import Tuple, Dict
+from typing import Any, Tuple, Dict
 import logging
-from blitzmodels import Maps, MapMode, MapModeStr
+import yaml  # type: ignore
+from blitzmodels import Map, Maps, MapMode, MapModeStr
 
 logger = logging.getLogger()
 error = logger.error
@@ -20,6 +21,9 @@ debug = logger.debug
 # 1) Read legacy JSON format
 # 2) Write new format
 # 3) Read new format
+# 4) Read maps.yaml and en.yaml
+# 5) Key and localization code indexes
+# 6) Read maps.yaml with YAML aliases
 
 ########################################################
 #
@@ -256,3 +260,128 @@ def test_5_Maps_default() -> None:
     assert (maps := Maps.open_default()) is not None, "could not open packaged maps"
     assert len(maps) > 0, "packaged maps file is empty"
     assert len(maps) > 30, "packaged maps file does not have enough maps"
+
+
+@pytest.mark.asyncio
+@pytest.mark.datafiles(FIXTURE_DIR / MAPS_YAML, on_duplicate="overwrite")
+async def test_6_Maps_indexes(
+    datafiles: Path, localization_strs: Dict[str, str]
+) -> None:
+    maps_yaml: Path = next(datafiles.iterdir())
+    maps: Maps | None
+    assert (maps := await Maps.open_yaml(maps_yaml)) is not None, (
+        f"could not open maps from YAML file: {maps_yaml.name}"
+    )
+    maps.add_names(localization_strs=localization_strs)
+
+    for map in maps.values():
+        assert maps.get_by_key(map.key) is map, f"get_by_key() failed: {map.key}"
+        assert map in maps.get_by_localization_code(map.localization_code), (
+            f"get_by_localization_code() failed: {map.localization_code}"
+        )
+        assert maps.find(map.key) is map, f"find() by key failed: {map.key}"
+    assert maps.get_by_key("no_such_map") is None, "get_by_key() found a ghost"
+    assert maps.find("no such map") is None, "find() found a ghost"
+
+    desert_sands: Map | None = maps.get_by_key("desert_train")
+    assert desert_sands is not None, "could not find map: desert_train"
+    for name in ["Desert Sands", "desert sands", "DESERT_TRAIN", "02_desert_train_dt"]:
+        assert maps.find(name) is desert_sands, f"find() failed: {name}"
+    assert maps.find("desert_train_99") is desert_sands, "map variant not resolved"
+    assert maps.find("Desert Sands - Town") is maps.get_by_key("desert_train_02"), (
+        "find() by map variant name failed"
+    )
+
+    # indexes are maintained on add() & pop()
+    map = maps.pop(desert_sands.id)
+    assert maps.get_by_key(map.key) is None, "popped map still in key index"
+    assert map not in maps.get_by_localization_code(map.localization_code), (
+        "popped map still in localization_code index"
+    )
+    assert maps.find("Desert Sands") is None, "popped map still found"
+    maps.add(map)
+    assert maps.get_by_key(map.key) is map, "re-added map not found"
+    assert maps.find("Desert Sands") is map, "re-added map not found by name"
+
+    renamed: Map = map.model_copy(update={"key": "desert_renamed"})
+    maps.add(renamed)
+    assert maps.get_by_key("desert_train") is None, "replaced map key still indexed"
+    assert maps.get_by_key("desert_renamed") is renamed, "replaced map not indexed"
+
+
+@pytest.mark.asyncio
+@pytest.mark.datafiles(FIXTURE_DIR / MAPS_YAML, on_duplicate="overwrite")
+async def test_7_open_yaml_localization(
+    datafiles: Path,
+    tmp_path: Path,
+    maps_new: int,
+    localization_strs: Dict[str, str],
+    maps_names_updated: int,
+) -> None:
+    """Test for Maps.open_yaml() with localization file"""
+    maps_yaml: Path = datafiles / MAPS_YAML
+    en_yaml: Path = tmp_path / "en.yaml"
+    en_strs: Dict[str, Any] = {
+        "#tanks:T-34": "T-34",
+        "#menu:nested": {"not": ["a", "string"]},
+        **localization_strs,
+        "#maps:list:not_a_name": ["x", "y"],
+    }
+    with open(en_yaml, "w", encoding="utf-8") as file:
+        yaml.safe_dump(en_strs, file, allow_unicode=True)
+
+    assert Maps.load_localization_yaml(en_yaml.read_text()) == localization_strs, (
+        "incorrect localization strings read"
+    )
+
+    maps: Maps | None
+    assert (maps := await Maps.open_yaml(maps_yaml, localization=en_yaml)) is not None, (
+        f"could not open maps from YAML file: {maps_yaml.name}"
+    )
+    assert len(maps) == maps_new, (
+        f"incorrect number of maps read from a YAML file: {len(maps)} != {maps_new}"
+    )
+    assert len([map for map in maps.values() if map.name != ""]) == maps_names_updated, (
+        "incorrect number of names updated"
+    )
+
+    maps_yaml_str: Maps | None = Maps.load_yaml(maps_yaml.read_text())
+    assert maps_yaml_str is not None, "could not load maps from YAML input"
+    maps_yaml_str.add_names(localization_strs)
+    assert maps_yaml_str == maps, "maps read from file and str differ"
+    # lazily built lookups do not affect equality
+    assert maps.find("Desert Sands") is not None, "find() failed"
+    assert maps_yaml_str == maps, "lookup made equal maps differ"
+
+    assert Maps.load_yaml("dummy:\n  maps: 1\n") is None, "no 'maps' root key"
+    assert Maps.load_yaml("maps: []\n") is None, "'maps' is not a mapping"
+
+
+MAPS_YAML_ALIASES: str = """
+modes: &modes [0, 1]
+maps:
+  karelia:
+    id: 1
+    availableModes: *modes
+    localName: 17_karelia_ka/17_karelia_ka.sc2
+  desert_train:
+    id: 2
+    availableModes: *modes
+    localName: 02_desert_train_dt/02_desert_train_dt.sc2
+"""
+
+
+@pytest.mark.asyncio
+async def test_8_open_yaml_aliases(tmp_path: Path) -> None:
+    """Test for maps.yaml using YAML anchors and aliases"""
+    maps: Maps | None = Maps.load_yaml(MAPS_YAML_ALIASES)
+    assert maps is not None, "could not load maps.yaml with aliases"
+    assert len(maps) == 2, f"incorrect number of maps: {len(maps)}"
+    assert maps[1].modes == [MapMode.training, MapMode.normal], "incorrect modes"
+
+    maps_yaml: Path = tmp_path / "maps.yaml"
+    maps_yaml.write_text(MAPS_YAML_ALIASES)
+    assert await Maps.open_yaml(maps_yaml) == maps, "could not open YAML file"
+
+    maps_yaml.write_text("maps:\n  karelia: [unclosed\n")
+    assert await Maps.open_yaml(maps_yaml) is None, "invalid YAML not handled"
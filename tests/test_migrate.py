@@ -0,0 +1,167 @@
+import pytest  # type: ignore
+import json
+from pathlib import Path
+import logging
+
+from blitzmodels.wotinspector import (
+    PlayerData,
+    Replay,
+    ReplayJSON,
+    convert_ReplayJSON,
+    migrate_replays,
+)
+from blitzmodels.wotinspector.migrate import MigrateStats
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Convert V1 ReplayJSON dicts to V2 Replays
+# 2) Migrate V1 replay JSON files to V2 NDJSON file
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay.json",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay.json",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay.json",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay.json",
+    "20200229_2337__jylpah_E-50_skit.wotbreplay.json",
+]
+
+REPLAY_JSON_FILES = pytest.mark.datafiles(
+    *[FIXTURE_DIR / replay for replay in REPLAYS],
+    on_duplicate="overwrite",
+)
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@REPLAY_JSON_FILES
+def test_1_convert_ReplayJSON(datafiles: Path) -> None:
+    for replay_fn in REPLAYS:
+        doc: dict = json.loads((datafiles / replay_fn).read_text())
+        replay_json: ReplayJSON = ReplayJSON.model_validate(doc)
+        summary = replay_json.data.summary
+        assert isinstance(summary.details, list), "test replays have full details"
+
+        replay: Replay = Replay.model_validate(convert_ReplayJSON(doc))
+        for by_alias in [False, True]:
+            assert (
+                Replay.model_validate(convert_ReplayJSON(doc, by_alias=by_alias))
+                == replay
+            ), f"by_alias={by_alias} output differs: {replay_fn}"
+            assert (
+                Replay.model_validate(
+                    convert_ReplayJSON(
+                        replay_json.model_dump(mode="json", by_alias=by_alias)
+                    )
+                )
+                == replay
+            ), f"by_alias={by_alias} input differs: {replay_fn}"
+        assert Replay.from_ReplayJSON(replay_json) == replay, (
+            f"from_ReplayJSON() differs: {replay_fn}"
+        )
+
+        assert replay.id == replay_json.get_id(), f"incorrect id: {replay.id}"
+        assert replay.arena_unique_id == str(summary.arena_unique_id), (
+            f"incorrect arena_unique_id: {replay.arena_unique_id}"
+        )
+        assert (
+            int(replay.battle_start_time.timestamp()) == summary.battle_start_timestamp
+        ), f"incorrect battle_start_time: {replay.battle_start_time}"
+        assert replay.battle_result == summary.battle_result, "incorrect battle_result"
+        assert replay.allies == summary.allies, "incorrect allies"
+        assert replay.model_extra is not None, "V1 fields not kept"
+        assert replay.model_extra["map_name"] == summary.map_name, "map_name missing"
+        assert len(replay.players_data) == len(summary.details), (
+            "incorrect number of players"
+        )
+        for detail, player in zip(summary.details, replay.players_data):
+            player_data: PlayerData | None = PlayerData.from_ReplayDetail(detail)
+            assert player_data is not None, f"from_ReplayDetail() failed: {detail}"
+            assert player_data.model_dump(exclude={"team"}) == player.model_dump(
+                exclude={"team"}
+            ), f"from_ReplayDetail() differs: {detail.dbid}"
+            assert player.dbid == detail.dbid, f"incorrect dbid: {player.dbid}"
+            assert player.time_alive == detail.time_alive, "incorrect time_alive"
+            assert player.team == (
+                replay.protagonist_team
+                if player.dbid in replay.allies
+                else 3 - (replay.protagonist_team or 0)
+            ), f"incorrect team: {player.dbid}"
+            if player.dbid == replay.protagonist:
+                assert replay.vehicle_descr == player.vehicle_descr, (
+                    "incorrect vehicle_descr"
+                )
+                assert replay.damage_made == player.damage_made, "incorrect damage_made"
+                assert replay.protagonist_clan == player.clanid, (
+                    "incorrect protagonist_clan"
+                )
+
+    with pytest.raises(KeyError):
+        convert_ReplayJSON({"status": "ok"})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "processes,validate,by_alias",
+    [(False, False, False), (False, True, True), (True, False, True)],
+)
+@REPLAY_JSON_FILES
+async def test_2_migrate_replays(
+    datafiles: Path, processes: bool, validate: bool, by_alias: bool
+) -> None:
+    docs: list[dict] = [
+        json.loads((datafiles / replay_fn).read_text()) for replay_fn in REPLAYS
+    ]
+    ndjson: Path = datafiles / "replays.ndjson"
+    with open(ndjson, "w") as file:
+        for doc in docs:
+            replay_json = ReplayJSON.model_validate(doc)
+            file.write(replay_json.model_dump_json(by_alias=True) + "\n")
+        file.write('{"status": "ok"}\n')
+    output: Path = datafiles / "replays_v2.ndjson"
+
+    stats: MigrateStats = await migrate_replays(
+        [datafiles / replay_fn for replay_fn in REPLAYS] + [ndjson],
+        output,
+        by_alias=by_alias,
+        validate=validate,
+        batch_size=3,
+        workers=2,
+        processes=processes,
+    )
+    assert stats.converted == 2 * len(REPLAYS), f"incorrect converted count: {stats}"
+    assert stats.errors == 1, f"incorrect error count: {stats}"
+
+    lines: list[str] = output.read_text().splitlines()
+    assert len(lines) == stats.converted, f"incorrect number of lines: {len(lines)}"
+    ids: list[str] = list()
+    for line in lines:
+        doc = json.loads(line)
+        assert ("_id" in doc) == by_alias, f"incorrect keys: by_alias={by_alias}"
+        ids.append(Replay.model_validate(doc).id)
+    expected: list[str] = [
+        Replay.model_validate(convert_ReplayJSON(doc)).id for doc in docs
+    ]
+    assert sorted(ids) == sorted(expected * 2), "incorrect replays"
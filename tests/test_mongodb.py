@@ -0,0 +1,146 @@
+import pytest  # type: ignore
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+import logging
+
+from pymongo import ReplaceOne
+from pymongo.results import BulkWriteResult
+
+from blitzmodels import (
+    MongoBulkWriter,
+    Tank,
+    TankStat,
+    WGApiWoTBlitzTankopedia,
+)
+from blitzmodels.mongodb import db_field_name, db_index
+from blitzmodels.wotinspector import ReplayData
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Map model field names to DB field names
+# 2) Bulk write a stream of models
+# 3) Re-write the same models (upsert)
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+TANKOPEDIA_JSON: str = "01_Tankopedia.json"
+TANKOPEDIA = pytest.mark.datafiles(
+    FIXTURE_DIR / TANKOPEDIA_JSON, on_duplicate="overwrite"
+)
+
+
+class CollectionStandIn:
+    """Minimal local stand-in for pymongo.collection.Collection"""
+
+    def __init__(self, name: str = "test") -> None:
+        self.name: str = name
+        self.docs: Dict[Any, Dict[str, Any]] = dict()
+        self.indexes: List[List[Any]] = list()
+        self.bulk_writes: int = 0
+
+    def create_index(self, keys: List[Any], **kwargs) -> str:
+        self.indexes.append(keys)
+        return "_".join([f"{field}_{order}" for field, order in keys])
+
+    def bulk_write(self, requests: List[ReplaceOne], ordered: bool = True):
+        assert not ordered, "bulk writes should be unordered"
+        self.bulk_writes += 1
+        upserted: List[Dict[str, Any]] = list()
+        matched: int = 0
+        for ndx, op in enumerate(requests):
+            _id = op._filter["_id"]
+            if _id in self.docs:
+                matched += 1
+            else:
+                upserted.append({"index": ndx, "_id": _id})
+            self.docs[_id] = op._doc
+        return BulkWriteResult(
+            {
+                "nInserted": 0,
+                "nUpserted": len(upserted),
+                "nMatched": matched,
+                "nModified": matched,
+                "nRemoved": 0,
+                "upserted": upserted,
+            },
+            acknowledged=True,
+        )
+
+
+async def tank_stream(tankopedia: WGApiWoTBlitzTankopedia) -> AsyncIterator[Tank]:
+    for tank in tankopedia:
+        yield tank
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+def test_1_db_field_name() -> None:
+    assert db_field_name(TankStat, "account_id") == "a", "alias not resolved"
+    assert db_field_name(TankStat, "all.battles") == "s.b", "nested alias failed"
+    assert db_field_name(ReplayData, "summary.protagonist") == "s.p", (
+        "nested alias failed"
+    )
+    assert db_field_name(Tank, "tier") == "tier", "non-aliased field changed"
+    for index in TankStat.backend_indexes():
+        for field, _ in db_index(TankStat, index):
+            assert len(field) <= 2, f"TankStat index field not aliased: {field}"
+
+
+@pytest.mark.asyncio
+@TANKOPEDIA
+async def test_2_bulk_write(datafiles: Path) -> None:
+    tankopedia: WGApiWoTBlitzTankopedia | None
+    assert (
+        tankopedia := await WGApiWoTBlitzTankopedia.open_json(
+            datafiles / TANKOPEDIA_JSON
+        )
+    ) is not None, "could not open tankopedia"
+
+    batch_size: int = 100
+    collection = CollectionStandIn()
+    writer = MongoBulkWriter(collection, batch_size=batch_size)  # type: ignore
+    stats = await writer.write(tank_stream(tankopedia))
+
+    assert len(collection.docs) == len(tankopedia), (
+        f"not all tanks written: {len(collection.docs)} != {len(tankopedia)}"
+    )
+    assert stats.read == len(tankopedia), "incorrect read count"
+    assert stats.inserted == len(tankopedia), "incorrect insert count"
+    assert stats.errors == 0, "bulk write errors"
+    assert collection.bulk_writes == (len(tankopedia) - 1) // batch_size + 1, (
+        "incorrect number of bulk writes"
+    )
+    assert len(collection.indexes) == len(Tank.backend_indexes()), (
+        "backend indexes were not created"
+    )
+    assert stats.rate > 0, "throughput not reported"
+
+    tank: Tank = next(iter(tankopedia))
+    assert collection.docs[tank.tank_id] == tank.obj_db(), "incorrect document"
+
+    # re-write: upsert must not duplicate
+    writer = MongoBulkWriter(collection, batch_size=batch_size)  # type: ignore
+    stats = await writer.write(list(tankopedia))
+    assert len(collection.docs) == len(tankopedia), "upsert duplicated documents"
+    assert stats.inserted == 0, "re-written documents were inserted"
+    assert stats.updated == len(tankopedia), "incorrect update count"
@@ -1,6 +1,12 @@
 import pytest  # type: ignore
+from aiohttp import web
+from base64 import b64encode
+from contextlib import asynccontextmanager
 from pathlib import Path
 from random import choice
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator
+from urllib.parse import urlencode
 import logging
 from blitzmodels import (  # noqa: E402
     WGApiWoTBlitzTankopedia,
@@ -8,10 +14,14 @@ from blitzmodels import (  # noqa: E402
 )
 
 from blitzmodels.wotinspector.wi_apiv1 import (  # noqa: E402
+    EnumBattleResult,
+    EnumWinnerTeam,
     ReplayJSON,
     ReplayFile,
     WoTinspector,
 )
+from blitzmodels.wotinspector.wi_apiv2 import Replay  # noqa: E402
+from blitzmodels.replay import map_executor  # noqa: E402
 
 logger = logging.getLogger()
 error = logger.error
@@ -28,6 +38,12 @@ debug = logger.debug
 # 1) Parse test replay
 # 2) Export test replays
 # 3) Re-import test replays
+# 4) Open replay files concurrently
+# 5) Open replay meta only
+# 6) Open replay without keeping data in memory
+# 7) Stream replay to upload
+# 8) Team, details and platoon indexes of ReplayJSON and V2 Replay and their copies
+# 9) Run tasks in a worker pool and report failures
 
 ########################################################
 #
@@ -99,6 +115,22 @@ def get_map(fn: Path) -> str:
     return "_".join(parts[5:]).removesuffix(".wotbreplay")
 
 
+@asynccontextmanager
+async def upload_server(
+    handler: Callable[[web.Request], Awaitable[web.Response]],
+) -> AsyncIterator[str]:
+    """Run a local HTTP server for testing uploads. Yields the server URL"""
+    app = web.Application(client_max_size=2**24)
+    app.router.add_post("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}"
+    finally:
+        await runner.cleanup()
+
+
 # @pytest.fixture
 # def get_tankopedia() -> WGApiWoTBlitzTankopedia:
 #     with open(tmp_path / fn, "r") as f:
@@ -363,3 +395,246 @@ def test_5_replay_example_instance() -> None:
         assert (
             False
         ), f"Could not validate ReplayJSON example instance : {type(err)}: {err}"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "processes,ordered",
+    [(False, False), (False, True), (True, False)],
+)
+@REPLAY_FILES
+async def test_6_open_many(
+    datafiles: Path, tmp_path: Path, processes: bool, ordered: bool
+) -> None:
+    replay_fns: list[Path] = sorted(
+        replay_fn
+        for replay_fn in datafiles.iterdir()
+        if replay_fn.suffix == ".wotbreplay"
+    )
+    replay_ok: list[Path] = list(replay_fns)
+    (tmp_path / "BROKEN.wotbreplay").write_bytes(b"not a zip file")
+    replay_fns.insert(len(replay_fns) // 2, tmp_path / "BROKEN.wotbreplay")
+
+    replays: list[ReplayFile] = list()
+    async for replay in ReplayFile.open_many(
+        replay_fns, workers=3, processes=processes, ordered=ordered
+    ):
+        assert replay.is_opened, f"replay not opened: {replay.path}"
+        replays.append(replay)
+    assert len(replays) == len(replay_fns) - 1, (
+        f"incorrect number of replays opened: {len(replays)}"
+    )
+    if ordered:
+        assert [replay.path for replay in replays] == replay_ok, (
+            "replays not in input order"
+        )
+
+    for replay in replays:
+        assert replay.path is not None, "replay path missing"
+        replay_file = ReplayFile(replay.path)
+        await replay_file.open()
+        assert replay.hash == replay_file.hash, f"hash differs: {replay.path.name}"
+        assert replay.meta == replay_file.meta, f"meta differs: {replay.path.name}"
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_7_open_meta_only(datafiles: Path) -> None:
+    for replay_fn in datafiles.iterdir():
+        if replay_fn.suffix != ".wotbreplay":
+            continue
+        replay = ReplayFile(replay_fn)
+        await replay.open(meta_only=True)
+        assert replay.is_opened, f"failed to open replay file: {replay_fn.name}"
+        assert replay._data is None, f"replay data read: {replay_fn.name}"
+        assert replay.meta.mapName == get_map(replay_fn), (
+            f"incorrect map name: {replay.meta.mapName} != {get_map(replay_fn)}"
+        )
+
+        replay_full = ReplayFile(replay_fn)
+        await replay_full.open()
+        assert replay.meta == replay_full.meta, f"meta differs: {replay_fn.name}"
+        assert replay.hash == replay_full.hash, f"hash differs: {replay_fn.name}"
+        assert replay.data == replay_full.data, f"data differs: {replay_fn.name}"
+
+    replays: list[Path] = [
+        replay_fn
+        for replay_fn in datafiles.iterdir()
+        if replay_fn.suffix == ".wotbreplay"
+    ]
+    async for replay in ReplayFile.open_many(replays, meta_only=True):
+        assert replay._data is None, f"replay data read: {replay.path}"
+        assert len(replay.hash) == 32, f"incorrect hash: {replay.path}"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("meta_only", [False, True])
+@REPLAY_FILES
+async def test_8_open_keep_data(datafiles: Path, meta_only: bool) -> None:
+    for replay_fn in datafiles.iterdir():
+        if replay_fn.suffix != ".wotbreplay":
+            continue
+        replay = ReplayFile(replay_fn, keep_data=False)
+        await replay.open(meta_only=meta_only)
+        replay_full = ReplayFile(replay_fn)
+        await replay_full.open()
+
+        assert replay.hash == replay_full.hash, f"hash differs: {replay_fn.name}"
+        assert replay.meta == replay_full.meta, f"meta differs: {replay_fn.name}"
+        assert replay.data == replay_full.data, f"data differs: {replay_fn.name}"
+        assert replay._data is None, f"replay data kept in memory: {replay_fn.name}"
+        with replay.mapped() as data:
+            assert data == replay_full.data, f"mapped data differs: {replay_fn.name}"
+        with replay_full.mapped() as data:
+            assert data == replay_full.data, f"data view differs: {replay_fn.name}"
+        for replay_file in [replay, replay_full, ReplayFile(replay_full.data)]:
+            with replay_file.stream() as stream:
+                assert stream.read() == replay_full.data, (
+                    f"streamed data differs: {replay_fn.name}"
+                )
+
+
+@pytest.mark.asyncio
+@REPLAY_JSON_FILES
+@REPLAY_FILES
+async def test_9_post_replay_stream(datafiles: Path) -> None:
+    replay_fn: Path = datafiles / "20200229_2321__jylpah_E-50_fort.wotbreplay"
+    response: str = replay_fn.with_name(f"{replay_fn.name}.json").read_text()
+    bodies: list[bytes] = list()
+
+    async def handler(request: web.Request) -> web.Response:
+        bodies.append(await request.read())
+        return web.Response(text=response, content_type="application/json")
+
+    data: bytes = replay_fn.read_bytes()
+    async with upload_server(handler) as url:
+        WI = WoTinspector()
+        WI.URL_REPLAY_UL = f"{url}/replay/upload?"
+        try:
+            for replay in [replay_fn, data]:
+                replay_id, replay_json = await WI.post_replay(replay, title="test")
+                assert replay_id is not None, f"could not post replay: {replay_fn}"
+                assert isinstance(replay_json, ReplayJSON), "no ReplayJSON received"
+        finally:
+            await WI.close()
+
+    replay = ReplayFile(data)
+    for body, filename in zip(
+        bodies, [replay_fn.name, f"{replay.hash}.wotbreplay"], strict=True
+    ):
+        assert body == urlencode(
+            {"file": (filename, b64encode(data))}, doseq=True
+        ).encode("ascii"), f"incorrect upload body: {filename}"
+
+
+@pytest.mark.asyncio
+@REPLAY_JSON_FILES
+async def test_10_replay_indexes(datafiles: Path) -> None:
+    for replay_fn in datafiles.glob("*.wotbreplay.json"):
+        replay_json: ReplayJSON | None = await ReplayJSON.open_json(replay_fn)
+        assert replay_json is not None, f"failed to import replay: {replay_fn.name}"
+        replay: Replay | None = Replay.from_ReplayJSON(replay_json)
+        assert replay is not None, f"failed to convert replay: {replay_fn.name}"
+        summary = replay_json.data.summary
+        assert isinstance(summary.details, list), "test replays have full details"
+
+        for detail in summary.details:
+            player: int = detail.dbid
+            ally: bool = player in summary.allies
+            allies, enemies = summary.allies, summary.enemies
+            if not ally:
+                allies, enemies = enemies, allies
+            for r in [replay_json, replay]:
+                assert r.get_allies(player) == allies, f"incorrect allies: {player}"
+                assert r.get_enemies(player) == enemies, f"incorrect enemies: {player}"
+                assert (r.get_team(player) == r.ally_team) == ally, (
+                    f"incorrect team: {player}"
+                )
+                if summary.battle_result == EnumBattleResult.incomplete:
+                    result = EnumBattleResult.incomplete
+                elif summary.winner_team == EnumWinnerTeam.draw:
+                    result = EnumBattleResult.draw
+                elif (summary.battle_result == EnumBattleResult.win) == ally:
+                    result = EnumBattleResult.win
+                else:
+                    result = EnumBattleResult.loss
+                assert r.get_battle_result(player) == result, (
+                    f"incorrect battle result: {player}"
+                )
+            assert replay_json.get_details(player) is detail, "incorrect details"
+            player_data = replay.get_player_data(player)
+            assert player_data is not None and player_data.dbid == player, (
+                f"incorrect player data: {player}"
+            )
+            assert replay.get_platoons(player) == replay_json.get_platoons(player), (
+                f"platoons differ: {player}"
+            )
+            allied_platoons, enemy_platoons = replay_json.get_platoons(player)
+            for squad in allied_platoons.values():
+                assert all(dbid in allies for dbid in squad), "incorrect platoon"
+            for squad in enemy_platoons.values():
+                assert all(dbid in enemies for dbid in squad), "incorrect platoon"
+
+        for r in [replay_json, replay]:
+            assert r.get_team(-1) is None, "unknown player found"
+            assert r.get_battle_result(-1) == EnumBattleResult.incomplete, (
+                "unknown player has a result"
+            )
+            with pytest.raises(ValueError):
+                r.get_allies(-1)
+
+        # copies rebuild the index, in-place changes need 'del player_index'
+        player = replay.players_data[0].dbid
+        copy = replay.model_copy(update={"players_data": replay.players_data[1:]})
+        assert copy.get_player_data(player) is None, "stale index in replay copy"
+        assert replay.get_player_data(player) is not None, "index of original changed"
+        details = summary.details[1:]
+        copy_json = replay_json.model_copy(
+            update={
+                "data": replay_json.data.model_copy(
+                    update={"summary": summary.model_copy(update={"details": details})}
+                )
+            }
+        )
+        assert copy_json.get_details(player) is None, "stale index in ReplayJSON copy"
+        replay.players_data.pop(0)
+        del replay.player_index
+        assert replay.get_player_data(player) is None, "index not rebuilt"
+
+
+def _inverse(value: int) -> float:
+    return 1 / value
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("ordered", [False, True])
+async def test_11_map_executor(ordered: bool) -> None:
+    loop_thread: int = threading.get_ident()
+    item_threads: set[int] = set()
+
+    def items() -> Iterator[int]:
+        for value in range(-5, 6):
+            item_threads.add(threading.get_ident())
+            yield value
+
+    failed: list[int] = list()
+    results: list[float] = list()
+    async for res in map_executor(
+        _inverse,
+        items(),
+        workers=2,
+        ordered=ordered,
+        on_error=lambda item, err: failed.append(item),
+    ):
+        results.append(res)
+    assert failed == [0], f"incorrect failures reported: {failed}"
+    expected: list[float] = [1 / value for value in range(-5, 6) if value != 0]
+    if ordered:
+        assert results == expected, "results not in input order"
+    else:
+        assert sorted(results) == sorted(expected), "incorrect results"
+    assert loop_thread not in item_threads, "generator was iterated in the event loop"
+
+    # collections are iterated directly, failures are logged without on_error
+    results = [res async for res in map_executor(_inverse, [0, 1, 2], ordered=True)]
+    assert results == [1.0, 0.5], f"incorrect results: {results}"
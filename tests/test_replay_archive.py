@@ -0,0 +1,180 @@
+import pytest  # type: ignore
+import os
+from pathlib import Path
+import logging
+import shutil
+
+from blitzmodels import ArchiveEntry, ReplayArchive
+from blitzmodels.replay_archive import ArchiveStatus, ScanStats, walk
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Walk directory trees
+# 2) Scan replays and query the archive
+# 3) Rescan reads only changed files and prunes removed files
+# 4) Archive persists over re-opening
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay",
+    "20200229_2353__jylpah_E-50_fort.wotbreplay",
+    "20200301_0022__jylpah_E-50_rudniki.wotbreplay",
+]
+
+REPLAY_FILES = pytest.mark.datafiles(
+    *[FIXTURE_DIR / replay for replay in REPLAYS],
+    FIXTURE_DIR / "BROKEN.wotbreplay",
+    on_duplicate="overwrite",
+)
+
+
+def make_tree(datafiles: Path) -> Path:
+    """Spread replays to a directory tree: root/{0,1}/{0,1,2}/"""
+    root: Path = datafiles / "archive"
+    for i, replay_fn in enumerate(sorted(datafiles.glob("*.wotbreplay"))):
+        subdir: Path = root / str(i % 2) / str(i % 3)
+        subdir.mkdir(parents=True, exist_ok=True)
+        shutil.move(replay_fn, subdir / replay_fn.name)
+    (root / "other.txt").write_text("not a replay")
+    return root
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_1_walk(datafiles: Path) -> None:
+    root: Path = make_tree(datafiles)
+    files = [file async for file in walk([root], workers=3)]
+    assert sorted(Path(path).name for path, _, _ in files) == sorted(
+        REPLAYS + ["BROKEN.wotbreplay"]
+    ), f"incorrect files: {files}"
+    for path, size, mtime in files:
+        stat = os.stat(path)
+        assert (size, mtime) == (stat.st_size, stat.st_mtime_ns), (
+            f"incorrect size/mtime: {path}"
+        )
+    assert [file async for file in walk([datafiles / "MISSING"])] == [], (
+        "missing directory not skipped"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("processes", [False, True])
+@REPLAY_FILES
+async def test_2_scan_find(datafiles: Path, processes: bool) -> None:
+    root: Path = make_tree(datafiles)
+    async with ReplayArchive() as archive:
+        stats: ScanStats = await archive.scan([root], workers=2, processes=processes)
+        assert stats.files == len(REPLAYS) + 1, f"incorrect file count: {stats}"
+        assert stats.added == len(REPLAYS) + 1, f"incorrect added count: {stats}"
+        assert stats.errors == 1, f"broken replay not detected: {stats}"
+        assert await archive.count() == len(REPLAYS), "incorrect replay count"
+        assert await archive.count(ArchiveStatus.failed) == 1, "broken replay missing"
+
+        entries: list[ArchiveEntry] = [
+            entry
+            async for entry in archive.find(
+                vehicle="E-50", map_name="fort", version="6"
+            )
+        ]
+        assert len(entries) == 2, f"incorrect E-50 @ fort replays: {entries}"
+        times: list[int] = [
+            entry.meta.battleStartTime for entry in entries if entry.meta
+        ]
+        assert len(times) == len(entries), "meta missing"
+        assert times == sorted(times), "replays not ordered by battle start time"
+        for entry in entries:
+            assert entry.meta is not None, "meta missing"
+            assert entry.meta.mapId == 8, f"incorrect mapId: {entry.meta.mapId}"
+            assert (await archive.get(entry.path)) == entry, f"get() failed: {entry}"
+        assert await archive.count(version="6.8") == len(REPLAYS), "version not matched"
+        assert await archive.count(version="6.80") == 0, "version prefix matched"
+        assert await archive.count(version="7") == 0, "incorrect version matched"
+        meta = entries[0].meta
+        assert meta is not None, "meta missing"
+        assert (
+            await archive.count(
+                dbid=meta.dbid,
+                tank_id=meta.vehicleCompDescriptor,
+                since=meta.battleStartTime,
+                until=meta.battleStartTime + 1,
+            )
+            == 1
+        ), "replay not found by dbid, tank_id and time"
+        assert len([entry async for entry in archive.find(limit=3)]) == 3, (
+            "limit not applied"
+        )
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_3_rescan(datafiles: Path) -> None:
+    root: Path = make_tree(datafiles)
+    async with ReplayArchive() as archive:
+        await archive.scan([root])
+        stats: ScanStats = await archive.scan([root])
+        assert stats.unchanged == len(REPLAYS) + 1, f"files re-read: {stats}"
+        assert stats.added == stats.updated == stats.removed == 0, (
+            f"incorrect rescan: {stats}"
+        )
+
+        replays: list[Path] = sorted(root.glob("**/2*.wotbreplay"))
+        changed: Path = replays[0]
+        stat = os.stat(changed)
+        os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        replays[1].unlink()
+        shutil.copy(replays[2], root / "copy.wotbreplay")
+
+        stats = await archive.scan([root])
+        assert (stats.added, stats.updated, stats.removed) == (1, 1, 1), (
+            f"incorrect rescan: {stats}"
+        )
+        assert stats.unchanged == len(REPLAYS) - 1, f"incorrect rescan: {stats}"
+        assert (entry := await archive.get(changed)) is not None, "changed file missing"
+        assert entry.mtime == stat.st_mtime_ns + 10**9, "mtime not updated"
+        assert await archive.get(replays[1]) is None, "removed file not pruned"
+        assert await archive.count() == len(REPLAYS), "incorrect replay count"
+
+        # scanning a sub-directory does not prune files in other directories
+        stats = await archive.scan([root / "0"])
+        assert stats.removed == 0, f"files outside of the root pruned: {stats}"
+        assert await archive.count() == len(REPLAYS), "incorrect replay count"
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_4_persistence(datafiles: Path, tmp_path: Path) -> None:
+    root: Path = make_tree(datafiles)
+    db: Path = tmp_path / "archive.db"
+    async with ReplayArchive(db) as archive:
+        await archive.scan([root])
+    async with ReplayArchive(db) as archive:
+        stats: ScanStats = await archive.scan([root])
+        assert stats.unchanged == len(REPLAYS) + 1, f"archive not persisted: {stats}"
+        assert await archive.count(map_name="fort") == 2, "incorrect replay count"
@@ -0,0 +1,332 @@
+import pytest  # type: ignore
+from pathlib import Path
+import logging
+import threading
+
+from blitzmodels import ReplayFile, ReplayIndex, UploadQueue
+from blitzmodels.replay_index import QueueStatus, UploadStatus, WIApi
+from blitzmodels.wotinspector.wi_apiv1 import ReplayJSON, WoTinspector
+from blitzmodels.wotinspector.wi_apiv2 import (
+    Replay,
+    ReplayPostResult,
+    WoTinspector as WoTinspectorV2,
+)
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Record uploads and query them by hash and by battle
+# 2) Query which replays are new in bulk. Replays are hashed off the event loop
+# 3) Index persists over re-opening
+# 4) post_replay() does not post replays found in the index
+# 5) Upload queue
+# 6) post_replays() posts replays concurrently and resumes the upload queue
+# 7) post_replays() reports indexed replays as duplicates and continues on errors
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay",
+    "20200229_2337__jylpah_E-50_skit.wotbreplay",
+    "20200229_2341__jylpah_E-50_erlenberg.wotbreplay",
+]
+
+REPLAY_FILES = pytest.mark.datafiles(
+    *[FIXTURE_DIR / replay for replay in REPLAYS],
+    *[FIXTURE_DIR / f"{replay}.json" for replay in REPLAYS],
+    on_duplicate="overwrite",
+)
+
+
+async def open_replays(datafiles: Path) -> list[ReplayFile]:
+    replays: list[ReplayFile] = list()
+    for replay_fn in sorted(datafiles.glob("*.wotbreplay")):
+        replay = ReplayFile(replay_fn)
+        await replay.open(meta_only=True)
+        replays.append(replay)
+    return replays
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_1_replay_index(datafiles: Path) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    async with ReplayIndex() as index:
+        replay: ReplayFile = replays[0]
+        assert not await index.is_uploaded(replay, WIApi.v2), "empty index"
+
+        await index.add(replay, WIApi.v2, status=UploadStatus.failed)
+        assert not await index.is_uploaded(replay, WIApi.v2), "failed upload found"
+        assert (upload := await index.get(replay.hash, WIApi.v2)) is not None, (
+            "failed upload not recorded"
+        )
+        assert upload.status == UploadStatus.failed, f"incorrect status: {upload}"
+
+        await index.add(replay, WIApi.v2, replay_id="id2", response="{}")
+        assert await index.is_uploaded(replay, WIApi.v2), "upload not found"
+        assert not await index.is_uploaded(replay, WIApi.v1), "upload found for v1"
+        assert (upload := await index.get(replay.hash, WIApi.v2)) is not None, (
+            "upload not found by hash"
+        )
+        assert upload.replay_id == "id2", f"incorrect replay_id: {upload.replay_id}"
+        assert upload.arena_unique_id == replay.meta.arenaUniqueId, (
+            f"incorrect arenaUniqueId: {upload.arena_unique_id}"
+        )
+        assert upload.path == str(replay.path), f"incorrect path: {upload.path}"
+        assert (
+            battle := await index.get_battle(
+                replay.meta.arenaUniqueId, replay.meta.dbid, WIApi.v2
+            )
+        ) == upload, f"upload not found by battle: {battle}"
+        assert await index.count(WIApi.v2) == 1, "upload recorded twice"
+
+        # another copy of the same replay with different content
+        copy_fn: Path = datafiles / "copy.wotbreplay"
+        copy_fn.write_bytes(replay.data + b"\0")
+        copy = ReplayFile(copy_fn)
+        await copy.open()
+        assert copy.hash != replay.hash, "test replay copy has the same hash"
+        assert await index.is_uploaded(copy, WIApi.v2), "battle not matched"
+        assert await index.is_uploaded(ReplayFile(replay.data), WIApi.v2), (
+            "replay without meta not matched by hash"
+        )
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_2_new_replays(datafiles: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    threads: set[int] = set()
+    load_data = ReplayFile._load_data
+
+    def _load_data(self: ReplayFile) -> bytes:
+        threads.add(threading.get_ident())
+        return load_data(self)
+
+    monkeypatch.setattr(ReplayFile, "_load_data", _load_data)
+    async with ReplayIndex() as index:
+        assert await index.new_replays(replays) == replays, "empty index"
+        assert len(threads) > 0, "replays not hashed"
+        assert threading.get_ident() not in threads, "replays hashed in event loop"
+        for replay in replays[::2]:
+            await index.add(replay, WIApi.v2, replay_id=replay.hash)
+        await index.add(replays[1], WIApi.v2, status=UploadStatus.failed)
+        await index.add(replays[3], WIApi.v1, replay_id=replays[3].hash)
+
+        assert await index.new_replays(replays, WIApi.v2) == replays[1::2], (
+            "incorrect new replays for v2"
+        )
+        assert (
+            await index.new_replays(replays, WIApi.v1) == replays[:3] + replays[4:]
+        ), "incorrect new replays for v1"
+        hashes: list[str] = [replay.hash for replay in replays]
+        assert await index.new_hashes(hashes, WIApi.v2) == hashes[1::2], (
+            "incorrect new hashes"
+        )
+        assert await index.count(WIApi.v2, UploadStatus.uploaded) == len(
+            replays[::2]
+        ), "incorrect count of uploaded replays"
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_3_persistence(datafiles: Path, tmp_path: Path) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    db: Path = tmp_path / "replays.db"
+    async with ReplayIndex(db) as index:
+        for replay in replays:
+            await index.add(replay, WIApi.v1, replay_id=replay.hash)
+    async with ReplayIndex(db) as index:
+        assert await index.new_replays(replays, WIApi.v1) == [], "uploads not persisted"
+        assert await index.count(WIApi.v1) == len(replays), "incorrect count"
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_4_post_replay_indexed(datafiles: Path) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    WI = WoTinspector()
+    try:
+        async with ReplayIndex() as index:
+            for replay in replays:
+                assert replay.path is not None, "replay path missing"
+                json_fn = replay.path.with_name(f"{replay.path.name}.json")
+                await index.add(
+                    replay,
+                    WIApi.v1,
+                    replay_id=replay.hash,
+                    response=json_fn.read_text(),
+                )
+            for replay in replays:
+                assert replay.path is not None, "replay path missing"
+                replay_id, replay_json = await WI.post_replay(
+                    replay.path, replay_index=index
+                )
+                assert replay_id == replay.hash, f"incorrect replay_id: {replay_id}"
+                assert isinstance(replay_json, ReplayJSON), (
+                    f"indexed response not returned: {replay.path.name}"
+                )
+    finally:
+        await WI.close()
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_5_upload_queue(datafiles: Path, tmp_path: Path) -> None:
+    replay_fns: list[Path] = sorted(datafiles.glob("*.wotbreplay"))
+    db: Path = tmp_path / "queue.db"
+    async with UploadQueue(db) as queue:
+        await queue.add(replay_fns)
+        await queue.add(replay_fns[:2])
+        assert await queue.count() == len(replay_fns), "files queued twice"
+        await queue.done(replay_fns[0], replay_id="id")
+        await queue.failed(replay_fns[1], error="upload failed")
+        assert await queue.status(replay_fns[0]) == QueueStatus.done, "incorrect status"
+        assert await queue.status(datafiles / "other.wotbreplay") is None, (
+            "file not queued found"
+        )
+    async with UploadQueue(db) as queue:
+        assert await queue.pending() == [str(path) for path in replay_fns[2:]], (
+            "incorrect pending files"
+        )
+        assert await queue.pending(retry_failed=True) == [
+            str(path) for path in replay_fns[1:]
+        ], "incorrect pending files with retry_failed=True"
+        assert await queue.count(QueueStatus.failed) == 1, "incorrect failed count"
+    async with UploadQueue(db, api=WIApi.v1) as queue:
+        assert await queue.count() == 0, "queue is not per API"
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_6_post_replays(datafiles: Path, tmp_path: Path) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    replay_fns: list[Path] = [replay.path for replay in replays if replay.path]
+    broken: Path = datafiles / "BROKEN.wotbreplay"
+    broken.write_bytes(b"not a zip file")
+    response: str = Replay.example_instance().model_dump_json(by_alias=True)
+    WI = WoTinspectorV2()
+    try:
+        async with ReplayIndex() as index, UploadQueue(tmp_path / "q.db") as queue:
+            for replay in replays:
+                await index.add(
+                    replay, WIApi.v2, replay_id=replay.hash, response=response
+                )
+            # earlier run was interrupted
+            await queue.add(replay_fns[:2])
+            await queue.done(replay_fns[0], replay_id="done")
+
+            results: list[ReplayPostResult] = [
+                res
+                async for res in WI.post_replays(
+                    [*replay_fns, broken, replays[-1].data],
+                    workers=3,
+                    upload_queue=queue,
+                    replay_index=index,
+                )
+            ]
+            assert len(results) == len(replay_fns) + 1, f"incorrect results: {results}"
+            posted: list[Path | str | bytes] = [res.replay for res in results]
+            assert replay_fns[0] not in posted, "uploaded file posted again"
+            assert str(replay_fns[1]) in posted, "pending file not resumed"
+            for res in results:
+                if res.replay == broken:
+                    assert res.result is None and res.error is not None, (
+                        f"broken replay posted: {res}"
+                    )
+                else:
+                    assert isinstance(res.result, Replay), f"replay not posted: {res}"
+            assert await queue.count(QueueStatus.pending) == 0, "files left pending"
+            assert await queue.count(QueueStatus.done) == len(replay_fns), (
+                "incorrect number of posted files"
+            )
+            assert await queue.status(broken) == QueueStatus.failed, (
+                "failed upload not recorded"
+            )
+            assert [
+                res async for res in WI.post_replays(replay_fns, upload_queue=queue)
+            ] == [], "posted files posted again"
+    finally:
+        await WI.close()
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_7_post_replays_duplicates_errors(
+    datafiles: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    replays: list[ReplayFile] = await open_replays(datafiles)
+    replay_fns: list[Path] = [replay.path for replay in replays if replay.path]
+    response: str = Replay.example_instance().model_dump_json(by_alias=True)
+    WI = WoTinspectorV2()
+
+    async def post_replay(replay: ReplayFile, **kwargs) -> Replay | None:
+        if replay.path == replay_fns[2]:
+            raise RuntimeError("connection lost")
+        return Replay.parse_str(response)
+
+    monkeypatch.setattr(WI, "post_replay", post_replay)
+    try:
+        async with ReplayIndex() as index, UploadQueue(tmp_path / "q.db") as queue:
+            # uploaded without a stored response
+            await index.add(replays[0], WIApi.v2, replay_id="id0")
+            await index.add(replays[1], WIApi.v2, replay_id="id1", response=response)
+
+            results: dict[Path | str | bytes, ReplayPostResult] = {
+                res.replay: res
+                async for res in WI.post_replays(
+                    replay_fns, workers=2, upload_queue=queue, replay_index=index
+                )
+            }
+            assert len(results) == len(replay_fns), f"incorrect results: {results}"
+            for replay_fn in replay_fns[:2]:
+                assert results[replay_fn].duplicate, f"not a duplicate: {replay_fn}"
+                assert results[replay_fn].error is None, (
+                    f"duplicate failed: {replay_fn}"
+                )
+            assert results[replay_fns[0]].result is None, "missing response returned"
+            assert isinstance(results[replay_fns[1]].result, Replay), (
+                "indexed response not returned"
+            )
+            failed: ReplayPostResult = results[replay_fns[2]]
+            assert failed.result is None and not failed.duplicate, (
+                f"failed upload not reported: {failed}"
+            )
+            assert failed.error is not None and "RuntimeError" in failed.error, (
+                f"incorrect error: {failed.error}"
+            )
+            for replay_fn in replay_fns[3:]:
+                assert isinstance(results[replay_fn].result, Replay), (
+                    f"replay not posted after a failed upload: {replay_fn}"
+                )
+            assert await queue.count(QueueStatus.failed) == 1, "incorrect failed count"
+            assert await queue.status(replay_fns[0]) == QueueStatus.done, (
+                "duplicate not marked done"
+            )
+    finally:
+        await WI.close()
@@ -0,0 +1,204 @@
+import pytest  # type: ignore
+from io import BytesIO
+from pathlib import Path
+import logging
+from zipfile import ZipFile
+
+from blitzmodels import ReplayFile
+from blitzmodels.replay_packets import (
+    PacketHeader,
+    PacketReader,
+    PacketType,
+    entity_call,
+)
+from blitzmodels.wotinspector import Shot
+from blitzmodels.wotinspector.shots import read_shots, shots_from_packets
+from blitzmodels.wotinspector.wi_apiv1 import ReplayJSON
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Stream packets from data.wotreplay
+# 2) Filter packets by type and read in small chunks
+# 3) Reject truncated and invalid packet streams
+# 4) Extract shots and compare to WoTinspector API v1 replays
+# 5) Skip truncated entity calls when extracting shots
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+
+REPLAYS: list[str] = [
+    "20200229_2321__jylpah_E-50_fort.wotbreplay",
+    "20200229_2324__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2328__jylpah_E-50_grossberg.wotbreplay",
+    "20200229_2332__jylpah_E-50_lumber.wotbreplay",
+    "20200229_2337__jylpah_E-50_skit.wotbreplay",
+    "20200229_2341__jylpah_E-50_erlenberg.wotbreplay",
+    "20200229_2344__jylpah_E-50_rock.wotbreplay",
+]
+
+REPLAY_FILES = pytest.mark.datafiles(
+    *[FIXTURE_DIR / replay for replay in REPLAYS],
+    *[FIXTURE_DIR / f"{replay}.json" for replay in REPLAYS],
+    on_duplicate="overwrite",
+)
+
+
+def read_data(replay_fn: Path) -> bytes:
+    with ZipFile(replay_fn) as zreplay:
+        return zreplay.read("data.wotreplay")
+
+
+def packets(data: bytes, **kwargs) -> list[tuple[PacketHeader, bytes]]:
+    return [
+        (header, bytes(payload))
+        for header, payload in PacketReader(BytesIO(data), **kwargs).packets()
+    ]
+
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_1_packets(datafiles: Path) -> None:
+    for replay_fn in sorted(datafiles.glob("*.wotbreplay")):
+        replay_file = ReplayFile(replay_fn, keep_data=False)
+        await replay_file.open(meta_only=True)
+        reader = PacketReader(BytesIO(read_data(replay_fn)))
+        assert replay_file.meta.version.startswith(reader.version), (
+            f"incorrect version: {reader.version}"
+        )
+        count: int = 0
+        header: PacketHeader | None = None
+        for header, payload in replay_file.packets():
+            assert len(payload) == header.size, f"incorrect payload size: {header}"
+            if header.type == PacketType.entity_method:
+                call, args = entity_call(payload)
+                assert len(args) == call.size, f"incorrect args size: {call}"
+            count += 1
+        assert header is not None and header.type == PacketType.end, (
+            f"packet stream did not end with an end packet: {replay_fn.name}"
+        )
+        assert count > 1000, f"too few packets: {count}"
+
+        in_memory = ReplayFile(replay_fn.read_bytes())
+        assert [
+            (header, bytes(payload)) for header, payload in in_memory.packets()
+        ] == packets(read_data(replay_fn)), "in-memory replay packets differ"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 13, 1024])
+@REPLAY_FILES
+def test_2_filter_packets(datafiles: Path, chunk_size: int) -> None:
+    replay_fn: Path = sorted(datafiles.glob("*.wotbreplay"))[0]
+    data: bytes = read_data(replay_fn)
+    all_packets = packets(data)
+    assert packets(data, chunk_size=chunk_size) == all_packets, (
+        f"packets differ with chunk_size={chunk_size}"
+    )
+    types: set[int] = {PacketType.entity_create, PacketType.entity_method}
+    filtered = [
+        (header, bytes(payload))
+        for header, payload in PacketReader(
+            BytesIO(data), chunk_size=chunk_size
+        ).packets(types)
+    ]
+    assert filtered == [packet for packet in all_packets if packet[0].type in types], (
+        f"incorrect filtered packets with chunk_size={chunk_size}"
+    )
+
+
+@REPLAY_FILES
+def test_3_invalid_packets(datafiles: Path) -> None:
+    data: bytes = read_data(sorted(datafiles.glob("*.wotbreplay"))[0])
+    for invalid in [b"", b"\0" * 100, data[:20]]:
+        with pytest.raises(ValueError):
+            PacketReader(BytesIO(invalid))
+    for types in [None, {PacketType.end}]:
+        with pytest.raises(ValueError):
+            for _ in PacketReader(BytesIO(data[:-5])).packets(types):
+                pass
+    with pytest.raises(ValueError):
+        entity_call(memoryview(b"\0" * 11))
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_4_shots(datafiles: Path) -> None:
+    for replay_fn in sorted(datafiles.glob("*.wotbreplay")):
+        replay_file = ReplayFile(replay_fn)
+        await replay_file.open()
+        replay_json: ReplayJSON | None = await ReplayJSON.open_json(
+            replay_fn.with_name(f"{replay_fn.name}.json")
+        )
+        assert replay_json is not None, f"could not open {replay_fn.name}.json"
+        summary = replay_json.data.summary
+        assert isinstance(summary.details, list), "replay has no player details"
+
+        shots: list[Shot] = read_shots(replay_file)
+        assert len(shots) > 0, f"no shots found: {replay_fn.name}"
+        players: set[int] = {detail.dbid for detail in summary.details}
+        for shot in shots:
+            assert shot.shooter in players, f"unknown shooter: {shot.shooter}"
+            assert shot.target in players or shot.target == 0, (
+                f"unknown target: {shot.target}"
+            )
+            assert shot.damage == 0 or shot.has_damage, f"incorrect shot: {shot}"
+        for detail in summary.details:
+            damage_made: int = sum(
+                shot.damage for shot in shots if shot.shooter == detail.dbid
+            )
+            damage_received: int = sum(
+                shot.damage for shot in shots if shot.target == detail.dbid
+            )
+            assert damage_made <= detail.damage_made, (
+                f"{replay_fn.name}: too much damage made: {damage_made}"
+            )
+            assert damage_received <= detail.damage_received, (
+                f"{replay_fn.name}: too much damage received: {damage_received}"
+            )
+        protagonist: int = summary.protagonist
+        assert any(shot.shooter == protagonist and shot.damage > 0 for shot in shots), (
+            f"protagonist's damaging shots not found: {replay_fn.name}"
+        )
+
+
+@pytest.mark.datafiles(FIXTURE_DIR / REPLAYS[0])
+def test_5_shots_truncated(datafiles: Path) -> None:
+    stream: list[tuple[PacketHeader, bytes]] = packets(
+        read_data(datafiles / REPLAYS[0])
+    )
+    shots: list[Shot] = shots_from_packets(stream)
+    assert len(shots) > 0, "no shots found"
+
+    malformed: list[tuple[PacketHeader, bytes]] = list()
+    for header, payload in stream:
+        if header.type == PacketType.entity_method:
+            call, args = entity_call(memoryview(payload))
+            # no arguments, truncated arguments and truncated header
+            malformed.append((header, payload[:8] + b"\0" * 4))
+            malformed.append((header, payload[: 12 + call.size // 2]))
+            malformed.append((header, payload[:6]))
+        elif header.type == PacketType.entity_create:
+            malformed.append((header, payload[:4]))
+        malformed.append((header, payload))
+    assert shots_from_packets(malformed) == shots, "truncated packets not skipped"
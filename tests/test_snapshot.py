@@ -0,0 +1,189 @@
+import pytest  # type: ignore
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import logging
+
+from blitzmodels import LazySnapshot, Maps, Tank, WGApiWoTBlitzTankopedia
+from blitzmodels.snapshot import (
+    ENV_CACHE_DIR,
+    load_snapshot,
+    model_fingerprint,
+    snapshot_path,
+)
+
+logger = logging.getLogger()
+error = logger.error
+message = logger.warning
+verbose = logger.info
+debug = logger.debug
+
+########################################################
+#
+# Test Plan
+#
+########################################################
+
+# 1) Create snapshots of the packaged Tankopedia and Maps
+# 2) Load snapshots and compare to parsed JSON
+# 3) Snapshot is re-created when the source changes
+# 4) Lazy loading
+# 5) Process-wide default instances: caching, refresh and copies
+# 6) Share default instance with worker processes
+# 7) Snapshots are opt-in and keyed by the model fingerprint
+
+########################################################
+#
+# Fixtures
+#
+########################################################
+
+FIXTURE_DIR = Path(__file__).parent
+TANKOPEDIA_JSON: str = "01_Tankopedia.json"
+TANKOPEDIA = pytest.mark.datafiles(
+    FIXTURE_DIR / TANKOPEDIA_JSON, on_duplicate="overwrite"
+)
+
+########################################################
+#
+# Tests
+#
+########################################################
+
+
+@pytest.mark.parametrize("model", [WGApiWoTBlitzTankopedia, Maps])
+def test_1_snapshot_default(tmp_path: Path, model) -> None:
+    source: Path = model.default_path()
+    assert (parsed := model.open_default(snapshot=False)) is not None, (
+        f"could not parse {source.name}"
+    )
+    path: Path = snapshot_path(source, source.read_bytes(), model, tmp_path)
+    assert not path.exists(), "snapshot should not exist yet"
+    assert (
+        created := load_snapshot(source, model.parse_str, model, tmp_path)
+    ) is not None, f"could not create snapshot of {source.name}"
+    assert path.is_file(), "snapshot was not written"
+    assert (
+        loaded := load_snapshot(source, model.parse_str, model, tmp_path)
+    ) is not None, f"could not load snapshot of {source.name}"
+    assert loaded is not created, "snapshot should be loaded as a new instance"
+    assert loaded == parsed, f"snapshot differs from parsed {source.name}"
+    assert loaded.model_dump() == parsed.model_dump(), "snapshot export differs"
+
+
+@TANKOPEDIA
+def test_2_snapshot_indexes(tmp_path: Path, datafiles: Path) -> None:
+    source: Path = datafiles / TANKOPEDIA_JSON
+    model = WGApiWoTBlitzTankopedia
+    load_snapshot(source, model.parse_str, model, tmp_path)
+    assert (
+        tankopedia := load_snapshot(source, model.parse_str, model, tmp_path)
+    ) is not None, "could not load snapshot"
+    assert (parsed := model.parse_str(source.read_text())) is not None, "parse failed"
+    assert tankopedia.tank_ids() == parsed.tank_ids(), "tank_ids differ"
+    for tier in range(1, 11):
+        assert tankopedia.get_tank_ids(tier=tier) == parsed.get_tank_ids(tier=tier), (
+            f"tier index differs: tier={tier}"
+        )
+    codes: dict[str, list[Tank]] = dict()
+    for tank in parsed.data.values():
+        assert tankopedia.get(tank.tank_id) == tank, f"tank differs: {tank.tank_id}"
+        if tank.code is not None:
+            codes.setdefault(tank.code, list()).append(tank)
+    for code, tanks in codes.items():
+        # the last tank in data order wins if several tanks share a code
+        assert tankopedia.by_code(code) == tanks[-1], f"code differs: {code}"
+    shared: list[Tank] = next(tanks for tanks in codes.values() if len(tanks) > 1)
+    parsed.pop(shared[-1].tank_id)
+    assert parsed.by_code(shared[0].code) == shared[-2], "shared code lost in pop()"
+    parsed.pop(shared[0].tank_id)
+    assert parsed.by_code(shared[0].code) == shared[-2], "pop() removed other code"
+
+    # changed source file gets a new snapshot
+    tank = tankopedia.pop(tankopedia.tank_ids()[0])
+    source.write_text(tankopedia.model_dump_json(by_alias=True))
+    assert (
+        changed := load_snapshot(source, model.parse_str, model, tmp_path)
+    ) is not None, "could not load changed tankopedia"
+    assert tank.tank_id not in changed, "stale snapshot loaded"
+    assert len(list(tmp_path.glob("*.pickle"))) == 2, "snapshot not created"
+
+
+def test_3_lazy_snapshot() -> None:
+    tankopedia: LazySnapshot[WGApiWoTBlitzTankopedia] = LazySnapshot(
+        WGApiWoTBlitzTankopedia.open_default
+    )
+    assert not tankopedia.is_loaded, "snapshot loaded too early"
+    assert len(tankopedia()) > 500, "could not load packaged tankopedia"
+    assert tankopedia.is_loaded, "snapshot not loaded"
+    assert tankopedia() is tankopedia(), "snapshot loaded twice"
+
+
+def _tank_count(name: str) -> int:
+    """Load default tankopedia from shared memory in a worker process"""
+    WGApiWoTBlitzTankopedia.attach_default(name)
+    return len(WGApiWoTBlitzTankopedia.default())
+
+
+@pytest.mark.parametrize("model", [WGApiWoTBlitzTankopedia, Maps])
+def test_4_default(model) -> None:
+    default = model.default(copy=False)
+    assert default is model.default(copy=False), "default instance is not cached"
+    assert (copy := model.default()) is not default, "copy not returned"
+    assert copy == default, "copy differs from the default instance"
+    assert model.default() is not copy, "copy returned twice"
+
+    refreshed = model.refresh_default()
+    assert refreshed is not default, "refresh did not replace the default instance"
+    assert refreshed is model.default(copy=False), "refreshed instance is not cached"
+    assert refreshed == default, "refreshed instance differs"
+
+
+def test_5_default_copy_on_write() -> None:
+    default = WGApiWoTBlitzTankopedia.default(copy=False)
+    tankopedia = WGApiWoTBlitzTankopedia.default()
+    tank_id: int = tankopedia.tank_ids()[0]
+    tankopedia.pop(tank_id)
+    assert tank_id not in tankopedia, "tank not removed from the copy"
+    assert tank_id in WGApiWoTBlitzTankopedia.default(), "modification leaked to get()"
+    assert tank_id in default, "modifying the copy changed the default instance"
+    assert default.get(tank_id) is WGApiWoTBlitzTankopedia.default(copy=False).get(
+        tank_id
+    ), "default instance changed"
+
+    maps = Maps.default()
+    map_id: int = next(iter(maps.values())).id
+    maps.pop(map_id)
+    assert map_id in Maps.default().root, "modification of maps leaked to get()"
+
+
+def test_6_default_shared_memory() -> None:
+    name: str = WGApiWoTBlitzTankopedia.share_default()
+    try:
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            counts: list[int] = list(pool.map(_tank_count, [name] * 4))
+    finally:
+        WGApiWoTBlitzTankopedia.unshare_default()
+    assert counts == [len(WGApiWoTBlitzTankopedia.default())] * 4, (
+        "workers did not load the shared tankopedia"
+    )
+
+
+@pytest.mark.parametrize("model", [WGApiWoTBlitzTankopedia, Maps])
+def test_7_snapshot_opt_in(tmp_path: Path, monkeypatch, model) -> None:
+    source: Path = model.default_path()
+    path: Path = snapshot_path(source, source.read_bytes(), model, tmp_path)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    monkeypatch.delenv(ENV_CACHE_DIR, raising=False)
+    assert model.open_default() is not None, f"could not open {source.name}"
+    assert not (tmp_path / "xdg").exists(), "snapshot written without opt-in"
+
+    monkeypatch.setenv(ENV_CACHE_DIR, str(tmp_path))
+    assert model.open_default() is not None, f"could not open {source.name}"
+    assert path.is_file(), "snapshot not written to BLITZMODELS_CACHE_DIR"
+
+    assert model_fingerprint(model) != model_fingerprint(Tank), (
+        "models have the same fingerprint"
+    )
+    assert model_fingerprint(model) == model_fingerprint(model), (
+        "fingerprint is not stable"
+    )
@@ -2,6 +2,7 @@ import pytest  # type: ignore
 from os.path import basename
 from pathlib import Path
 import aiofiles
+import pyarrow  # type: ignore
 from pydantic import RootModel
 from random import shuffle
 from typing import List
@@ -449,3 +450,204 @@ def test_15_WGApiTankopedia_default() -> None:
     )
     assert len(tankopedia) > 0, "packaged tankopedia is empty"
     assert len(tankopedia) > 500, "packaged tankopedia does not have enough tanks"
+
+
+@pytest.mark.parametrize(
+    "nation,tank_type,tier,is_premium",
+    [
+        ("usa", "heavy", 8, True),
+        (EnumNation.germany, EnumVehicleTypeStr.tank_destroyer, "X", None),
+        (None, "mt", [8, 9, 10], False),
+        (["ussr", "china"], None, None, True),
+        (None, None, None, None),
+    ],
+)
+def test_16_WGApiTankopedia_get_tank_ids(nation, tank_type, tier, is_premium) -> None:
+    assert (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is not None, (
+        "could not open packaged tankopedia"
+    )
+
+    def scan() -> set[int]:
+        """brute-force reference"""
+        nations: set[EnumNation] | None = None
+        if nation is not None:
+            nations = {
+                EnumNation[n] if isinstance(n, str) else n
+                for n in (nation if isinstance(nation, list) else [nation])
+            }
+        tiers: set[int] | None = None
+        if tier is not None:
+            tiers = {
+                EnumVehicleTier.read_tier(t) if isinstance(t, str) else t
+                for t in (tier if isinstance(tier, list) else [tier])
+            }
+        tt: EnumVehicleTypeStr | None = None
+        if isinstance(tank_type, EnumVehicleTypeStr):
+            tt = tank_type
+        elif tank_type is not None:
+            tt = EnumVehicleTypeStr.from_str(tank_type)
+        return {
+            tank.tank_id
+            for tank in tankopedia.data.values()
+            if (nations is None or tank.nation in nations)
+            and (tt is None or tank.type == tt)
+            and (tiers is None or tank.tier in tiers)
+            and (is_premium is None or tank.is_premium == is_premium)
+        }
+
+    tank_ids: set[int] = tankopedia.get_tank_ids(
+        nation=nation, tank_type=tank_type, tier=tier, is_premium=is_premium
+    )
+    assert tank_ids == scan(), "get_tank_ids() does not match brute-force search"
+
+    # test index maintenance
+    for tank_id in list(tank_ids)[:5]:
+        tank: Tank = tankopedia.pop(tank_id)
+        assert tank_id not in tankopedia.get_tank_ids(
+            nation=nation, tank_type=tank_type, tier=tier, is_premium=is_premium
+        ), f"popped tank_id={tank_id} still in the index"
+        tankopedia.add(tank)
+    assert tank_ids == tankopedia.get_tank_ids(
+        nation=nation, tank_type=tank_type, tier=tier, is_premium=is_premium
+    ), "index is not consistent after pop() & add()"
+
+
+def test_17_WGApiTankopedia_get_tank_ids_fail() -> None:
+    assert (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is not None, (
+        "could not open packaged tankopedia"
+    )
+    for kwargs in [{"nation": "atlantis"}, {"tier": 11}, {"tank_type": "spg"}]:
+        with pytest.raises(ValueError):
+            tankopedia.get_tank_ids(**kwargs)  # type: ignore
+
+
+def test_18_WGApiTankopedia_tank_ids() -> None:
+    assert (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is not None, (
+        "could not open packaged tankopedia"
+    )
+    tank_ids: tuple[int, ...] = tankopedia.tank_ids()
+    assert list(tank_ids) == sorted(int(key) for key in tankopedia.data.keys()), (
+        "tank_ids() are not sorted numerically"
+    )
+    assert [tank.tank_id for tank in tankopedia] == list(tank_ids), (
+        "tankopedia is not iterated in tank_id order"
+    )
+    assert tankopedia.tank_ids() is tank_ids, "tank_id order is not cached"
+
+    start: int = tank_ids[len(tank_ids) // 4]
+    stop: int = tank_ids[len(tank_ids) // 2] + 1
+    assert list(tankopedia.tank_ids_range(start, stop)) == [
+        tank_id for tank_id in tank_ids if start <= tank_id < stop
+    ], "incorrect tank_ids_range()"
+    assert [tank.tank_id for tank in tankopedia.tanks_range(stop=stop)] == [
+        tank_id for tank_id in tank_ids if tank_id < stop
+    ], "incorrect tanks_range()"
+
+    # order is updated on add() and pop()
+    tank: Tank = tankopedia.pop(start)
+    assert start not in tankopedia.tank_ids(), "popped tank_id still in the order"
+    tankopedia.add(tank)
+    assert tankopedia.tank_ids() == tank_ids, "tank_id order differs after re-adding"
+    tank = Tank(tank_id=max(tank_ids) + 1, name="new tank")
+    tankopedia.add(tank)
+    assert tankopedia.tank_ids()[-1] == tank.tank_id, "added tank_id not last"
+
+    # cached order does not affect equality
+    parsed = WGApiWoTBlitzTankopedia.parse_str(tankopedia.model_dump_json())
+    assert parsed is not None, "could not parse exported tankopedia"
+    assert parsed == tankopedia, "cached tank_ids made equal tankopedias differ"
+
+
+def test_19_WGApiTankopedia_get() -> None:
+    assert (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is not None, (
+        "could not open packaged tankopedia"
+    )
+    for key, tank in tankopedia.data.items():
+        tank_id: int = int(key)
+        assert tankopedia.get(tank_id) is tank, f"get() failed: tank_id={tank_id}"
+        assert tankopedia[tank_id] is tank, f"tankopedia[int] failed: {tank_id}"
+        assert tankopedia[key] is tank, f"tankopedia[str] failed: {key}"
+        assert tank_id in tankopedia, f"tank_id={tank_id} not in tankopedia"
+
+    assert tankopedia.get(-1) is None, "get() should return None for missing tanks"
+    with pytest.raises(KeyError):
+        tankopedia[-1]
+    tank_ids: list[int] = list(tankopedia.tank_ids()[:10]) + [-1]
+    tanks = tankopedia.get_many(tank_ids)
+    assert [tank.tank_id if tank is not None else -1 for tank in tanks] == tank_ids, (
+        "get_many() failed"
+    )
+
+    # wire format keeps string keys
+    tank = tankopedia.pop(tank_ids[0])
+    tankopedia.add(tank)
+    parsed = WGApiWoTBlitzTankopedia.parse_str(
+        tankopedia.model_dump_json(by_alias=True)
+    )
+    assert parsed is not None, "could not parse exported tankopedia"
+    assert all(isinstance(key, str) for key in parsed.data.keys()), (
+        "tankopedia data keys must be strings"
+    )
+    assert parsed.tank_ids() == tankopedia.tank_ids(), "export/import failed"
+    assert parsed.get(tank_ids[0]) == tank, "tank lost in export/import"
+
+    with pytest.raises(KeyError):
+        tankopedia["not a tank_id"]
+
+    # assigning data rebuilds the store and the indexes
+    tier10: set[int] = set(tankopedia.get_tank_ids(tier=10))
+    tankopedia.data = {
+        key: tank for key, tank in tankopedia.data.items() if tank.tier < 10
+    }
+    assert len(tankopedia.get_tank_ids(tier=10)) == 0, "tier index not rebuilt"
+    assert all(tank_id not in tankopedia for tank_id in tier10), "store not rebuilt"
+
+    # direct additions to data are detected
+    tank = Tank(tank_id=tankopedia.tank_ids()[-1] + 1, name="new tank", tier=10)
+    tankopedia.data[str(tank.tank_id)] = tank
+    assert tankopedia[tank.tank_id] is tank, "tank added to data not found"
+    assert tankopedia.get_tank_ids(tier=10) == {tank.tank_id}, "index not rebuilt"
+
+
+def test_20_WGApiTankopedia_lookup_join() -> None:
+    assert (tankopedia := WGApiWoTBlitzTankopedia.open_default()) is not None, (
+        "could not open packaged tankopedia"
+    )
+    table: pyarrow.Table = tankopedia.arrow_table()
+    assert table.num_rows == len(tankopedia), "incorrect number of rows"
+    assert table.column("tank_id").to_pylist() == list(tankopedia.tank_ids()), (
+        "arrow table is not sorted by tank_id"
+    )
+
+    tank_ids: list[int] = list(tankopedia.tank_ids())
+    tank_ids = tank_ids + [0, -1, tank_ids[-1] + 1] + tank_ids[:10]
+    stats = pyarrow.table(
+        {
+            "tank_id": pyarrow.array(tank_ids, type=pyarrow.int32()),
+            "all.battles": pyarrow.array(range(len(tank_ids)), type=pyarrow.int32()),
+        }
+    )
+    joined = tankopedia.join(stats)
+    assert joined.num_rows == stats.num_rows, "join changed the number of rows"
+    for row in joined.to_pylist():
+        if (tank := tankopedia.get(row["tank_id"])) is None:
+            assert row["tier"] is None, f"unknown tank_id={row['tank_id']} joined"
+            continue
+        assert row["tier"] == tank.tier, f"incorrect tier: tank_id={tank.tank_id}"
+        assert row["type"] == tank.type.value, f"incorrect type: {tank.tank_id}"
+        assert row["nation"] == tank.nation, f"incorrect nation: {tank.tank_id}"
+        assert row["is_premium"] == tank.is_premium, (
+            f"incorrect premium: {tank.tank_id}"
+        )
+
+    tiers = tankopedia.lookup(tank_ids[:10], columns=["tier"])["tier"]
+    assert tiers.to_pylist() == [
+        tankopedia[tank_id].tier for tank_id in tank_ids[:10]
+    ], "lookup() failed"
+
+    # lookup arrays are updated when tanks change
+    tank: Tank = tankopedia[tank_ids[0]]
+    tankopedia.add(tank.model_copy(update={"tier": EnumVehicleTier.X}))
+    assert tankopedia.lookup([tank.tank_id])["tier"].to_pylist() == [10], (
+        "lookup arrays not updated"
+    )
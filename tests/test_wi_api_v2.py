@@ -1,8 +1,11 @@
 import pytest  # type: ignore
 import pytest_asyncio
+import asyncio
+from aiohttp import web
+from contextlib import asynccontextmanager
 from pathlib import Path
 import logging
-from typing import Dict, List, Any
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any
 from configparser import ConfigParser
 
 from blitzmodels.wotinspector.wi_apiv2 import (
@@ -30,6 +33,9 @@ debug = logger.debug
 # 1) test models
 # 2) Test iterate over  replay list
 # 3) test get a Replay
+# 4) test post a Replay
+# 5) test streaming a replay upload
+# 6) test prefetching and resuming the replay list
 
 ########################################################
 #
@@ -62,6 +68,22 @@ if config_file is not None:
 WI_AUTH_TOKEN = config.get("WOTINSPECTOR", "auth_token", fallback=WI_AUTH_TOKEN)
 
 
+@asynccontextmanager
+async def api_server(
+    handler: Callable[[web.Request], Awaitable[web.Response]],
+) -> AsyncIterator[str]:
+    """Run a local HTTP server for testing API calls. Yields the server URL"""
+    app = web.Application(client_max_size=2**24)
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}"
+    finally:
+        await runner.cleanup()
+
+
 @pytest.fixture
 def replay_ids_ok() -> List[str]:
     return ["22a56c4be013915002b82403fa8cf375"]
@@ -187,3 +209,132 @@ async def test_4_post_replay(
                 break
     finally:
         await wotinspector.close()
+
+
+@pytest.mark.asyncio
+@REPLAY_FILES
+async def test_5_post_replay_stream(datafiles: Path) -> None:
+    uploads: List[Dict[str, Any]] = list()
+
+    async def handler(request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["upload_file"]
+        assert isinstance(upload, web.FileField), "upload_file is not a file"
+        uploads.append(
+            {
+                "title": form["title"],
+                "filename": upload.filename,
+                "data": upload.file.read(),
+            }
+        )
+        return web.Response(
+            text=Replay.example_instance().model_dump_json(by_alias=True),
+            content_type="application/json",
+        )
+
+    replay_fns: List[Path] = sorted(datafiles.glob("*.wotbreplay"))
+    async with api_server(handler) as url:
+        wotinspector = WoTinspector()
+        wotinspector.URL_REPLAYS = f"{url}/blitz/replays/"
+        try:
+            for replay_fn in replay_fns:
+                assert (
+                    await wotinspector.post_replay(replay_fn, title=replay_fn.name)
+                ) is not None, f"could not POST replay: {replay_fn.name}"
+        finally:
+            await wotinspector.close()
+
+    assert len(uploads) == len(replay_fns), f"incorrect uploads: {len(uploads)}"
+    for replay_fn, upload in zip(replay_fns, uploads):
+        assert upload["title"] == upload["filename"] == replay_fn.name, (
+            f"incorrect upload: {upload['filename']}"
+        )
+        assert upload["data"] == replay_fn.read_bytes(), (
+            f"incorrect upload data: {replay_fn.name}"
+        )
+
+
+def replay_summary(id: str) -> Dict[str, Any]:
+    return {
+        "id": id,
+        "map_id": 1,
+        "battle_duration": 300.0,
+        "player_name": "jylpah",
+        "protagonist": 521458531,
+        "vehicle_descr": 19201,
+        "game_version": {"name": "6.8"},
+        "arena_unique_id": id,
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefetch", [0, 3])
+async def test_6_list_replays_prefetch(prefetch: int) -> None:
+    PAGES: int = 5
+    PAGE_SIZE: int = 4
+    requested: List[int] = list()
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    async def handler(request: web.Request) -> web.Response:
+        nonlocal in_flight, max_in_flight
+        page: int = int(request.query["page"])
+        requested.append(page)
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        if page > PAGES:
+            raise web.HTTPNotFound()
+        next_url: str | None = None
+        if page < PAGES:
+            next_url = f"{request.url.with_query(page=page + 1)}"
+        return web.json_response(
+            {
+                "count": PAGES * PAGE_SIZE,
+                "next": next_url,
+                "previous": None,
+                "results": [replay_summary(f"{page}-{i}") for i in range(PAGE_SIZE)],
+            }
+        )
+
+    ids: List[str] = [
+        f"{page}-{i}" for page in range(1, PAGES + 1) for i in range(PAGE_SIZE)
+    ]
+    async with api_server(handler) as url:
+
+        class LocalWoTinspector(WoTinspector):
+            URL_REPLAYS = f"{url}/blitz/replays/"
+
+        wotinspector = LocalWoTinspector()
+        try:
+            replays = wotinspector.list_replays(max_pages=-1, prefetch=prefetch)
+            assert [replay.id async for replay in replays] == ids, (
+                "incorrect replays listed"
+            )
+            assert max(requested) == PAGES, f"pages past the last page: {requested}"
+            if prefetch > 0:
+                assert max_in_flight > 1, "pages were not prefetched"
+            else:
+                assert max_in_flight == 1, "pages were prefetched"
+            assert [replay.id async for replay in replays] == [], "iteration restarted"
+
+            # resume from the cursor
+            replays = wotinspector.list_replays(max_pages=-1, prefetch=prefetch)
+            listed: List[str] = [(await anext(replays)).id for _ in range(6)]
+            page, offset = replays.cursor
+            await replays.aclose()
+            listed += [
+                replay.id
+                async for replay in wotinspector.list_replays(
+                    page=page, offset=offset, prefetch=prefetch
+                )
+            ]
+            assert listed == ids, f"incorrect replays after resuming at {page=}"
+
+            replays = wotinspector.list_replays(page=2, max_pages=2, prefetch=prefetch)
+            assert [replay.id async for replay in replays] == ids[4:12], (
+                "max_pages not respected"
+            )
+        finally:
+            await wotinspector.close()